@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('aprendizaje', '0003_poblar_recursos_iniciales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recomendacion',
+            options={'ordering': ['-fecha_recomendacion', '-id_recomendacion'], 'verbose_name': 'Recomendación', 'verbose_name_plural': 'Recomendaciones'},
+        ),
+        migrations.AddIndex(
+            model_name='recomendacion',
+            index=models.Index(fields=['id_usuario', 'fecha_recomendacion', 'id_recomendacion'], name='recomendacion_usuario_idx'),
+        ),
+    ]
@@ -61,6 +61,11 @@ class Recomendacion(models.Model):
         db_table = 'recomendacion'
         verbose_name = 'Recomendación'
         verbose_name_plural = 'Recomendaciones'
+        ordering = ['-fecha_recomendacion', '-id_recomendacion']
+        indexes = [
+            models.Index(fields=['id_usuario', 'fecha_recomendacion', 'id_recomendacion'],
+                         name='recomendacion_usuario_idx'),
+        ]
     
     def __str__(self):
         return f"Recomendación para {self.id_usuario.nombre}: {self.id_recurso.titulo}"
@@ -0,0 +1,11 @@
+from tareas.servicios import tarea
+from usuarios.models import Usuario
+from .servicios import ServicioRecomendaciones
+
+
+@tarea('aprendizaje.recomendaciones_por_test')
+def recomendaciones_por_test(usuario_id, resultado):
+    """Genera las recomendaciones después de enviar un mini test"""
+    usuario = Usuario.objects.filter(pk=usuario_id).first()
+    if usuario:
+        ServicioRecomendaciones.generar_recomendaciones_por_test(usuario, resultado)
@@ -31,6 +31,7 @@ class RecursoAprendizajeViewSet(viewsets.ModelViewSet):
 class RecomendacionViewSet(viewsets.ModelViewSet):
     queryset = Recomendacion.objects.all()
     serializer_class = RecomendacionSerializer
+    orden_cursor = ('-fecha_recomendacion', '-id_recomendacion')
     
     def get_queryset(self):
         return self.queryset.filter(id_usuario=self.request.user)
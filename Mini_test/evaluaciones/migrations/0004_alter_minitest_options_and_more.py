@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('evaluaciones', '0003_poblar_preguntas_minitest'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='minitest',
+            options={'ordering': ['-fecha', '-id_test'], 'verbose_name': 'Mini Test', 'verbose_name_plural': 'Mini Tests'},
+        ),
+        migrations.AddIndex(
+            model_name='minitest',
+            index=models.Index(fields=['id_usuario', 'fecha', 'id_test'], name='minitest_usuario_fecha_idx'),
+        ),
+    ]
@@ -17,7 +17,10 @@ class MiniTest(models.Model):
         db_table = 'minitest'
         verbose_name = 'Mini Test'
         verbose_name_plural = 'Mini Tests'
-        ordering = ['-fecha']
+        ordering = ['-fecha', '-id_test']
+        indexes = [
+            models.Index(fields=['id_usuario', 'fecha', 'id_test'], name='minitest_usuario_fecha_idx'),
+        ]
     
     def __str__(self):
         return f"Test de {self.id_usuario.nombre} - {self.fecha.strftime('%d/%m/%Y')}"
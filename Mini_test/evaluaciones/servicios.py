@@ -1,5 +1,5 @@
 from .models import MiniTest, PreguntaTest
-from aprendizaje.servicios import ServicioRecomendaciones
+from tareas.servicios import ServicioTareas
 
 class ServicioEvaluacion:
     @staticmethod
@@ -62,7 +62,11 @@ class ServicioEvaluacion:
             usuario.perfil = nivel
             usuario.save()
         
-        # Generar recomendaciones basadas en el test
-        ServicioRecomendaciones.generar_recomendaciones_por_test(usuario, resultado_final)
+        # Las recomendaciones se generan en segundo plano al confirmar la transacción
+        ServicioTareas.encolar(
+            'aprendizaje.recomendaciones_por_test',
+            {'usuario_id': usuario.pk, 'resultado': resultado_final},
+            clave=f'recomendaciones:test:{mini_test.pk}'
+        )
         
         return mini_test
@@ -9,6 +9,7 @@ from .servicios import ServicioEvaluacion
 class MiniTestViewSet(viewsets.ModelViewSet):
     queryset = MiniTest.objects.all()
     serializer_class = MiniTestSerializer
+    orden_cursor = ('-fecha', '-id_test')
     
     def get_queryset(self):
         return self.queryset.filter(id_usuario=self.request.user)
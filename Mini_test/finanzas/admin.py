@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import RegistroFinanciero, ReporteFinanciero, MetaFinanciera
+from django.db import transaction
+from .models import (RegistroFinanciero, ReporteFinanciero, MetaFinanciera, ResumenSemanalCategoria, AporteMeta,
+                     AnomaliaGasto, DetalleReporteCategoria, Eliminacion, ArchivoRegistros, PresupuestoCategoria,
+                     GastoPresupuesto, EventoPresupuesto)
 
 @admin.register(RegistroFinanciero)
 class RegistroFinancieroAdmin(admin.ModelAdmin):
@@ -8,9 +11,23 @@ class RegistroFinancieroAdmin(admin.ModelAdmin):
     search_fields = ['id_usuario__nombre', 'descripcion']
     date_hierarchy = 'fecha'
     ordering = ['-fecha']
+    
+    def delete_queryset(self, request, queryset):
+        """El borrado masivo pasa por delete() de cada registro para mantener los resúmenes"""
+        with transaction.atomic():
+            for registro in queryset:
+                registro.delete()
+
+class DetalleReporteCategoriaInline(admin.TabularInline):
+    model = DetalleReporteCategoria
+    fields = ['categoria', 'ingresos', 'gastos']
+    readonly_fields = ['categoria', 'ingresos', 'gastos']
+    extra = 0
+    can_delete = False
 
 @admin.register(ReporteFinanciero)
 class ReporteFinancieroAdmin(admin.ModelAdmin):
+    inlines = [DetalleReporteCategoriaInline]
     list_display = ['id_reporte', 'id_usuario', 'semana', 'anio', 'total_ingresos', 'total_gastos', 'balance', 'fecha_inicio_semana', 'fecha_fin_semana']
     list_filter = ['anio', 'semana']
     search_fields = ['id_usuario__nombre']
@@ -22,4 +39,81 @@ class MetaFinancieraAdmin(admin.ModelAdmin):
     list_display = ['id_meta', 'id_usuario', 'nombre', 'monto_objetivo', 'monto_actual', 'porcentaje_completado', 'estado', 'fecha_objetivo']
     list_filter = ['estado', 'fecha_objetivo']
     search_fields = ['id_usuario__nombre', 'nombre']
-    ordering = ['-fecha_objetivo']
\ No newline at end of file
+    ordering = ['-fecha_objetivo']
+    
+    def delete_queryset(self, request, queryset):
+        """El borrado masivo pasa por delete() de cada meta para invalidar la caché del usuario"""
+        with transaction.atomic():
+            for meta in queryset:
+                meta.delete()
+
+@admin.register(ResumenSemanalCategoria)
+class ResumenSemanalCategoriaAdmin(admin.ModelAdmin):
+    list_display = ['id_usuario', 'anio', 'semana', 'categoria', 'total_ingresos', 'total_gastos', 'cantidad_registros']
+    list_filter = ['anio', 'categoria']
+    search_fields = ['id_usuario__nombre']
+    ordering = ['-anio', '-semana', 'categoria']
+    readonly_fields = ['id_usuario', 'anio', 'semana', 'categoria', 'total_ingresos', 'total_gastos', 'cantidad_registros']
+
+@admin.register(AporteMeta)
+class AporteMetaAdmin(admin.ModelAdmin):
+    list_display = ['id_aporte', 'id_meta', 'monto', 'fecha', 'descripcion']
+    search_fields = ['id_meta__nombre', 'descripcion']
+    ordering = ['-fecha']
+    readonly_fields = ['id_meta', 'monto', 'fecha']
+
+@admin.register(AnomaliaGasto)
+class AnomaliaGastoAdmin(admin.ModelAdmin):
+    list_display = ['id_anomalia', 'id_usuario', 'tipo', 'categoria', 'anio', 'semana', 'monto', 'referencia', 'puntaje']
+    list_filter = ['tipo', 'categoria', 'anio']
+    search_fields = ['id_usuario__nombre']
+    ordering = ['-anio', '-semana']
+    readonly_fields = ['id_usuario', 'id_registro', 'tipo', 'categoria', 'anio', 'semana', 'monto', 'referencia',
+                       'puntaje', 'cantidad', 'version_registros', 'fecha_deteccion']
+
+@admin.register(Eliminacion)
+class EliminacionAdmin(admin.ModelAdmin):
+    list_display = ['id_eliminacion', 'id_usuario', 'modelo', 'id_objeto', 'secuencia_cambio', 'fecha_eliminacion']
+    list_filter = ['modelo']
+    search_fields = ['id_usuario__nombre']
+    ordering = ['-id_eliminacion']
+    readonly_fields = ['id_usuario', 'modelo', 'id_objeto', 'secuencia_cambio', 'fecha_eliminacion']
+
+@admin.register(ArchivoRegistros)
+class ArchivoRegistrosAdmin(admin.ModelAdmin):
+    list_display = ['id_archivo', 'id_usuario', 'anio', 'cantidad', 'total_ingresos', 'total_gastos', 'bytes',
+                    'fecha_archivo']
+    list_filter = ['anio']
+    search_fields = ['id_usuario__nombre']
+    ordering = ['-anio', 'id_usuario']
+    readonly_fields = ['id_usuario', 'anio', 'ruta', 'cantidad', 'total_ingresos', 'total_gastos', 'primera_semana',
+                       'ultima_semana', 'bytes', 'sha256', 'fecha_archivo']
+
+@admin.register(PresupuestoCategoria)
+class PresupuestoCategoriaAdmin(admin.ModelAdmin):
+    list_display = ['id_presupuesto', 'id_usuario', 'categoria', 'periodo', 'limite', 'desde']
+    list_filter = ['periodo', 'categoria']
+    search_fields = ['id_usuario__nombre']
+    ordering = ['id_usuario', 'categoria']
+    readonly_fields = ['desde', 'fecha_creacion']
+    
+    def delete_queryset(self, request, queryset):
+        """El borrado masivo pasa por delete() de cada presupuesto para invalidar la caché del usuario"""
+        with transaction.atomic():
+            for presupuesto in queryset:
+                presupuesto.delete()
+
+@admin.register(GastoPresupuesto)
+class GastoPresupuestoAdmin(admin.ModelAdmin):
+    list_display = ['id_presupuesto', 'inicio', 'gastado', 'cantidad_registros']
+    search_fields = ['id_presupuesto__id_usuario__nombre']
+    ordering = ['-inicio']
+    readonly_fields = ['id_presupuesto', 'inicio', 'gastado', 'cantidad_registros']
+
+@admin.register(EventoPresupuesto)
+class EventoPresupuestoAdmin(admin.ModelAdmin):
+    list_display = ['id_evento', 'id_usuario', 'id_presupuesto', 'inicio', 'umbral', 'gastado', 'limite', 'fecha']
+    list_filter = ['umbral']
+    search_fields = ['id_usuario__nombre']
+    ordering = ['-fecha']
+    readonly_fields = ['id_usuario', 'id_presupuesto', 'inicio', 'umbral', 'gastado', 'limite', 'fecha']
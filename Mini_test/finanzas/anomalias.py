@@ -0,0 +1,225 @@
+"""Detección de gastos inusuales por usuario.
+
+Los gastos de las últimas semanas de cada usuario se leen de su instantánea
+(finanzas/instantaneas.py, puesta al día al leerla) como arreglos NumPy y se
+analizan sobre ellos:
+
+- registro: gasto cuyo z robusto, (monto - mediana) / (1.4826 * MAD), contra
+  los gastos anteriores de la misma categoría supera UMBRAL_Z.
+- semana: total semanal de una categoría contra la mediana móvil de las
+  semanas anteriores.
+- hormiga: muchas compras pequeñas en una categoría en las últimas semanas.
+
+Las anomalías se guardan en AnomaliaGasto, que es lo único que lee el dashboard.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from multiprocessing import get_context
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import archivo, dinero, instantaneas
+from .models import AnomaliaGasto, RegistroFinanciero, VersionFinanciera
+from .proyecciones import SEMANAS_HISTORIA
+
+
+VENTANA_SEMANAS = 8     # semanas anteriores para la mediana móvil semanal
+VENTANA_REGISTROS = 10  # gastos anteriores de la misma categoría para la mediana móvil
+UMBRAL_Z = 3.5
+ESCALA_MAD = 1.4826     # MAD -> desviación estándar en datos normales
+# Piso de la dispersión: con gastos idénticos el MAD es 0 y cualquier diferencia sería anómala
+FRACCION_MINIMA = 0.1
+MONTO_MINIMO = 1.0
+MONTO_HORMIGA = 20.0    # compra pequeña, en soles
+SEMANAS_HORMIGA = 4
+COMPRAS_HORMIGA = 12    # compras pequeñas en SEMANAS_HORMIGA semanas (3 por semana)
+
+
+def escala_robusta(ventanas):
+    """(mediana, escala) sobre el último eje; la escala es 1.4826 * MAD con piso"""
+    mediana = np.median(ventanas, axis=-1)
+    mad = np.median(np.abs(ventanas - mediana[..., None]), axis=-1)
+    piso = np.maximum(FRACCION_MINIMA * np.abs(mediana), MONTO_MINIMO)
+    return mediana, np.maximum(ESCALA_MAD * mad, piso)
+
+
+def z_movil(serie, ventana):
+    """(mediana, z) de cada posición desde `ventana` contra las `ventana` posiciones anteriores.
+
+    serie puede tener varias filas; se opera sobre el último eje.
+    """
+    if serie.shape[-1] <= ventana:
+        vacio = np.empty(serie.shape[:-1] + (0,))
+        return vacio, vacio
+    ventanas = sliding_window_view(serie, ventana, axis=-1)[..., :-1, :]
+    mediana, escala = escala_robusta(ventanas)
+    return mediana, (serie[..., ventana:] - mediana) / escala
+
+
+def semanas_analizadas(hoy):
+    """(lunes de la primera semana, [(anio, semana)]): SEMANAS_HISTORIA cerradas más la actual"""
+    lunes = hoy - timedelta(days=hoy.weekday()) - timedelta(weeks=SEMANAS_HISTORIA)
+    semanas = [tuple((lunes + timedelta(weeks=i)).isocalendar()[:2]) for i in range(SEMANAS_HISTORIA + 1)]
+    return lunes, semanas
+
+
+def _inicio(lunes):
+    return timezone.make_aware(datetime.combine(lunes, time.min))
+
+
+def analizar(ids, categorias, montos, indice_semana, semanas):
+    """Anomalías de un usuario a partir de sus gastos ordenados por fecha.
+
+    ids, categorias, montos, indice_semana: un elemento por gasto.
+    Retorna dicts con los campos de AnomaliaGasto (sin usuario ni versión).
+    """
+    nombres, indice_categoria = np.unique(categorias, return_inverse=True)
+    total_semanas = len(semanas)
+    anomalias = []
+
+    # Gastos individuales contra los anteriores de su categoría
+    for c, categoria in enumerate(nombres):
+        posiciones = np.flatnonzero(indice_categoria == c)
+        mediana, z = z_movil(montos[posiciones], VENTANA_REGISTROS)
+        for k in np.flatnonzero(z > UMBRAL_Z):
+            i = posiciones[k + VENTANA_REGISTROS]
+            anio, semana = semanas[indice_semana[i]]
+            anomalias.append({
+                'tipo': 'registro', 'categoria': str(categoria), 'id_registro_id': int(ids[i]),
+                'anio': anio, 'semana': semana, 'monto': montos[i], 'referencia': mediana[k],
+                'puntaje': float(z[k]), 'cantidad': 1,
+            })
+
+    # Totales semanales por categoría (categorías x semanas) contra la mediana móvil
+    celda = indice_categoria * total_semanas + indice_semana
+    totales = np.bincount(celda, weights=montos, minlength=len(nombres) * total_semanas)
+    totales = totales.reshape(len(nombres), total_semanas)
+    cantidades = np.bincount(celda, minlength=len(nombres) * total_semanas).reshape(totales.shape)
+    mediana, z = z_movil(totales, VENTANA_SEMANAS)
+    # Con mediana 0 la categoría casi no tenía gastos: empezar a gastar en ella no es una anomalía
+    for c, k in zip(*np.nonzero((z > UMBRAL_Z) & (mediana > 0))):
+        j = k + VENTANA_SEMANAS
+        anio, semana = semanas[j]
+        anomalias.append({
+            'tipo': 'semana', 'categoria': str(nombres[c]), 'id_registro_id': None,
+            'anio': anio, 'semana': semana, 'monto': totales[c, j], 'referencia': mediana[c, k],
+            'puntaje': float(z[c, k]), 'cantidad': int(cantidades[c, j]),
+        })
+
+    # Gastos hormiga: compras pequeñas y frecuentes en las últimas semanas
+    pequenos = (montos <= MONTO_HORMIGA) & (indice_semana >= total_semanas - SEMANAS_HORMIGA)
+    compras = np.bincount(indice_categoria[pequenos], minlength=len(nombres))
+    suma = np.bincount(indice_categoria[pequenos], weights=montos[pequenos], minlength=len(nombres))
+    anio, semana = semanas[-1]
+    for c in np.flatnonzero(compras >= COMPRAS_HORMIGA):
+        anomalias.append({
+            'tipo': 'hormiga', 'categoria': str(nombres[c]), 'id_registro_id': None,
+            'anio': anio, 'semana': semana, 'monto': suma[c], 'referencia': MONTO_HORMIGA,
+            'puntaje': None, 'cantidad': int(compras[c]),
+        })
+    return anomalias
+
+
+def detectar_usuarios(usuario_ids, hoy=None, guardar=True):
+    """Detecta las anomalías de un lote de usuarios desde sus instantáneas.
+
+    Con guardar, reemplaza las anomalías anteriores de esos usuarios en la
+    misma transacción e incrementa la versión financiera de los usuarios cuyas
+    anomalías cambiaron, porque el dashboard en caché las muestra. Retorna la
+    lista de AnomaliaGasto.
+    """
+    hoy = hoy or timezone.localdate()
+    lunes, semanas = semanas_analizadas(hoy)
+    versiones = dict(
+        VersionFinanciera.objects.filter(id_usuario_id__in=usuario_ids).values_list('id_usuario_id', 'version')
+    )
+    gasto = archivo.TIPOS.index('gasto')
+    nombres = np.array(archivo.CATEGORIAS)
+
+    ahora = timezone.now()
+    anomalias = []
+    for usuario_id in usuario_ids:
+        registros = instantaneas.rango(instantaneas.obtener(usuario_id), _inicio(lunes))
+        gastos = registros[registros['tipo'] == gasto]
+        if not len(gastos):
+            continue
+        indice_semana = np.fromiter(
+            ((timezone.localdate(archivo.EPOCA + timedelta(microseconds=int(f))) - lunes).days // 7
+             for f in gastos['fecha']),
+            dtype=np.intp, count=len(gastos)
+        )
+        # Registros con fecha futura caen en la semana actual
+        np.minimum(indice_semana, len(semanas) - 1, out=indice_semana)
+        for datos in analizar(gastos['id_registro'], nombres[gastos['categoria']], dinero.a_float(gastos['monto']),
+                              indice_semana, semanas):
+            datos['monto'] = dinero.redondear(float(datos['monto']))
+            datos['referencia'] = dinero.redondear(float(datos['referencia']))
+            anomalias.append(AnomaliaGasto(
+                id_usuario_id=usuario_id, version_registros=versiones.get(usuario_id, 0),
+                fecha_deteccion=ahora, **datos
+            ))
+
+    if guardar:
+        with transaction.atomic():
+            anteriores = _firmas(AnomaliaGasto.objects.select_for_update().filter(id_usuario_id__in=usuario_ids))
+            AnomaliaGasto.objects.filter(id_usuario_id__in=usuario_ids).delete()
+            AnomaliaGasto.objects.bulk_create(anomalias, batch_size=1000)
+            nuevas = _firmas(anomalias)
+            _incrementar_versiones(u for u in usuario_ids if anteriores.get(u) != nuevas.get(u))
+    return anomalias
+
+
+def _firmas(anomalias):
+    """{id_usuario: Counter de anomalías} sin los campos propios de cada detección"""
+    firmas = {}
+    for a in anomalias:
+        clave = (a.tipo, a.categoria, a.id_registro_id, a.anio, a.semana, a.monto, a.referencia, a.puntaje, a.cantidad)
+        firmas.setdefault(a.id_usuario_id, Counter())[clave] += 1
+    return firmas
+
+
+def _incrementar_versiones(usuario_ids):
+    """Las anomalías entran en el dashboard en caché: invalidarlo donde cambiaron"""
+    from .servicios import ServicioVersionFinanciera
+    for usuario_id in sorted(set(usuario_ids)):
+        ServicioVersionFinanciera.incrementar(usuario_id)
+
+
+def _detectar_lote(argumentos):
+    usuario_ids, hoy = argumentos
+    return len(detectar_usuarios(usuario_ids, hoy=hoy))
+
+
+def detectar_todas(tamano_lote=500, procesos=1, hoy=None):
+    """Detecta anomalías de todos los usuarios con gastos recientes. Retorna la cantidad.
+
+    Los lotes son independientes: con procesos > 1 se reparten en un pool de
+    procesos (cada uno abre su propia conexión). Al final se borran las
+    anomalías de usuarios que ya no tienen gastos en el periodo analizado.
+    """
+    hoy = hoy or timezone.localdate()
+    inicio = timezone.now()
+    lunes, _ = semanas_analizadas(hoy)
+    usuario_ids = list(
+        RegistroFinanciero.objects.filter(tipo='gasto', fecha__gte=_inicio(lunes))
+        .order_by('id_usuario_id').values_list('id_usuario_id', flat=True).distinct()
+    )
+    lotes = [(usuario_ids[i:i + tamano_lote], hoy) for i in range(0, len(usuario_ids), tamano_lote)]
+
+    if procesos > 1 and len(lotes) > 1:
+        # Los hijos no deben heredar la conexión abierta del padre
+        connections.close_all()
+        with get_context('fork').Pool(min(procesos, len(lotes))) as pool:
+            total = sum(pool.imap_unordered(_detectar_lote, lotes))
+    else:
+        total = sum(_detectar_lote(lote) for lote in lotes)
+
+    with transaction.atomic():
+        viejas = AnomaliaGasto.objects.filter(fecha_deteccion__lt=inicio)
+        _incrementar_versiones(viejas.values_list('id_usuario_id', flat=True))
+        viejas.delete()
+    return total
@@ -0,0 +1,428 @@
+"""Archivo en frío de los años cerrados del libro de registros.
+
+Los registros de años que quedaron fuera del horizonte (ARCHIVO_ANIOS_ACTIVOS)
+casi no se leen pero siguen agrandando registro_financiero y sus índices.
+archivar() los pasa a un .npz comprimido por usuario y año bajo
+ARCHIVO_REGISTROS_RUTA, en columnas NumPy: fechas en microsegundos UTC, montos
+en centavos (int64), tipo y categoría como códigos uint8 y las descripciones
+como tabla de textos únicos más un índice por fila. El archivo se anota en
+ArchivoRegistros y las filas se borran de la tabla en la misma transacción.
+
+El nombre del archivo lleva el hash de su contenido: si la transacción se
+revierte, el catálogo sigue apuntando al archivo anterior, que no se tocó.
+El borrado de las filas no pasa por delete() del modelo, así que los
+resúmenes semanales, la versión financiera y la sincronización no cambian:
+el contenido lógico del libro es el mismo. Es el único mecanismo que saca
+filas de la tabla (las particiones no se desprenden), y quien lee el libro
+en un rango los combina: el resumen anual, los reportes semanales y por
+lote, la exportación, los agregados y los listados por semana y categoría
+con rango(), registros() y totales_*(); la sincronización, con cambios().
+El listado paginado de registros solo cubre la tabla y lo indica con la
+cabecera X-Anios-Archivados.
+"""
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta, timezone as tz
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import dinero, particiones
+from .models import ArchivoRegistros, RegistroFinanciero
+
+
+TIPOS = [t for t, _ in RegistroFinanciero.TIPO_CHOICES]
+CATEGORIAS = [c for c, _ in RegistroFinanciero.CATEGORIA_CHOICES]
+CAMPOS = ['id_registro', 'fecha', 'tipo', 'categoria', 'monto', 'descripcion', 'fecha_creacion',
+          'oportunidad_id', 'secuencia_cambio']
+EPOCA = datetime(1970, 1, 1, tzinfo=tz.utc)
+MICRO = timedelta(microseconds=1)
+FORMATO = 1
+
+
+def _micros(momento):
+    return (momento - EPOCA) // MICRO
+
+
+def _momento(micros):
+    return EPOCA + timedelta(microseconds=int(micros))
+
+
+def columnas(filas):
+    """Columnas NumPy de filas (en el orden de CAMPOS), ordenadas por (fecha, id_registro)"""
+    filas = sorted(filas, key=lambda f: (f[1], f[0]))
+    descripciones, indices = np.unique(np.array([f[5] or '' for f in filas], dtype=str), return_inverse=True)
+    tipos = {t: i for i, t in enumerate(TIPOS)}
+    categorias = {c: i for i, c in enumerate(CATEGORIAS)}
+    return {
+        'id_registro': np.array([f[0] for f in filas], dtype=np.int64),
+        'fecha': np.array([_micros(f[1]) for f in filas], dtype=np.int64),
+        'tipo': np.array([tipos[f[2]] for f in filas], dtype=np.uint8),
+        'categoria': np.array([categorias[f[3]] for f in filas], dtype=np.uint8),
+        'monto': dinero.arreglo(f[4] for f in filas),
+        'descripciones': descripciones,
+        'descripcion': indices.astype(np.uint32),
+        'fecha_creacion': np.array([_micros(f[6]) for f in filas], dtype=np.int64),
+        'oportunidad': np.array([-1 if f[7] is None else f[7] for f in filas], dtype=np.int64),
+        'secuencia_cambio': np.array([f[8] for f in filas], dtype=np.int64),
+    }
+
+
+def filas(datos, mascara=None):
+    """Filas (en el orden de CAMPOS) de columnas archivadas, opcionalmente solo las de mascara"""
+    if mascara is not None:
+        datos = {k: v if k == 'descripciones' else v[mascara] for k, v in datos.items()}
+    descripciones = datos['descripciones']
+    for i in range(len(datos['id_registro'])):
+        oportunidad = int(datos['oportunidad'][i])
+        yield (
+            int(datos['id_registro'][i]),
+            _momento(datos['fecha'][i]),
+            TIPOS[datos['tipo'][i]],
+            CATEGORIAS[datos['categoria'][i]],
+            dinero.a_decimal(datos['monto'][i]),
+            str(descripciones[datos['descripcion'][i]]),
+            _momento(datos['fecha_creacion'][i]),
+            None if oportunidad < 0 else oportunidad,
+            int(datos['secuencia_cambio'][i]),
+        )
+
+
+def combinar(anteriores, nuevas):
+    """Une dos juegos de columnas (un año que se vuelve a archivar con registros tardíos)"""
+    return columnas(list(filas(anteriores)) + list(filas(nuevas)))
+
+
+def _absoluta(relativa):
+    return os.path.join(settings.ARCHIVO_REGISTROS_RUTA, relativa)
+
+
+def guardar(datos, usuario_id, anio):
+    """Escribe el .npz (temporal + reemplazo atómico). Retorna (ruta relativa, sha256, bytes)"""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, formato=FORMATO, tipos=np.array(TIPOS), categorias=np.array(CATEGORIAS), **datos)
+    contenido = buffer.getvalue()
+    sha256 = hashlib.sha256(contenido).hexdigest()
+    relativa = os.path.join(str(anio), f'{usuario_id}-{sha256[:16]}.npz')
+    ruta = _absoluta(relativa)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+    return relativa, sha256, len(contenido)
+
+
+def cargar(relativa):
+    with np.load(_absoluta(relativa)) as datos:
+        if list(datos['tipos']) != TIPOS or list(datos['categorias']) != CATEGORIAS:
+            raise ValueError(f'{relativa} se archivó con otros tipos o categorías')
+        return {k: datos[k] for k in columnas([]).keys()}
+
+
+def _borrar(rutas):
+    for relativa in rutas:
+        try:
+            os.remove(_absoluta(relativa))
+        except FileNotFoundError:
+            pass
+
+
+def _semana(micros):
+    """AAAASS de la semana ISO (hora de Lima) de un instante"""
+    anio, semana, _ = timezone.localtime(_momento(micros)).isocalendar()
+    return anio * 100 + semana
+
+
+def _catalogo(usuario_id, anio, relativa, sha256, tamano, datos):
+    ingresos = datos['tipo'] == TIPOS.index('ingreso')
+    return ArchivoRegistros(
+        id_usuario_id=usuario_id, anio=anio, ruta=relativa, sha256=sha256, bytes=tamano,
+        cantidad=len(datos['id_registro']),
+        total_ingresos=dinero.a_decimal(datos['monto'][ingresos].sum()),
+        total_gastos=dinero.a_decimal(datos['monto'][~ingresos].sum()),
+        primera_semana=_semana(datos['fecha'].min()),
+        ultima_semana=_semana(datos['fecha'].max()),
+        fecha_archivo=timezone.now(),
+    )
+
+
+def archivar_usuarios(usuario_ids, anio):
+    """Archiva los registros del año de esos usuarios. Retorna (registros archivados, bytes escritos)"""
+    inicio, fin = particiones.limites(anio)
+    escritos, reemplazados, catalogo, existentes = [], [], [], {}
+    try:
+        with transaction.atomic():
+            # FOR UPDATE: nadie edita ni borra una fila entre leerla y borrarla de la tabla
+            registros = list(
+                RegistroFinanciero.objects.select_for_update()
+                .filter(id_usuario__in=usuario_ids, fecha__gte=inicio, fecha__lt=fin)
+                .order_by('id_usuario', 'fecha', 'id_registro')
+                .values_list('id_usuario', *CAMPOS)
+            )
+            existentes = {
+                a.id_usuario_id: a
+                for a in ArchivoRegistros.objects.select_for_update().filter(id_usuario__in=usuario_ids, anio=anio)
+            }
+            for usuario_id, grupo in groupby(registros, key=itemgetter(0)):
+                datos = columnas([f[1:] for f in grupo])
+                anterior = existentes.get(usuario_id)
+                if anterior:
+                    datos = combinar(cargar(anterior.ruta), datos)
+                relativa, sha256, tamano = guardar(datos, usuario_id, anio)
+                escritos.append(relativa)
+                if anterior and anterior.ruta != relativa:
+                    reemplazados.append(anterior.ruta)
+                catalogo.append(_catalogo(usuario_id, anio, relativa, sha256, tamano, datos))
+            ArchivoRegistros.objects.bulk_create(
+                catalogo, update_conflicts=True, unique_fields=['id_usuario', 'anio'],
+                update_fields=['ruta', 'cantidad', 'total_ingresos', 'total_gastos', 'primera_semana',
+                               'ultima_semana', 'bytes', 'sha256', 'fecha_archivo'],
+            )
+            # Por id y no por rango: una fila insertada con fecha de ese año después de la lectura se queda
+            RegistroFinanciero.objects.filter(
+                id_usuario__in=usuario_ids, fecha__gte=inicio, fecha__lt=fin,
+                id_registro__in=[f[1] for f in registros]
+            ).delete()
+            transaction.on_commit(lambda: _borrar(reemplazados))
+    except Exception:
+        _borrar(r for r in escritos if r not in {a.ruta for a in existentes.values()})
+        raise
+    return len(registros), sum(a.bytes for a in catalogo)
+
+
+def primer_anio_activo(hoy=None):
+    """Los años desde este quedan en la tabla; nunca se archiva el año en curso"""
+    return (hoy or timezone.localdate()).year - max(settings.ARCHIVO_ANIOS_ACTIVOS, 1) + 1
+
+
+def anios_archivables(hoy=None):
+    """Años con registros en la tabla anteriores al horizonte de ARCHIVO_ANIOS_ACTIVOS"""
+    limite = primer_anio_activo(hoy)
+    fechas = RegistroFinanciero.objects.filter(fecha__lt=particiones.limites(limite)[0]).order_by('fecha')
+    primero = fechas.values_list('fecha', flat=True).first()
+    if primero is None:
+        return []
+    return list(range(timezone.localtime(primero).year, limite))
+
+
+def archivar(anios=None, usuario_ids=None, tamano_lote=200):
+    """Archiva por lotes de usuarios los años dados (por defecto los archivables).
+
+    Retorna {anio: (registros, bytes)}.
+    """
+    anios = anios_archivables() if anios is None else anios
+    activos = [a for a in anios if a >= primer_anio_activo()]
+    if activos:
+        raise ValueError(f'{activos} están dentro de los {settings.ARCHIVO_ANIOS_ACTIVOS} años activos')
+    resultado = {}
+    for anio in anios:
+        inicio, fin = particiones.limites(anio)
+        candidatos = RegistroFinanciero.objects.filter(fecha__gte=inicio, fecha__lt=fin)
+        if usuario_ids is not None:
+            candidatos = candidatos.filter(id_usuario__in=usuario_ids)
+        ids = sorted(set(candidatos.values_list('id_usuario', flat=True)))
+        cantidad = tamano = 0
+        for i in range(0, len(ids), tamano_lote):
+            filas_lote, bytes_lote = archivar_usuarios(ids[i:i + tamano_lote], anio)
+            cantidad += filas_lote
+            tamano += bytes_lote
+        resultado[anio] = (cantidad, tamano)
+    return resultado
+
+
+def restaurar(anio, usuario_ids=None):
+    """Devuelve a registro_financiero los registros archivados del año. Retorna cuántos.
+
+    Como al archivar, no se tocan los resúmenes ni la versión: ya cuentan estos
+    registros. Entran con una secuencia de cambio nueva, tomada con el bloqueo
+    de sincronización del usuario como cualquier escritura, así los clientes
+    que sincronizan los reciben.
+    """
+    from .servicios import ServicioSincronizacion
+    archivos = ArchivoRegistros.objects.select_for_update().filter(anio=anio)
+    if usuario_ids is not None:
+        archivos = archivos.filter(id_usuario__in=usuario_ids)
+    total = 0
+    with transaction.atomic():
+        archivos = list(archivos)
+        for archivo in archivos:
+            registros = [
+                RegistroFinanciero(
+                    id_registro=id_registro, id_usuario_id=archivo.id_usuario_id, fecha=fecha, tipo=tipo,
+                    categoria=categoria, monto=monto, descripcion=descripcion, fecha_creacion=creacion,
+                    oportunidad_id=oportunidad,
+                )
+                for id_registro, fecha, tipo, categoria, monto, descripcion, creacion, oportunidad, _
+                in filas(cargar(archivo.ruta))
+            ]
+            # La clave primaria es (id_registro, fecha): la base no detectaría un id repetido en otro año
+            repetidos = list(RegistroFinanciero.objects.filter(pk__in=[r.pk for r in registros])
+                             .values_list('pk', flat=True)[:10])
+            if repetidos:
+                raise ValueError(f'Los registros {repetidos} del archivo {archivo.ruta} ya están en la tabla')
+            creaciones = [r.fecha_creacion for r in registros]
+            ServicioSincronizacion.registrar_escritura(archivo.id_usuario_id)
+            RegistroFinanciero.objects.bulk_create(registros, batch_size=1000)
+            # bulk_create pone fecha_creacion = ahora (auto_now_add); se devuelve la original
+            for registro, creacion in zip(registros, creaciones):
+                registro.fecha_creacion = creacion
+            RegistroFinanciero.objects.bulk_update(registros, ['fecha_creacion'], batch_size=1000)
+            total += len(registros)
+        ArchivoRegistros.objects.filter(pk__in=[a.pk for a in archivos]).delete()
+        rutas = [a.ruta for a in archivos]
+        transaction.on_commit(lambda: _borrar(rutas))
+    return total
+
+
+def archivos_en(usuario_id, inicio=None, fin=None):
+    """Entradas del catálogo del usuario cuyos años tocan [inicio, fin)"""
+    archivos = ArchivoRegistros.objects.filter(id_usuario=usuario_id)
+    if inicio is not None:
+        archivos = archivos.filter(anio__gte=timezone.localtime(inicio).year)
+    if fin is not None:
+        archivos = archivos.filter(anio__lte=timezone.localtime(fin - MICRO).year)
+    return list(archivos.order_by('anio'))
+
+
+def _mascara(datos, inicio, fin):
+    mascara = np.ones(len(datos['fecha']), dtype=bool)
+    if inicio is not None:
+        mascara &= datos['fecha'] >= _micros(inicio)
+    if fin is not None:
+        mascara &= datos['fecha'] < _micros(fin)
+    return mascara
+
+
+def rango(usuario_id, inicio=None, fin=None, tipo=None, categoria=None, archivos=None):
+    """Filas archivadas del usuario en [inicio, fin) ordenadas por (fecha, id_registro)"""
+    for archivo in archivos_en(usuario_id, inicio, fin) if archivos is None else archivos:
+        datos = cargar(archivo.ruta)
+        mascara = _mascara(datos, inicio, fin)
+        if tipo:
+            mascara &= datos['tipo'] == (TIPOS.index(tipo) if tipo in TIPOS else -1)
+        if categoria:
+            mascara &= datos['categoria'] == (CATEGORIAS.index(categoria) if categoria in CATEGORIAS else -1)
+        yield from filas(datos, mascara)
+
+
+def _instancia(usuario_id, fila):
+    """RegistroFinanciero sin guardar de una fila archivada, con su secuencia de cambio"""
+    id_registro, fecha, tipo, categoria, monto, descripcion, creacion, oportunidad, secuencia = fila
+    return RegistroFinanciero(
+        id_registro=id_registro, id_usuario_id=usuario_id, fecha=fecha, tipo=tipo, categoria=categoria,
+        monto=monto, descripcion=descripcion, fecha_creacion=creacion, oportunidad_id=oportunidad,
+        secuencia_cambio=secuencia,
+    )
+
+
+def registros(usuario_id, inicio=None, fin=None, tipo=None, categoria=None):
+    """Registros archivados del usuario en [inicio, fin) como RegistroFinanciero sin guardar, para serializarlos"""
+    return [_instancia(usuario_id, fila) for fila in rango(usuario_id, inicio, fin, tipo, categoria)]
+
+
+def combinar_registros(registros_tabla, archivados):
+    """Une los registros de la tabla con los archivados en el orden del modelo (-fecha, -id_registro)"""
+    if not archivados:
+        return registros_tabla
+    return sorted([*registros_tabla, *archivados], key=lambda r: (r.fecha, r.pk), reverse=True)
+
+
+def anios_archivados(usuario_id):
+    return list(ArchivoRegistros.objects.filter(id_usuario=usuario_id).order_by('anio').values_list('anio', flat=True))
+
+
+def cambios(usuario_id, desde, marca, limite):
+    """Registros archivados con desde < secuencia_cambio <= marca, como RegistroFinanciero sin guardar.
+
+    Para ServicioSincronizacion.cambios: conservan la secuencia con la que se
+    escribieron. A lo sumo limite, los de menor secuencia. Solo se lee la
+    columna de secuencias de cada archivo hasta encontrar alguno en el rango.
+    """
+    resultado = []
+    for archivo in archivos_en(usuario_id):
+        with np.load(_absoluta(archivo.ruta)) as npz:
+            secuencias = npz['secuencia_cambio']
+        mascara = (secuencias > desde) & (secuencias <= marca)
+        if not mascara.any():
+            continue
+        resultado.extend(_instancia(usuario_id, fila) for fila in filas(cargar(archivo.ruta), mascara))
+    resultado.sort(key=lambda r: r.secuencia_cambio)
+    return resultado[:limite]
+
+
+def totales(usuario_id, inicio, fin, por='categoria', archivos=None):
+    """{clave: (ingresos, gastos)} en centavos de las filas archivadas en [inicio, fin).
+
+    La clave es la categoría, la semana ISO o, con por='semana_categoria',
+    (año ISO, semana ISO, categoría). Se suma en int64 sobre las columnas,
+    sin armar filas.
+    """
+    resultado = {}
+    for archivo in archivos_en(usuario_id, inicio, fin) if archivos is None else archivos:
+        datos = cargar(archivo.ruta)
+        mascara = _mascara(datos, inicio, fin)
+        if por == 'categoria':
+            grupos = datos['categoria'][mascara]
+        else:
+            grupos = np.array([_semana(f) for f in datos['fecha'][mascara]], dtype=np.int64)
+            if por == 'semana':
+                grupos %= 100
+            else:
+                grupos = grupos * len(CATEGORIAS) + datos['categoria'][mascara]
+        valores, indices = np.unique(grupos, return_inverse=True)
+        montos = datos['monto'][mascara]
+        ingreso = datos['tipo'][mascara] == TIPOS.index('ingreso')
+        ingresos = dinero.sumar_por_grupo(indices[ingreso], montos[ingreso], len(valores))
+        gastos = dinero.sumar_por_grupo(indices[~ingreso], montos[~ingreso], len(valores))
+        for valor, suma_ingresos, suma_gastos in zip(valores, ingresos, gastos):
+            if por == 'categoria':
+                llave = CATEGORIAS[valor]
+            elif por == 'semana':
+                llave = int(valor)
+            else:
+                semana, categoria = divmod(int(valor), len(CATEGORIAS))
+                llave = (semana // 100, semana % 100, CATEGORIAS[categoria])
+            anteriores = resultado.get(llave, (0, 0))
+            resultado[llave] = (anteriores[0] + int(suma_ingresos), anteriores[1] + int(suma_gastos))
+    return resultado
+
+
+def totales_por_semana(usuario_id, inicio, fin, archivos=None):
+    """{semana ISO: (ingresos, gastos)} en centavos archivados en [inicio, fin), como ServicioFinanzas.totales_por_semana"""
+    return totales(usuario_id, inicio, fin, por='semana', archivos=archivos)
+
+
+def totales_por_usuario_y_semana(usuario_ids, inicio, fin):
+    """{(id_usuario, año ISO, semana ISO): {categoria: (ingresos, gastos)}} archivados en [inicio, fin).
+
+    Una consulta al catálogo para todo el lote; para generar reportes por lote.
+    """
+    catalogo = {}
+    for entrada in ArchivoRegistros.objects.filter(
+        id_usuario__in=usuario_ids,
+        anio__gte=timezone.localtime(inicio).year,
+        anio__lte=timezone.localtime(fin - MICRO).year,
+    ).order_by('id_usuario', 'anio'):
+        catalogo.setdefault(entrada.id_usuario_id, []).append(entrada)
+    resultado = {}
+    for usuario_id, archivos in catalogo.items():
+        for (anio, semana, categoria), suma in totales(usuario_id, inicio, fin, 'semana_categoria', archivos).items():
+            resultado.setdefault((usuario_id, anio, semana), {})[categoria] = suma
+    return resultado
+
+
+def semanas_archivadas(usuario_ids=None):
+    """{id_usuario: [(primera, ultima)]} en AAAASS de las semanas que tocan los años archivados"""
+    archivos = ArchivoRegistros.objects.all()
+    if usuario_ids is not None:
+        archivos = archivos.filter(id_usuario__in=usuario_ids)
+    resultado = {}
+    for usuario_id, primera, ultima in archivos.values_list('id_usuario', 'primera_semana', 'ultima_semana'):
+        resultado.setdefault(usuario_id, []).append((primera, ultima))
+    return resultado
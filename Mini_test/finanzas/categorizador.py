@@ -0,0 +1,187 @@
+"""Sugerencia automática de categoría para registros financieros.
+
+Naive Bayes multinomial sobre características hasheadas de la descripción
+(palabras, pares de palabras y trigramas de caracteres), el tipo y el orden
+de magnitud del monto. El modelo se entrena offline con el comando
+entrenar_categorizador, se guarda en un .npz comprimido (CATEGORIZADOR_RUTA)
+y cada proceso lo carga una sola vez; si el archivo cambia se recarga.
+"""
+import io
+import math
+import os
+import re
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from .models import RegistroFinanciero
+
+
+DIMENSION = 2 ** 16     # cubetas del hashing trick
+ALPHA = 0.1             # suavizado de Laplace
+# Por debajo de esta probabilidad se sugiere otro_ingreso / otro_gasto
+UMBRAL_CONFIANZA = 0.5
+LOTE_PREDICCION = 4096
+CATEGORIAS = [c for c, _ in RegistroFinanciero.CATEGORIA_CHOICES]
+CATEGORIAS_POR_TIPO = {
+    'ingreso': {'salario', 'freelance', 'negocio', 'inversion', 'otro_ingreso'},
+}
+CATEGORIAS_POR_TIPO['gasto'] = set(CATEGORIAS) - CATEGORIAS_POR_TIPO['ingreso']
+OTRA = {'ingreso': 'otro_ingreso', 'gasto': 'otro_gasto'}
+PALABRA = re.compile(r'[a-z0-9ñ]+')
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes (la ñ se conserva)"""
+    texto = unicodedata.normalize('NFKD', (texto or '').lower().replace('ñ', '\0'))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).replace('\0', 'ñ')
+
+
+def tokens(descripcion, tipo, monto):
+    palabras = PALABRA.findall(normalizar(descripcion))
+    resultado = [f't:{tipo}', f'm:{tipo}:{int(math.log2(max(float(monto or 0), 1)))}']
+    resultado += palabras
+    resultado += [f'{a} {b}' for a, b in zip(palabras, palabras[1:])]
+    for palabra in palabras:
+        marcada = f'<{palabra}>'
+        resultado += [marcada[i:i + 3] for i in range(len(marcada) - 2)]
+    return resultado
+
+
+def caracteristicas(descripcion, tipo, monto):
+    """Índices hasheados (con repetición) de un registro; crc32 es estable entre procesos"""
+    return np.array([zlib.crc32(t.encode()) & (DIMENSION - 1) for t in tokens(descripcion, tipo, monto)],
+                    dtype=np.intp)
+
+
+class Categorizador:
+    def __init__(self, conteos, documentos, alpha=ALPHA):
+        """conteos: (DIMENSION, categorías) ocurrencias de cada característica; documentos: (categorías,)"""
+        self.conteos = conteos.astype(np.float32)
+        self.documentos = documentos.astype(np.float64)
+        self.alpha = alpha
+        totales = self.conteos.sum(axis=0)
+        self.log_prob = np.log((self.conteos + alpha) / (totales + alpha * DIMENSION)).astype(np.float32)
+        self.log_prior = np.log((self.documentos + 1) / (self.documentos.sum() + len(CATEGORIAS)))
+        # Un ingreso solo puede caer en categorías de ingreso y un gasto en las de gasto
+        self.mascara = {
+            tipo: np.where([c in permitidas for c in CATEGORIAS], 0.0, -np.inf)
+            for tipo, permitidas in CATEGORIAS_POR_TIPO.items()
+        }
+
+    @classmethod
+    def entrenar(cls, ejemplos, alpha=ALPHA):
+        """ejemplos: iterable de (descripcion, tipo, monto, categoria)"""
+        posicion = {c: i for i, c in enumerate(CATEGORIAS)}
+        conteos = np.zeros(DIMENSION * len(CATEGORIAS))
+        documentos = np.zeros(len(CATEGORIAS))
+        celdas = []
+        for descripcion, tipo, monto, categoria in ejemplos:
+            clase = posicion.get(categoria)
+            if clase is None:
+                continue
+            documentos[clase] += 1
+            celdas.append(caracteristicas(descripcion, tipo, monto) * len(CATEGORIAS) + clase)
+            if len(celdas) >= 10000:
+                conteos += np.bincount(np.concatenate(celdas), minlength=conteos.size)
+                celdas = []
+        if celdas:
+            conteos += np.bincount(np.concatenate(celdas), minlength=conteos.size)
+        return cls(conteos.reshape(DIMENSION, len(CATEGORIAS)), documentos, alpha)
+
+    def probabilidades(self, descripciones, tipos, montos):
+        """Matriz (registros x categorías) de probabilidades a posteriori"""
+        indices = [caracteristicas(d, t, m) for d, t, m in zip(descripciones, tipos, montos)]
+        inicios = np.cumsum([0] + [len(i) for i in indices[:-1]])
+        # Todas las filas tienen al menos los tokens de tipo y monto, así reduceat no ve filas vacías
+        puntajes = np.add.reduceat(self.log_prob[np.concatenate(indices)], inicios, axis=0)
+        puntajes += self.log_prior
+        puntajes += np.stack([self.mascara.get(t, self.mascara['gasto']) for t in tipos])
+        puntajes -= puntajes.max(axis=1, keepdims=True)
+        np.exp(puntajes, out=puntajes)
+        return puntajes / puntajes.sum(axis=1, keepdims=True)
+
+    def predecir_lote(self, descripciones, tipos, montos):
+        """[(categoria, probabilidad)] por registro; con baja confianza, la categoría 'otro' del tipo"""
+        resultado = []
+        for i in range(0, len(tipos), LOTE_PREDICCION):
+            tipos_lote = tipos[i:i + LOTE_PREDICCION]
+            prob = self.probabilidades(descripciones[i:i + LOTE_PREDICCION], tipos_lote,
+                                       montos[i:i + LOTE_PREDICCION])
+            mejores = prob.argmax(axis=1)
+            confianza = prob[np.arange(len(mejores)), mejores]
+            for tipo, mejor, p in zip(tipos_lote, mejores, confianza):
+                categoria = CATEGORIAS[mejor] if p >= UMBRAL_CONFIANZA else OTRA.get(tipo, 'otro_gasto')
+                resultado.append((categoria, float(p)))
+        return resultado
+
+    def sugerencias(self, descripcion, tipo, monto, cantidad=3):
+        """Las categorías más probables de un registro: [(categoria, probabilidad)]"""
+        prob = self.probabilidades([descripcion], [tipo], [monto])[0]
+        orden = np.argsort(prob)[::-1][:cantidad]
+        return [(CATEGORIAS[i], float(prob[i])) for i in orden if np.isfinite(prob[i]) and prob[i] > 0]
+
+    def guardar(self, ruta):
+        """Escribe el .npz en un temporal y lo reemplaza de forma atómica"""
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, categorias=np.array(CATEGORIAS), conteos=self.conteos,
+                            documentos=self.documentos, alpha=self.alpha)
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'wb') as archivo:
+            archivo.write(buffer.getvalue())
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with np.load(ruta) as datos:
+            if list(datos['categorias']) != CATEGORIAS:
+                raise ValueError('El modelo se entrenó con otras categorías; vuelva a entrenarlo')
+            return cls(datos['conteos'], datos['documentos'], float(datos['alpha']))
+
+
+_modelo = {'clave': None, 'categorizador': None}
+_candado = threading.Lock()
+
+
+def obtener():
+    """Modelo cargado en este proceso, o None si no hay modelo entrenado"""
+    ruta = settings.CATEGORIZADOR_RUTA
+    try:
+        clave = (ruta, os.stat(ruta).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    if _modelo['clave'] != clave:
+        with _candado:
+            if _modelo['clave'] != clave:
+                _modelo['categorizador'] = Categorizador.cargar(ruta)
+                _modelo['clave'] = clave
+    return _modelo['categorizador']
+
+
+def categorizar(descripcion, tipo, monto):
+    """Categoría sugerida para un registro sin categoría, o None si no hay modelo o descripción"""
+    modelo = obtener()
+    if modelo is None or not (descripcion or '').strip():
+        return None
+    return modelo.predecir_lote([descripcion], [tipo], [monto])[0][0]
+
+
+def ejemplos_entrenamiento(incluir=None):
+    """(descripcion, tipo, monto, categoria) de los registros con descripción.
+
+    Las categorías 'otro' no se usan para entrenar: son justo las que se
+    quieren evitar. incluir(id_registro) permite separar un conjunto de prueba.
+    """
+    registros = (
+        RegistroFinanciero.objects.exclude(descripcion='')
+        .exclude(categoria__in=OTRA.values())
+        .values_list('id_registro', 'descripcion', 'tipo', 'monto', 'categoria')
+        .iterator(chunk_size=5000)
+    )
+    for id_registro, descripcion, tipo, monto, categoria in registros:
+        if incluir is None or incluir(id_registro):
+            yield descripcion, tipo, monto, categoria
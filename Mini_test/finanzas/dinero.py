@@ -0,0 +1,65 @@
+"""Montos en centavos enteros.
+
+Los montos se guardan como DECIMAL con 2 decimales y la API los entrega como
+float (dashboard, resúmenes) o como texto decimal (serializers). Entre la
+base y la respuesta las sumas se hacen en centavos: int en Python, exacto y
+más barato que Decimal, e int64 en NumPy. Solo se vuelve a Decimal al
+escribir en la base (a_decimal) y a float al armar la respuesta (a_float).
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+
+
+def centavos(valor):
+    """Centavos (int) de un Decimal, int, float o texto; redondea el medio centavo hacia arriba.
+
+    Los int son soles enteros. Un float se toma por su representación más
+    corta (0.1 y no 0.1000000000000000055...). Lanza ValueError si el valor
+    no es un número finito.
+    """
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return valor * 100
+    try:
+        numero = valor if isinstance(valor, Decimal) else Decimal(
+            repr(valor) if isinstance(valor, float) else str(valor).strip()
+        )
+        numerador, denominador = numero.as_integer_ratio()
+    except (InvalidOperation, OverflowError, ValueError):
+        raise ValueError(f'{valor!r} no es un monto válido')
+    if 100 % denominador == 0:
+        # Caso de la base (DECIMAL con 2 decimales): exacto, sin aritmética Decimal
+        return numerador * (100 // denominador)
+    return int(numero.scaleb(2).to_integral_value(ROUND_HALF_UP))
+
+
+def a_decimal(cantidad):
+    """Decimal con 2 decimales de una cantidad de centavos, para guardar en un DecimalField"""
+    return Decimal(int(cantidad)).scaleb(-2)
+
+
+def a_float(cantidad):
+    """Soles como float de centavos (int o arreglo NumPy); solo para la respuesta de la API"""
+    return cantidad / 100
+
+
+def redondear(valor):
+    """valor (por ejemplo un float calculado) como Decimal al centavo"""
+    return a_decimal(centavos(valor))
+
+
+def sumar(valores):
+    """Suma exacta en centavos de montos en cualquier representación"""
+    return sum(centavos(v) for v in valores)
+
+
+def arreglo(valores):
+    """Arreglo int64 de centavos"""
+    return np.fromiter((centavos(v) for v in valores), dtype=np.int64)
+
+
+def sumar_por_grupo(grupos, cantidades, total_grupos):
+    """Suma int64 de cantidades (centavos) por grupo 0..total_grupos-1, sin pasar por float"""
+    resultado = np.zeros(total_grupos, dtype=np.int64)
+    np.add.at(resultado, grupos, cantidades)
+    return resultado
@@ -0,0 +1,250 @@
+"""Instantáneas del libro de cada usuario en archivos mapeados en memoria.
+
+La detección de anomalías (finanzas/anomalias.py) necesita los registros de
+cada usuario como arreglos y leerlos de PostgreSQL cada vez cuesta una
+conversión de Decimal por fila. Las proyecciones y la simulación no la usan:
+leen los resúmenes semanales, que ya son pocas filas. La instantánea es un
+archivo por usuario bajo INSTANTANEAS_RUTA con una cabecera de 64 bytes y
+los registros como arreglo estructurado de tipo fijo (DTYPE: fecha en
+microsegundos UTC, monto en centavos, tipo y categoría como códigos uint8),
+ordenado por (fecha, id_registro). obtener() retorna una vista de solo
+lectura sobre el mapa del archivo, sin copiar: los workers de gunicorn
+comparten las mismas páginas del caché del sistema.
+
+La cabecera guarda la marca de agua de la sincronización
+(ServicioSincronizacion.marca_actual) hasta la que la instantánea está al
+día. Las escrituras no la tocan: obtener() la pone al día al leerla,
+agregando al final los registros nuevos desde la marca; una edición, una
+eliminación o un registro con fecha anterior al último obligan a
+reconstruirla. Incluye los años
+archivados (finanzas/archivo.py). Es una caché: el directorio se puede
+borrar en cualquier momento.
+"""
+import fcntl
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from heapq import merge
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from . import archivo, dinero
+from .models import RegistroFinanciero
+
+
+DTYPE = np.dtype([
+    ('id_registro', '<i8'),
+    ('fecha', '<i8'),       # microsegundos desde 1970-01-01 UTC
+    ('monto', '<i8'),       # centavos
+    ('tipo', 'u1'),         # índice en archivo.TIPOS
+    ('categoria', 'u1'),    # índice en archivo.CATEGORIAS
+], align=True)
+MAGICO = b'BZINST01'
+# mágico, marca, cantidad y crc32 de (marca, cantidad): un lector sin bloqueo descarta una cabecera a medio escribir
+CABECERA = struct.Struct('<8sqqI')
+TAMANO_CABECERA = 64
+MAX_MAPAS = 256     # mapas abiertos por proceso (cada uno retiene un descriptor)
+
+_mapas = OrderedDict()
+_candado = threading.Lock()
+
+
+def ruta(usuario_id):
+    return os.path.join(settings.INSTANTANEAS_RUTA, f'{usuario_id}.bin')
+
+
+def _cabecera(marca, cantidad):
+    return CABECERA.pack(MAGICO, marca, cantidad, zlib.crc32(struct.pack('<qq', marca, cantidad)))
+
+
+@contextmanager
+def _bloqueo(usuario_id):
+    """Excluye a otros procesos que escriben la instantánea del usuario (los lectores no lo toman)"""
+    os.makedirs(settings.INSTANTANEAS_RUTA, exist_ok=True)
+    with open(os.path.join(settings.INSTANTANEAS_RUTA, f'{usuario_id}.lock'), 'a') as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        yield
+
+
+def _mapa(usuario_id):
+    """Mapa de bytes del archivo, reutilizado mientras no cambie de inodo ni de tamaño"""
+    try:
+        estado = os.stat(ruta(usuario_id))
+    except FileNotFoundError:
+        return None
+    clave = (estado.st_ino, estado.st_size)
+    with _candado:
+        entrada = _mapas.get(usuario_id)
+        if entrada is None or entrada[0] != clave:
+            if estado.st_size < TAMANO_CABECERA:
+                return None
+            entrada = (clave, np.memmap(ruta(usuario_id), dtype=np.uint8, mode='r'))
+            _mapas[usuario_id] = entrada
+            if len(_mapas) > MAX_MAPAS:
+                _mapas.popitem(last=False)
+        _mapas.move_to_end(usuario_id)
+        return entrada[1]
+
+
+def vista(usuario_id):
+    """(marca, registros) de la instantánea tal como está, sin consultar la base; None si no hay"""
+    mapa = _mapa(usuario_id)
+    if mapa is None:
+        return None
+    magico, marca, cantidad, control = CABECERA.unpack_from(mapa)
+    if (magico != MAGICO or control != zlib.crc32(struct.pack('<qq', marca, cantidad))
+            or TAMANO_CABECERA + cantidad * DTYPE.itemsize > len(mapa)):
+        return None
+    return marca, np.frombuffer(mapa, dtype=DTYPE, count=cantidad, offset=TAMANO_CABECERA)
+
+
+def hay_cambios(usuario_id, marca):
+    """Si el libro del usuario cambió después de la marca (una consulta por los índices de secuencia_cambio)"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT EXISTS (SELECT 1 FROM registro_financiero WHERE id_usuario_id = %s AND secuencia_cambio > %s)
+                OR EXISTS (SELECT 1 FROM eliminacion_sincronizada
+                           WHERE id_usuario_id = %s AND modelo = 'registro' AND secuencia_cambio > %s)
+                OR EXISTS (SELECT 1 FROM version_financiera WHERE id_usuario_id = %s AND secuencia_purgada > %s)
+            """,
+            [usuario_id, marca] * 3
+        )
+        return cursor.fetchone()[0]
+
+
+def obtener(usuario_id, verificar=True):
+    """Registros del usuario como arreglo DTYPE de solo lectura (vista del archivo, sin copia).
+
+    Con verificar se comprueba con una consulta que no haya cambios después
+    de la marca y, si los hay, se pone al día antes. Sin verificar no toca la
+    base si ya existe: refleja el libro hasta la última escritura aplicada.
+    """
+    actual = vista(usuario_id)
+    if actual is None or (verificar and hay_cambios(usuario_id, actual[0])):
+        actualizar(usuario_id)
+        actual = vista(usuario_id)
+    return actual[1]
+
+
+def _arreglo(filas):
+    """Arreglo DTYPE de filas (id_registro, fecha, tipo, categoria, monto) ordenadas por (fecha, id)"""
+    tipos = {t: i for i, t in enumerate(archivo.TIPOS)}
+    categorias = {c: i for i, c in enumerate(archivo.CATEGORIAS)}
+    return np.array(
+        [((id_registro, (fecha - archivo.EPOCA) // archivo.MICRO, dinero.centavos(monto),
+           tipos[tipo], categorias[categoria]))
+         for id_registro, fecha, tipo, categoria, monto in filas],
+        dtype=DTYPE
+    )
+
+
+def _de_la_tabla(usuario_id, desde, hasta):
+    """Registros de la tabla con secuencia_cambio en (desde, hasta], ordenados por (fecha, id)"""
+    return (
+        RegistroFinanciero.objects
+        .filter(id_usuario=usuario_id, secuencia_cambio__gt=desde, secuencia_cambio__lte=hasta)
+        .order_by('fecha', 'id_registro')
+        .values_list('id_registro', 'fecha', 'tipo', 'categoria', 'monto')
+        .iterator(chunk_size=5000)
+    )
+
+
+def _escribir(usuario_id, registros, marca):
+    """Reemplaza el archivo de forma atómica; los mapas abiertos siguen viendo el anterior"""
+    temporal = f'{ruta(usuario_id)}.{os.getpid()}.tmp'
+    with open(temporal, 'wb') as salida:
+        salida.write(_cabecera(marca, len(registros)).ljust(TAMANO_CABECERA, b'\0'))
+        salida.write(registros.tobytes())
+    os.replace(temporal, ruta(usuario_id))
+
+
+def _agregar(usuario_id, nuevos, marca, cantidad):
+    """Escribe los registros después de los cantidad existentes y recién entonces la cabecera"""
+    with open(ruta(usuario_id), 'r+b') as salida:
+        salida.seek(TAMANO_CABECERA + cantidad * DTYPE.itemsize)
+        salida.write(nuevos.tobytes())
+        salida.truncate()
+        salida.flush()
+        os.pwrite(salida.fileno(), _cabecera(marca, cantidad + len(nuevos)), 0)
+
+
+def reconstruir(usuario_id):
+    """Vuelve a generar la instantánea desde la tabla y los años archivados. Retorna la cantidad de registros"""
+    from .servicios import ServicioSincronizacion
+    with _bloqueo(usuario_id):
+        marca = ServicioSincronizacion.marca_actual(usuario_id)
+        return _reconstruir(usuario_id, marca)
+
+
+def _reconstruir(usuario_id, marca):
+    # Solo hasta la marca: lo que cambie después llega como registro nuevo o eliminación
+    archivados = (f[:5] for f in archivo.rango(usuario_id))
+    filas = merge(archivados, _de_la_tabla(usuario_id, 0, marca), key=lambda f: (f[1], f[0]))
+    registros = _arreglo(filas)
+    _escribir(usuario_id, registros, marca)
+    return len(registros)
+
+
+def actualizar(usuario_id):
+    """Pone al día la instantánea del usuario, creándola si no existe.
+
+    Los registros nuevos desde la marca se agregan al final si siguen el
+    orden por fecha; ante ediciones, eliminaciones o purgas se reconstruye.
+    """
+    from .servicios import ServicioSincronizacion
+    with _bloqueo(usuario_id):
+        marca = ServicioSincronizacion.marca_actual(usuario_id)
+        actual = vista(usuario_id)
+        if actual is None:
+            return _reconstruir(usuario_id, marca)
+        anterior, registros = actual
+        if marca <= anterior:
+            return len(registros)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT EXISTS (SELECT 1 FROM eliminacion_sincronizada WHERE id_usuario_id = %s
+                               AND modelo = 'registro' AND secuencia_cambio > %s AND secuencia_cambio <= %s)
+                    OR EXISTS (SELECT 1 FROM version_financiera WHERE id_usuario_id = %s AND secuencia_purgada > %s)
+                """,
+                [usuario_id, anterior, marca, usuario_id, anterior]
+            )
+            if cursor.fetchone()[0]:
+                return _reconstruir(usuario_id, marca)
+        nuevos = _arreglo(_de_la_tabla(usuario_id, anterior, marca))
+        if len(nuevos) and len(registros):
+            ultimo = registros[-1]
+            editados = (nuevos['id_registro'].min() <= registros['id_registro'].max()
+                        and np.isin(nuevos['id_registro'], registros['id_registro']).any())
+            if editados or (nuevos[0]['fecha'], nuevos[0]['id_registro']) < (ultimo['fecha'], ultimo['id_registro']):
+                return _reconstruir(usuario_id, marca)
+        _agregar(usuario_id, nuevos, marca, len(registros))
+        return len(registros) + len(nuevos)
+
+
+def borrar(usuario_id):
+    with _bloqueo(usuario_id):
+        try:
+            os.remove(ruta(usuario_id))
+        except FileNotFoundError:
+            pass
+
+
+def rango(registros, inicio=None, fin=None):
+    """Registros con fecha en [inicio, fin) como vista (el arreglo está ordenado por fecha)"""
+    fechas = registros['fecha']
+    desde = 0 if inicio is None else np.searchsorted(fechas, (inicio - archivo.EPOCA) // archivo.MICRO)
+    hasta = len(fechas) if fin is None else np.searchsorted(fechas, (fin - archivo.EPOCA) // archivo.MICRO)
+    return registros[desde:hasta]
+
+
+def montos(registros):
+    """Montos en soles como float64 (con signo: los gastos negativos)"""
+    signo = np.where(registros['tipo'] == archivo.TIPOS.index('ingreso'), 1, -1)
+    return dinero.a_float(registros['monto'] * signo)
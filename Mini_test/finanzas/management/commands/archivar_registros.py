@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from finanzas import archivo
+
+
+class Command(BaseCommand):
+    help = 'Archiva en archivos comprimidos por usuario los años del libro fuera del horizonte activo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--anio', type=int, action='append',
+                            help='Año a archivar (se puede repetir); por defecto todos los archivables')
+        parser.add_argument('--usuario', type=int, action='append', help='Solo estos usuarios (id)')
+        parser.add_argument('--lote', type=int, default=200, help='Usuarios por transacción')
+        parser.add_argument('--restaurar', action='store_true',
+                            help='Devuelve a la tabla los registros archivados de --anio')
+
+    def handle(self, *args, **options):
+        anios, usuarios = options['anio'], options['usuario']
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor a 0')
+
+        if options['restaurar']:
+            if not anios:
+                raise CommandError('--restaurar requiere --anio')
+            for anio in anios:
+                total = archivo.restaurar(anio, usuarios)
+                self.stdout.write(self.style.SUCCESS(f'✓ {anio}: {total} registros restaurados'))
+            return
+
+        inicio = time.perf_counter()
+        try:
+            resultado = archivo.archivar(anios, usuarios, tamano_lote=options['lote'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not resultado:
+            self.stdout.write('No hay años para archivar')
+        for anio, (cantidad, tamano) in resultado.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {anio}: {cantidad} registros archivados ({tamano / 1024 ** 2:.1f} MB en archivos)'
+            ))
+        self.stdout.write(f'Tiempo: {time.perf_counter() - inicio:.1f} s')
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from finanzas import anomalias
+
+
+class Command(BaseCommand):
+    help = 'Detecta gastos inusuales y gastos hormiga de todos los usuarios con gastos recientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos en paralelo; cada uno analiza lotes de usuarios independientes')
+        parser.add_argument('--lote', type=int, default=500,
+                            help='Usuarios por lote (una consulta de gastos por lote)')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['lote'] < 1:
+            raise CommandError('--workers y --lote deben ser mayores a 0')
+        inicio = time.perf_counter()
+        total = anomalias.detectar_todas(tamano_lote=options['lote'], procesos=options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} anomalías detectadas en {time.perf_counter() - inicio:.1f} s'
+        ))
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from finanzas import categorizador
+
+
+class Command(BaseCommand):
+    help = 'Entrena el categorizador automático con las descripciones de los registros existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--salida', default=None,
+                            help='Ruta del .npz (por defecto settings.CATEGORIZADOR_RUTA)')
+        parser.add_argument('--minimo', type=int, default=100,
+                            help='Registros con descripción necesarios para entrenar')
+        parser.add_argument('--sin-evaluar', action='store_true',
+                            help='No medir la precisión con un 20%% de registros reservados')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if not options['sin_evaluar']:
+            # Se reservan los registros con id múltiplo de 5 para medir la precisión
+            modelo = categorizador.Categorizador.entrenar(
+                categorizador.ejemplos_entrenamiento(lambda id_registro: id_registro % 5 != 0)
+            )
+            prueba = list(categorizador.ejemplos_entrenamiento(lambda id_registro: id_registro % 5 == 0))
+            if prueba:
+                descripciones, tipos, montos, categorias = zip(*prueba)
+                predichas = modelo.predecir_lote(descripciones, tipos, montos)
+                aciertos = sum(p == c for (p, _), c in zip(predichas, categorias))
+                self.stdout.write(f'Precisión en {len(prueba)} registros reservados: {aciertos / len(prueba):.1%}')
+
+        modelo = categorizador.Categorizador.entrenar(categorizador.ejemplos_entrenamiento())
+        total = int(modelo.documentos.sum())
+        if total < options['minimo']:
+            raise CommandError(f'Solo hay {total} registros con descripción (mínimo {options["minimo"]})')
+
+        ruta = options['salida'] or settings.CATEGORIZADOR_RUTA
+        modelo.guardar(ruta)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Categorizador entrenado con {total} registros en {time.perf_counter() - inicio:.1f} s -> {ruta}'
+        ))
@@ -0,0 +1,76 @@
+import time
+from datetime import date
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _inicializar_proceso():
+    """Cada proceso hijo configura Django y abre su propia conexión"""
+    import django
+    django.setup()
+
+
+def _procesar_usuarios(args):
+    """Genera los reportes de una partición de usuarios, lote por lote"""
+    from finanzas.servicios import ServicioFinanzas
+
+    usuario_ids, semanas, tamano_lote = args
+    total = 0
+    for i in range(0, len(usuario_ids), tamano_lote):
+        total += ServicioFinanzas.generar_reportes_lote(usuario_ids[i:i + tamano_lote], semanas)
+    return total
+
+
+class Command(BaseCommand):
+    help = 'Genera los ReporteFinanciero de todos los usuarios para cada semana ISO de un rango de fechas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, required=True,
+                            help='Primer día del rango (YYYY-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, required=True,
+                            help='Último día del rango (YYYY-MM-DD)')
+        parser.add_argument('--usuario', type=int, action='append', dest='usuarios',
+                            help='Limitar a este id_usuario (se puede repetir)')
+        parser.add_argument('--lote', type=int, default=500,
+                            help='Usuarios por consulta agrupada')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Procesos en paralelo entre los que se reparten los usuarios')
+
+    def handle(self, *args, **options):
+        from django.db import connections
+        from finanzas.servicios import ServicioFinanzas
+        from usuarios.models import Usuario
+
+        if options['desde'] > options['hasta']:
+            raise CommandError('--desde no puede ser posterior a --hasta')
+        if options['workers'] < 1 or options['lote'] < 1:
+            raise CommandError('--workers y --lote deben ser mayores a 0')
+
+        semanas = ServicioFinanzas.semanas_en_rango(options['desde'], options['hasta'])
+        usuarios = Usuario.objects.filter(is_active=True).order_by('id_usuario')
+        if options['usuarios']:
+            usuarios = usuarios.filter(id_usuario__in=options['usuarios'])
+        usuario_ids = list(usuarios.values_list('id_usuario', flat=True))
+
+        workers = min(options['workers'], len(usuario_ids)) or 1
+        particiones = [
+            (usuario_ids[i::workers], semanas, options['lote'])
+            for i in range(workers)
+        ]
+
+        inicio = time.perf_counter()
+        if workers == 1:
+            total = _procesar_usuarios(particiones[0])
+        else:
+            # Los hijos no deben heredar la conexión abierta del proceso padre
+            connections.close_all()
+            with get_context().Pool(workers, initializer=_inicializar_proceso) as pool:
+                total = sum(pool.map(_procesar_usuarios, particiones))
+        duracion = time.perf_counter() - inicio
+
+        velocidad = total / duracion if duracion > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {total} reportes ({len(usuario_ids)} usuarios x {len(semanas)} semanas) '
+            f'en {duracion:.2f}s con {workers} worker(s): {velocidad:.1f} reportes/s'
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from finanzas import instantaneas
+from finanzas.models import RegistroFinanciero
+
+
+class Command(BaseCommand):
+    help = 'Genera (o borra) las instantáneas del libro por usuario usadas por los análisis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, action='append', help='Id de usuario (se puede repetir)')
+        parser.add_argument('--todos', action='store_true', help='Todos los usuarios con registros')
+        parser.add_argument('--borrar', action='store_true', help='Borra las instantáneas en lugar de generarlas')
+
+    def handle(self, *args, **options):
+        usuarios = options['usuario']
+        if options['todos']:
+            usuarios = RegistroFinanciero.objects.order_by().values_list('id_usuario', flat=True).distinct()
+        elif not usuarios:
+            raise CommandError('Indique --usuario ID o --todos')
+
+        inicio = time.perf_counter()
+        cantidad = registros = 0
+        for usuario_id in usuarios:
+            if options['borrar']:
+                instantaneas.borrar(usuario_id)
+            else:
+                registros += instantaneas.reconstruir(usuario_id)
+            cantidad += 1
+        accion = 'borradas' if options['borrar'] else f'generadas ({registros} registros)'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {cantidad} instantáneas {accion} en {time.perf_counter() - inicio:.1f} s'
+        ))
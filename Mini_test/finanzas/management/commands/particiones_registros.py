@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from finanzas import particiones
+
+
+class Command(BaseCommand):
+    help = 'Administra las particiones por año de registro_financiero (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('accion', nargs='?', default='listar',
+                            choices=['listar', 'asegurar', 'verificar', 'crear'],
+                            help='listar (por defecto), asegurar (año actual y siguiente), verificar (ids '
+                                 'repetidos) o crear (--anio)')
+        parser.add_argument('--anio', type=int, help='Año de la partición')
+
+    def handle(self, *args, **options):
+        if not particiones.esta_particionada():
+            raise CommandError('registro_financiero no está particionada (requiere PostgreSQL y la migración 0016)')
+        accion, anio = options['accion'], options['anio']
+        if accion == 'crear' and anio is None:
+            raise CommandError(f'{accion} requiere --anio')
+
+        if accion == 'verificar':
+            repetidos = particiones.ids_repetidos()
+            if repetidos:
+                raise CommandError(f'id_registro repetidos: {repetidos}')
+            self.stdout.write(self.style.SUCCESS('✓ Ningún id_registro repetido'))
+        elif accion == 'asegurar':
+            creados = particiones.asegurar()
+            self.stdout.write(self.style.SUCCESS(f'✓ Particiones creadas: {creados or "ninguna"}'))
+        elif accion == 'crear':
+            filas = particiones.crear_particion(anio)
+            self.stdout.write(self.style.SUCCESS(f'✓ Partición {anio} creada ({filas} filas desde default)'))
+
+        for p in particiones.particiones():
+            self.stdout.write(f"{p['nombre']}: ~{p['filas']} filas, {p['bytes'] / 1024 ** 2:.1f} MB")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from finanzas.servicios import ServicioResumenSemanal
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla de resúmenes semanales por categoría a partir de los registros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, action='append', dest='usuarios',
+                            help='Reconstruir solo para este id_usuario (se puede repetir)')
+        parser.add_argument('--lote', type=int, default=1000,
+                            help='Tamaño de lote para la inserción masiva')
+
+    def handle(self, *args, **options):
+        total = ServicioResumenSemanal.reconstruir(options['usuarios'], tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} resúmenes semanales reconstruidos'))
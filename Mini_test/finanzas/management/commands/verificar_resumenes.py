@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from finanzas.servicios import ServicioResumenSemanal
+
+
+class Command(BaseCommand):
+    help = 'Verifica que los resúmenes semanales coincidan con los registros financieros'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, action='append', dest='usuarios',
+                            help='Verificar solo este id_usuario (se puede repetir)')
+        parser.add_argument('--reparar', action='store_true',
+                            help='Reconstruir los resúmenes de los usuarios con diferencias')
+
+    def handle(self, *args, **options):
+        diferencias = ServicioResumenSemanal.verificar(options['usuarios'])
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('✓ Resúmenes semanales consistentes'))
+            return
+
+        for d in diferencias:
+            self.stdout.write(
+                f"Usuario {d['id_usuario']} semana {d['semana']}/{d['anio']} {d['categoria']}: "
+                f"esperado={d['esperado']} actual={d['actual']}"
+            )
+
+        if options['reparar']:
+            usuarios = sorted({d['id_usuario'] for d in diferencias})
+            ServicioResumenSemanal.reconstruir(usuarios)
+            self.stdout.write(self.style.SUCCESS(f'✓ Resúmenes reconstruidos para {len(usuarios)} usuarios'))
+            return
+
+        raise CommandError(f'{len(diferencias)} diferencias encontradas')
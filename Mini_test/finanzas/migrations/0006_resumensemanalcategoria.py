@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:35
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractIsoYear, ExtractWeek
+
+
+def poblar_resumenes(apps, schema_editor):
+    """Calcula los resúmenes semanales de los registros existentes"""
+    RegistroFinanciero = apps.get_model('finanzas', 'RegistroFinanciero')
+    ResumenSemanalCategoria = apps.get_model('finanzas', 'ResumenSemanalCategoria')
+
+    filas = (
+        RegistroFinanciero.objects
+        .annotate(anio_iso=ExtractIsoYear('fecha'), semana_iso=ExtractWeek('fecha'))
+        .values('id_usuario', 'anio_iso', 'semana_iso', 'categoria')
+        .annotate(
+            ingresos=Sum('monto', filter=Q(tipo='ingreso'), default=Decimal('0')),
+            gastos=Sum('monto', filter=Q(tipo='gasto'), default=Decimal('0')),
+            cantidad=Count('id_registro'),
+        )
+        .order_by()
+    )
+    ResumenSemanalCategoria.objects.bulk_create([
+        ResumenSemanalCategoria(
+            id_usuario_id=f['id_usuario'],
+            anio=f['anio_iso'],
+            semana=f['semana_iso'],
+            categoria=f['categoria'],
+            total_ingresos=f['ingresos'],
+            total_gastos=f['gastos'],
+            cantidad_registros=f['cantidad'],
+        )
+        for f in filas
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0005_alter_reportefinanciero_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenSemanalCategoria',
+            fields=[
+                ('id_resumen', models.AutoField(primary_key=True, serialize=False)),
+                ('anio', models.IntegerField()),
+                ('semana', models.IntegerField()),
+                ('categoria', models.CharField(choices=[('salario', 'Salario'), ('freelance', 'Freelance'), ('negocio', 'Negocio Propio'), ('inversion', 'Inversión'), ('otro_ingreso', 'Otro Ingreso'), ('alimentacion', 'Alimentación'), ('transporte', 'Transporte'), ('vivienda', 'Vivienda'), ('servicios', 'Servicios'), ('educacion', 'Educación'), ('salud', 'Salud'), ('entretenimiento', 'Entretenimiento'), ('ropa', 'Ropa'), ('deudas', 'Pago de Deudas'), ('ahorro', 'Ahorro'), ('otro_gasto', 'Otro Gasto')], max_length=30)),
+                ('total_ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_gastos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_registros', models.IntegerField(default=0)),
+                ('id_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_semanales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Resumen Semanal por Categoría',
+                'verbose_name_plural': 'Resúmenes Semanales por Categoría',
+                'db_table': 'resumen_semanal_categoria',
+                'ordering': ['-anio', '-semana', 'categoria'],
+                'unique_together': {('id_usuario', 'anio', 'semana', 'categoria')},
+            },
+        ),
+        migrations.RunPython(poblar_resumenes, migrations.RunPython.noop),
+    ]
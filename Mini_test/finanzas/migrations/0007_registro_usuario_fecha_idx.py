@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0006_resumensemanalcategoria'),
+        ('oportunidades', '0002_poblar_oportunidades_iniciales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registrofinanciero',
+            index=models.Index(fields=['id_usuario', 'fecha'], name='registro_usuario_fecha_idx'),
+        ),
+    ]
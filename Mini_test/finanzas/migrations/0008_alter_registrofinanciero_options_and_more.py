@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0007_registro_usuario_fecha_idx'),
+        ('oportunidades', '0002_poblar_oportunidades_iniciales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='registrofinanciero',
+            options={'ordering': ['-fecha', '-id_registro'], 'verbose_name': 'Registro Financiero', 'verbose_name_plural': 'Registros Financieros'},
+        ),
+        migrations.RemoveIndex(
+            model_name='registrofinanciero',
+            name='registro_usuario_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='registrofinanciero',
+            index=models.Index(fields=['id_usuario', 'fecha', 'id_registro'], name='registro_usuario_fecha_idx'),
+        ),
+    ]
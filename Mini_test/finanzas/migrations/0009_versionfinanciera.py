@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0008_alter_registrofinanciero_options_and_more'),
+        ('usuarios', '0002_alter_usuario_perfil'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionFinanciera',
+            fields=[
+                ('id_usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='version_financiera', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.BigIntegerField(default=0)),
+                ('fecha_modificacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Versión Financiera',
+                'verbose_name_plural': 'Versiones Financieras',
+                'db_table': 'version_financiera',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0009_versionfinanciera'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportefinanciero',
+            name='version_registros',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    """Un aporte por meta con el monto_actual acumulado antes de existir el libro"""
+    MetaFinanciera = apps.get_model('finanzas', 'MetaFinanciera')
+    AporteMeta = apps.get_model('finanzas', 'AporteMeta')
+    AporteMeta.objects.bulk_create([
+        AporteMeta(id_meta_id=id_meta, monto=monto, descripcion='Saldo inicial')
+        for id_meta, monto in MetaFinanciera.objects.filter(monto_actual__gt=0).values_list('id_meta', 'monto_actual')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0010_reportefinanciero_version_registros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AporteMeta',
+            fields=[
+                ('id_aporte', models.AutoField(primary_key=True, serialize=False)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('descripcion', models.CharField(blank=True, max_length=200)),
+                ('id_meta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aportes', to='finanzas.metafinanciera')),
+            ],
+            options={
+                'verbose_name': 'Aporte a Meta',
+                'verbose_name_plural': 'Aportes a Metas',
+                'db_table': 'aporte_meta',
+                'ordering': ['-fecha', '-id_aporte'],
+                'indexes': [models.Index(fields=['id_meta', 'fecha'], name='aporte_meta_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
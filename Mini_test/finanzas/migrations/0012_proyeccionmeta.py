@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0011_aportemeta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProyeccionMeta',
+            fields=[
+                ('id_meta', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='proyeccion', serialize=False, to='finanzas.metafinanciera')),
+                ('ahorro_semanal_requerido', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('ahorro_semanal_estimado', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('semanas_estimadas', models.IntegerField(blank=True, null=True)),
+                ('fecha_estimada', models.DateField(blank=True, null=True)),
+                ('en_camino', models.BooleanField(default=False)),
+                ('version_registros', models.BigIntegerField(default=0)),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Proyección de Meta',
+                'verbose_name_plural': 'Proyecciones de Metas',
+                'db_table': 'proyeccion_meta',
+            },
+        ),
+    ]
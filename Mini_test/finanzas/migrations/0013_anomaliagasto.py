@@ -0,0 +1,42 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0012_proyeccionmeta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomaliaGasto',
+            fields=[
+                ('id_anomalia', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('registro', 'Gasto inusual'), ('semana', 'Semana inusual'), ('hormiga', 'Gastos hormiga')], max_length=10)),
+                ('categoria', models.CharField(max_length=30)),
+                ('anio', models.IntegerField()),
+                ('semana', models.IntegerField()),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('referencia', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('puntaje', models.FloatField(blank=True, null=True)),
+                ('cantidad', models.IntegerField(default=1)),
+                ('version_registros', models.BigIntegerField(default=0)),
+                ('fecha_deteccion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id_registro', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='anomalias', to='finanzas.registrofinanciero')),
+                ('id_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalias_gasto', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Anomalía de Gasto',
+                'verbose_name_plural': 'Anomalías de Gasto',
+                'db_table': 'anomalia_gasto',
+                'ordering': ['-anio', '-semana', '-monto'],
+                'indexes': [models.Index(fields=['id_usuario', 'anio', 'semana'], name='anomalia_usuario_semana_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:16
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def copiar_detalles(apps, schema_editor):
+    """Una fila por categoría de cada detalle_por_categoria existente"""
+    ReporteFinanciero = apps.get_model('finanzas', 'ReporteFinanciero')
+    DetalleReporteCategoria = apps.get_model('finanzas', 'DetalleReporteCategoria')
+    centavos = Decimal('0.01')
+    lote = []
+    reportes = ReporteFinanciero.objects.values_list('id_reporte', 'id_usuario_id', 'anio', 'semana',
+                                                     'detalle_por_categoria')
+    for id_reporte, id_usuario, anio, semana, detalle in reportes.iterator(chunk_size=2000):
+        for categoria, montos in (detalle or {}).items():
+            lote.append(DetalleReporteCategoria(
+                id_reporte_id=id_reporte, id_usuario_id=id_usuario, anio=anio, semana=semana,
+                categoria=categoria,
+                ingresos=Decimal(str(montos.get('ingresos', 0))).quantize(centavos),
+                gastos=Decimal(str(montos.get('gastos', 0))).quantize(centavos),
+            ))
+        if len(lote) >= 5000:
+            DetalleReporteCategoria.objects.bulk_create(lote)
+            lote = []
+    DetalleReporteCategoria.objects.bulk_create(lote)
+
+
+def restaurar_json(apps, schema_editor):
+    ReporteFinanciero = apps.get_model('finanzas', 'ReporteFinanciero')
+    DetalleReporteCategoria = apps.get_model('finanzas', 'DetalleReporteCategoria')
+    detalles = {}
+    for d in DetalleReporteCategoria.objects.iterator(chunk_size=5000):
+        detalles.setdefault(d.id_reporte_id, {})[d.categoria] = {'ingresos': float(d.ingresos),
+                                                                 'gastos': float(d.gastos)}
+    reportes = list(ReporteFinanciero.objects.filter(id_reporte__in=detalles))
+    for reporte in reportes:
+        reporte.detalle_por_categoria = detalles[reporte.id_reporte]
+    ReporteFinanciero.objects.bulk_update(reportes, ['detalle_por_categoria'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0013_anomaliagasto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetalleReporteCategoria',
+            fields=[
+                ('id_detalle', models.AutoField(primary_key=True, serialize=False)),
+                ('anio', models.IntegerField()),
+                ('semana', models.IntegerField()),
+                ('categoria', models.CharField(max_length=30)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('gastos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('id_reporte', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles', to='finanzas.reportefinanciero')),
+                ('id_usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detalles_reporte', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Detalle de Reporte por Categoría',
+                'verbose_name_plural': 'Detalles de Reporte por Categoría',
+                'db_table': 'detalle_reporte_categoria',
+                'ordering': ['categoria'],
+                'indexes': [models.Index(fields=['id_usuario', 'categoria', 'anio', 'semana'], include=('ingresos', 'gastos'), name='detalle_usuario_categoria_idx')],
+                'constraints': [models.UniqueConstraint(fields=('id_reporte', 'categoria'), name='detalle_reporte_categoria_unico')],
+            },
+        ),
+        migrations.RunPython(copiar_detalles, restaurar_json),
+        # Con default el campo se puede volver a crear al revertir la migración
+        migrations.AlterField(
+            model_name='reportefinanciero',
+            name='detalle_por_categoria',
+            field=models.JSONField(default=dict),
+        ),
+        migrations.RemoveField(
+            model_name='reportefinanciero',
+            name='detalle_por_categoria',
+        ),
+        # El índice compuesto registro_usuario_fecha_idx ya empieza por id_usuario
+        migrations.AlterField(
+            model_name='registrofinanciero',
+            name='id_usuario',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='registros_financieros', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
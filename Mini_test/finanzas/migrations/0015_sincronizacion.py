@@ -0,0 +1,75 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:35
+
+import django.db.models.deletion
+import django.utils.timezone
+import finanzas.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0014_detallereportecategoria'),
+        ('oportunidades', '0002_poblar_oportunidades_iniciales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Secuencia global de cambios; las filas existentes reciben su número al agregar la columna
+        migrations.RunSQL(
+            'CREATE SEQUENCE IF NOT EXISTS finanzas_secuencia_cambio',
+            'DROP SEQUENCE IF EXISTS finanzas_secuencia_cambio',
+        ),
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id_eliminacion', models.BigAutoField(primary_key=True, serialize=False)),
+                ('modelo', models.CharField(choices=[('registro', 'Registro Financiero'), ('meta', 'Meta Financiera')], max_length=10)),
+                ('id_objeto', models.IntegerField()),
+                ('secuencia_cambio', models.BigIntegerField(db_default=finanzas.models.SiguienteCambio(), editable=False)),
+                ('fecha_eliminacion', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Eliminación',
+                'verbose_name_plural': 'Eliminaciones',
+                'db_table': 'eliminacion_sincronizada',
+            },
+        ),
+        migrations.AddField(
+            model_name='metafinanciera',
+            name='secuencia_cambio',
+            field=models.BigIntegerField(db_default=finanzas.models.SiguienteCambio(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='registrofinanciero',
+            name='secuencia_cambio',
+            field=models.BigIntegerField(db_default=finanzas.models.SiguienteCambio(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='versionfinanciera',
+            name='secuencia_purgada',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='metafinanciera',
+            index=models.Index(fields=['id_usuario', 'secuencia_cambio'], name='meta_usuario_cambio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registrofinanciero',
+            index=models.Index(fields=['id_usuario', 'secuencia_cambio'], name='registro_usuario_cambio_idx'),
+        ),
+        migrations.AddField(
+            model_name='eliminacion',
+            name='id_usuario',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='eliminaciones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['id_usuario', 'secuencia_cambio'], name='eliminacion_usuario_cambio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['fecha_eliminacion'], name='eliminacion_fecha_idx'),
+        ),
+    ]
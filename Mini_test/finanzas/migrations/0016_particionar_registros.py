@@ -0,0 +1,142 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+# Copia del DDL de finanzas/particiones.py al momento de esta migración: el
+# módulo puede cambiar después y la migración tiene que seguir igual.
+TABLA = 'registro_financiero'
+DEFECTO = 'default'
+ANTERIOR = 'registro_financiero_sin_particionar'
+
+
+def _literal(anio):
+    return "'%s'::timestamptz" % datetime(anio, 1, 1, tzinfo=ZoneInfo(settings.TIME_ZONE)).isoformat()
+
+
+def _crear_particion(cursor, anio):
+    """Crea la partición de un año (o DEFECTO) con las filas de ANTERIOR que le tocan y la adjunta"""
+    nombre = f'{TABLA}_{anio}'
+    cursor.execute(f'CREATE TABLE "{nombre}" (LIKE "{TABLA}" INCLUDING DEFAULTS)')
+    if anio == DEFECTO:
+        valores = 'DEFAULT'
+    else:
+        valores = f'FOR VALUES FROM ({_literal(anio)}) TO ({_literal(anio + 1)})'
+        cursor.execute(f'INSERT INTO "{nombre}" SELECT * FROM "{ANTERIOR}" '
+                       f'WHERE fecha >= {_literal(anio)} AND fecha < {_literal(anio + 1)}')
+    # Índices iguales a los del padre antes de adjuntar: ATTACH los reutiliza
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique, i.indisprimary
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+        """,
+        [TABLA]
+    )
+    for indice, definicion, unico, primaria in cursor.fetchall():
+        columnas = definicion.split(' USING ', 1)[1]
+        if primaria:
+            cursor.execute(f'ALTER TABLE "{nombre}" ADD CONSTRAINT "{nombre}_pkey" '
+                           f'PRIMARY KEY {columnas[columnas.index("("):]}')
+        else:
+            cursor.execute(f'CREATE {"UNIQUE " if unico else ""}INDEX "{f"{indice}_{anio}"[:63]}" '
+                           f'ON "{nombre}" USING {columnas}')
+    cursor.execute(f'ALTER TABLE "{TABLA}" ATTACH PARTITION "{nombre}" {valores}')
+
+
+def _indices_y_llaves(cursor, tabla):
+    """(índices [(nombre, definición, es_primaria)], llaves foráneas [(nombre, definición)]) de una tabla"""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+        """,
+        [tabla]
+    )
+    indices = cursor.fetchall()
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [tabla]
+    )
+    return indices, cursor.fetchall()
+
+
+def _posicion_secuencia(cursor, tabla):
+    """(last_value, is_called) de la secuencia de id_registro, para no reutilizar ids de filas borradas"""
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id_registro')", [tabla])
+    cursor.execute(f'SELECT last_value, is_called FROM {cursor.fetchone()[0]}')
+    return cursor.fetchone()
+
+
+def _recrear(cursor, destino, indices, llaves, primaria):
+    """Crea en destino los índices y llaves de la tabla anterior, que primero libera los nombres"""
+    for nombre, definicion, es_primaria in indices:
+        cursor.execute(f'ALTER INDEX "{nombre}" RENAME TO "{nombre[:54]}_anterior"')
+    for nombre, definicion, es_primaria in indices:
+        columnas = definicion.split(' USING ', 1)[1]
+        if es_primaria:
+            cursor.execute(f'ALTER TABLE "{destino}" ADD CONSTRAINT "{nombre}" PRIMARY KEY {primaria}')
+        else:
+            cursor.execute(f'CREATE INDEX "{nombre}" ON "{destino}" USING {columnas}')
+    for nombre, definicion in llaves:
+        cursor.execute(f'ALTER TABLE "{destino}" ADD CONSTRAINT "{nombre}" {definicion}')
+
+
+def particionar(apps, schema_editor):
+    """Reemplaza registro_financiero por una tabla particionada por año con las mismas filas"""
+    tabla = TABLA
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXTRACT(YEAR FROM min(fecha AT TIME ZONE %s))::int, '
+            f'EXTRACT(YEAR FROM max(fecha AT TIME ZONE %s))::int FROM "{tabla}"',
+            [settings.TIME_ZONE, settings.TIME_ZONE]
+        )
+        primero, ultimo = cursor.fetchone()
+        posicion = _posicion_secuencia(cursor, tabla)
+        indices, llaves = _indices_y_llaves(cursor, tabla)
+
+        cursor.execute(f'ALTER TABLE "{tabla}" RENAME TO "{ANTERIOR}"')
+        cursor.execute(f'CREATE TABLE "{tabla}" (LIKE "{ANTERIOR}" INCLUDING DEFAULTS) PARTITION BY RANGE (fecha)')
+        # Las columnas identity no se admiten en tablas particionadas (PostgreSQL < 17): secuencia propia
+        cursor.execute(f'CREATE SEQUENCE "{tabla}_id_seq" OWNED BY "{tabla}".id_registro')
+        cursor.execute(f'SELECT setval(\'"{tabla}_id_seq"\', %s, %s)', posicion)
+        cursor.execute(f'ALTER TABLE "{tabla}" ALTER COLUMN id_registro SET DEFAULT nextval(\'"{tabla}_id_seq"\')')
+        _recrear(cursor, tabla, indices, llaves, '(id_registro, fecha)')
+
+        actual = timezone.localdate().year
+        for anio in range(min(primero or actual, actual), max(ultimo or actual, actual + 1) + 1):
+            _crear_particion(cursor, anio)
+        _crear_particion(cursor, DEFECTO)
+        cursor.execute(f'DROP TABLE "{ANTERIOR}"')
+
+
+def desparticionar(apps, schema_editor):
+    """Vuelve a una tabla común con las filas de todas las particiones"""
+    tabla = TABLA
+    particionada = f'{tabla}_particionada'
+    with schema_editor.connection.cursor() as cursor:
+        posicion = _posicion_secuencia(cursor, tabla)
+        indices, llaves = _indices_y_llaves(cursor, tabla)
+        cursor.execute(f'ALTER TABLE "{tabla}" RENAME TO "{particionada}"')
+        cursor.execute(f'CREATE TABLE "{tabla}" (LIKE "{particionada}" INCLUDING DEFAULTS)')
+        cursor.execute(f'ALTER TABLE "{tabla}" ALTER COLUMN id_registro DROP DEFAULT, '
+                       f'ALTER COLUMN id_registro ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(f'INSERT INTO "{tabla}" SELECT * FROM "{particionada}"')
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id_registro'), %s, %s)", [tabla, *posicion])
+        _recrear(cursor, tabla, indices, llaves, '(id_registro)')
+        cursor.execute(f'DROP TABLE "{particionada}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0015_sincronizacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
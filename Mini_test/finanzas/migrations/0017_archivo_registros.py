@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0016_particionar_registros'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivoRegistros',
+            fields=[
+                ('id_archivo', models.AutoField(primary_key=True, serialize=False)),
+                ('anio', models.IntegerField()),
+                ('ruta', models.CharField(max_length=255)),
+                ('cantidad', models.IntegerField()),
+                ('total_ingresos', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('total_gastos', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('primera_semana', models.IntegerField()),
+                ('ultima_semana', models.IntegerField()),
+                ('bytes', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('fecha_archivo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id_usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archivos_registros', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Archivo de Registros',
+                'verbose_name_plural': 'Archivos de Registros',
+                'db_table': 'archivo_registros',
+                'ordering': ['id_usuario', 'anio'],
+                'constraints': [models.UniqueConstraint(fields=('id_usuario', 'anio'), name='archivo_usuario_anio_unico')],
+            },
+        ),
+    ]
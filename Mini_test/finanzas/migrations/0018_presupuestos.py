@@ -0,0 +1,86 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finanzas', '0017_archivo_registros'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PresupuestoCategoria',
+            fields=[
+                ('id_presupuesto', models.AutoField(primary_key=True, serialize=False)),
+                ('categoria', models.CharField(choices=[('salario', 'Salario'), ('freelance', 'Freelance'), ('negocio', 'Negocio Propio'), ('inversion', 'Inversión'), ('otro_ingreso', 'Otro Ingreso'), ('alimentacion', 'Alimentación'), ('transporte', 'Transporte'), ('vivienda', 'Vivienda'), ('servicios', 'Servicios'), ('educacion', 'Educación'), ('salud', 'Salud'), ('entretenimiento', 'Entretenimiento'), ('ropa', 'Ropa'), ('deudas', 'Pago de Deudas'), ('ahorro', 'Ahorro'), ('otro_gasto', 'Otro Gasto')], max_length=30)),
+                ('periodo', models.CharField(choices=[('semanal', 'Semanal'), ('mensual', 'Mensual')], default='mensual', max_length=10)),
+                ('limite', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('desde', models.DateField(editable=False)),
+                ('fecha_creacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id_usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='presupuestos', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Presupuesto por Categoría',
+                'verbose_name_plural': 'Presupuestos por Categoría',
+                'db_table': 'presupuesto_categoria',
+                'ordering': ['categoria', 'periodo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GastoPresupuesto',
+            fields=[
+                ('id_gasto', models.BigAutoField(primary_key=True, serialize=False)),
+                ('inicio', models.DateField()),
+                ('gastado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_registros', models.IntegerField(default=0)),
+                ('id_presupuesto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='gastos', to='finanzas.presupuestocategoria')),
+            ],
+            options={
+                'verbose_name': 'Gasto de Presupuesto',
+                'verbose_name_plural': 'Gastos de Presupuestos',
+                'db_table': 'gasto_presupuesto',
+                'ordering': ['id_presupuesto', '-inicio'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventoPresupuesto',
+            fields=[
+                ('id_evento', models.BigAutoField(primary_key=True, serialize=False)),
+                ('inicio', models.DateField()),
+                ('umbral', models.SmallIntegerField(choices=[(80, '80% del límite'), (100, 'Límite alcanzado')])),
+                ('gastado', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('limite', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('id_usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='eventos_presupuesto', to=settings.AUTH_USER_MODEL)),
+                ('id_presupuesto', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='finanzas.presupuestocategoria')),
+            ],
+            options={
+                'verbose_name': 'Evento de Presupuesto',
+                'verbose_name_plural': 'Eventos de Presupuestos',
+                'db_table': 'evento_presupuesto',
+                'ordering': ['-fecha', '-id_evento'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='presupuestocategoria',
+            constraint=models.UniqueConstraint(fields=('id_usuario', 'categoria', 'periodo'), name='presupuesto_usuario_categoria_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='gastopresupuesto',
+            constraint=models.UniqueConstraint(fields=('id_presupuesto', 'inicio'), name='gasto_presupuesto_periodo_unico'),
+        ),
+        migrations.AddIndex(
+            model_name='eventopresupuesto',
+            index=models.Index(fields=['id_usuario', 'fecha'], name='evento_presupuesto_usuario_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventopresupuesto',
+            constraint=models.UniqueConstraint(fields=('id_presupuesto', 'inicio', 'umbral'), name='evento_presupuesto_unico'),
+        ),
+    ]
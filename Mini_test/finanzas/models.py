@@ -1,7 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum
 from datetime import datetime
 from django.utils import timezone
+from minitest.bloqueos import bloqueo_exclusivo
+
+
+class SiguienteCambio(models.Func):
+    """Siguiente número de la secuencia global de cambios (ver ServicioSincronizacion)"""
+    template = "nextval('finanzas_secuencia_cambio')"
+    output_field = models.BigIntegerField()
+
 
 class RegistroFinanciero(models.Model):
     TIPO_CHOICES = [
@@ -31,7 +39,9 @@ class RegistroFinanciero(models.Model):
     ]
     
     id_registro = models.AutoField(primary_key=True)
-    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='registros_financieros')
+    # Sin índice propio: registro_usuario_fecha_idx empieza por id_usuario y cubre estas búsquedas
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='registros_financieros',
+                                   db_index=False)
     tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
     monto = models.DecimalField(max_digits=10, decimal_places=2)
     fecha = models.DateTimeField(default=timezone.now)
@@ -44,15 +54,97 @@ class RegistroFinanciero(models.Model):
                                   blank=True,
                                   related_name='registros_financieros',
                                   help_text='Oportunidad económica relacionada con este registro')
+    # Número de cambio de la última escritura; la sincronización lo usa como marca de agua
+    secuencia_cambio = models.BigIntegerField(db_default=SiguienteCambio(), editable=False)
     
     class Meta:
+        # En PostgreSQL la tabla está particionada por año sobre fecha (finanzas/particiones.py):
+        # toda restricción única debe incluir fecha
         db_table = 'registro_financiero'
         verbose_name = 'Registro Financiero'
         verbose_name_plural = 'Registros Financieros'
-        ordering = ['-fecha']
+        ordering = ['-fecha', '-id_registro']
+        indexes = [
+            # Ventanas semanales (rango [inicio, fin) de fecha) y paginación por cursor (-fecha, -id_registro)
+            models.Index(fields=['id_usuario', 'fecha', 'id_registro'], name='registro_usuario_fecha_idx'),
+            models.Index(fields=['id_usuario', 'secuencia_cambio'], name='registro_usuario_cambio_idx'),
+        ]
     
     def __str__(self):
         return f"{self.tipo.capitalize()}: {self.monto} - {self.categoria}"
+    
+    def valores_resumen(self):
+        """Campos que determinan la contribución del registro al resumen semanal"""
+        return {
+            'id_usuario_id': self.id_usuario_id,
+            'fecha': self.fecha,
+            'categoria': self.categoria,
+            'tipo': self.tipo,
+            'monto': self.monto,
+        }
+    
+    def save(self, *args, **kwargs):
+        """Guarda el registro y actualiza el resumen semanal y los presupuestos en la misma transacción"""
+        from .servicios import (ServicioPresupuestos, ServicioResumenSemanal, ServicioSincronizacion,
+                                ServicioVersionFinanciera)
+        with transaction.atomic():
+            self.secuencia_cambio = ServicioSincronizacion.registrar_escritura(self.id_usuario_id)
+            anterior = None
+            if self.pk is not None:
+                anterior = RegistroFinanciero.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values(*CAMPOS_RESUMEN).first()
+            super().save(*args, **kwargs)
+            ServicioResumenSemanal.registrar_cambio(anterior, self.valores_resumen())
+            ServicioPresupuestos.registrar_cambio(anterior, self.valores_resumen())
+            if anterior and anterior['id_usuario_id'] != self.id_usuario_id:
+                # Para el usuario anterior el registro desaparece
+                ServicioSincronizacion.registrar_escritura(anterior['id_usuario_id'])
+                ServicioSincronizacion.registrar_eliminacion(anterior['id_usuario_id'], 'registro', self.pk)
+                ServicioVersionFinanciera.incrementar(anterior['id_usuario_id'])
+            ServicioVersionFinanciera.incrementar(self.id_usuario_id)
+    
+    def delete(self, *args, **kwargs):
+        """Elimina el registro y descuenta su monto del resumen semanal y de los presupuestos"""
+        from .servicios import (ServicioPresupuestos, ServicioResumenSemanal, ServicioSincronizacion,
+                                ServicioVersionFinanciera)
+        with transaction.atomic():
+            ServicioSincronizacion.registrar_escritura(self.id_usuario_id)
+            id_registro = self.pk
+            anterior = RegistroFinanciero.objects.select_for_update().filter(
+                pk=self.pk
+            ).values(*CAMPOS_RESUMEN).first()
+            resultado = super().delete(*args, **kwargs)
+            ServicioResumenSemanal.registrar_cambio(anterior, None)
+            ServicioPresupuestos.registrar_cambio(anterior, None)
+            ServicioSincronizacion.registrar_eliminacion(self.id_usuario_id, 'registro', id_registro)
+            ServicioVersionFinanciera.incrementar(self.id_usuario_id)
+        return resultado
+
+
+CAMPOS_RESUMEN = ['id_usuario_id', 'fecha', 'categoria', 'tipo', 'monto']
+
+
+class ResumenSemanalCategoria(models.Model):
+    """Totales por usuario, semana ISO y categoría mantenidos en cada escritura del libro"""
+    id_resumen = models.AutoField(primary_key=True)
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='resumenes_semanales')
+    anio = models.IntegerField()  # Año ISO
+    semana = models.IntegerField()  # Semana ISO (1-53)
+    categoria = models.CharField(max_length=30, choices=RegistroFinanciero.CATEGORIA_CHOICES)
+    total_ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_gastos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_registros = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'resumen_semanal_categoria'
+        verbose_name = 'Resumen Semanal por Categoría'
+        verbose_name_plural = 'Resúmenes Semanales por Categoría'
+        unique_together = ['id_usuario', 'anio', 'semana', 'categoria']
+        ordering = ['-anio', '-semana', 'categoria']
+    
+    def __str__(self):
+        return f"{self.categoria} {self.semana}/{self.anio}: +{self.total_ingresos} -{self.total_gastos}"
 
 class ReporteFinanciero(models.Model):
     id_reporte = models.AutoField(primary_key=True)
@@ -62,10 +154,11 @@ class ReporteFinanciero(models.Model):
     total_ingresos = models.DecimalField(max_digits=12, decimal_places=2)
     total_gastos = models.DecimalField(max_digits=12, decimal_places=2)
     balance = models.DecimalField(max_digits=12, decimal_places=2)
-    detalle_por_categoria = models.JSONField()  
     fecha_generacion = models.DateTimeField(auto_now_add=True)
     fecha_inicio_semana = models.DateField(null=True, blank=True)  # Primer día de la semana (lunes)
     fecha_fin_semana = models.DateField(null=True, blank=True)     # Último día de la semana (domingo)
+    # Versión financiera del usuario con la que se calculó; si coincide con la actual el reporte está vigente
+    version_registros = models.BigIntegerField(null=True, blank=True)
     
     class Meta:
         db_table = 'reporte_financiero'
@@ -76,6 +169,51 @@ class ReporteFinanciero(models.Model):
     
     def __str__(self):
         return f"Reporte Semana {self.semana}/{self.anio} - {self.id_usuario.nombre}"
+    
+    @property
+    def detalle_por_categoria(self):
+        """{categoria: {'ingresos', 'gastos'}} como el antiguo campo JSON, armado desde DetalleReporteCategoria.
+        
+        Para listas de reportes usar prefetch_related('detalles').
+        """
+        return {
+            d.categoria: {'ingresos': float(d.ingresos), 'gastos': float(d.gastos)}
+            for d in self.detalles.all()
+        }
+
+
+class DetalleReporteCategoria(models.Model):
+    """Totales de una categoría dentro de un reporte semanal.
+    
+    Usuario, año y semana se copian del reporte (no cambian) para que la
+    tendencia de una categoría a lo largo de las semanas sea un agregado sobre
+    un solo índice, sin leer los reportes.
+    """
+    id_detalle = models.AutoField(primary_key=True)
+    id_reporte = models.ForeignKey(ReporteFinanciero, on_delete=models.CASCADE, related_name='detalles')
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='detalles_reporte')
+    anio = models.IntegerField()
+    semana = models.IntegerField()
+    categoria = models.CharField(max_length=30)
+    ingresos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    gastos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        db_table = 'detalle_reporte_categoria'
+        verbose_name = 'Detalle de Reporte por Categoría'
+        verbose_name_plural = 'Detalles de Reporte por Categoría'
+        ordering = ['categoria']
+        constraints = [
+            models.UniqueConstraint(fields=['id_reporte', 'categoria'], name='detalle_reporte_categoria_unico'),
+        ]
+        indexes = [
+            # Tendencias: (usuario, categoría, rango de semanas), con los montos en el índice
+            models.Index(fields=['id_usuario', 'categoria', 'anio', 'semana'], include=['ingresos', 'gastos'],
+                         name='detalle_usuario_categoria_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.categoria} {self.anio}-S{self.semana}: +{self.ingresos} -{self.gastos}"
         
 class MetaFinanciera(models.Model):
     ESTADO_CHOICES = [
@@ -93,17 +231,330 @@ class MetaFinanciera(models.Model):
     fecha_objetivo = models.DateField()
     estado = models.CharField(max_length=15, choices=ESTADO_CHOICES, default='activa')
     descripcion = models.TextField(blank=True)
+    secuencia_cambio = models.BigIntegerField(db_default=SiguienteCambio(), editable=False)
     
     class Meta:
         db_table = 'meta_financiera'
         verbose_name = 'Meta Financiera'
         verbose_name_plural = 'Metas Financieras'
+        indexes = [
+            models.Index(fields=['id_usuario', 'secuencia_cambio'], name='meta_usuario_cambio_idx'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} - {self.monto_actual}/{self.monto_objetivo}"
     
+    def save(self, *args, **kwargs):
+        """Guarda la meta e invalida las vistas en caché del usuario"""
+        from .servicios import ServicioSincronizacion, ServicioVersionFinanciera
+        with transaction.atomic():
+            self.secuencia_cambio = ServicioSincronizacion.registrar_escritura(self.id_usuario_id)
+            super().save(*args, **kwargs)
+            ServicioVersionFinanciera.incrementar(self.id_usuario_id)
+    
+    def delete(self, *args, **kwargs):
+        from .servicios import ServicioSincronizacion, ServicioVersionFinanciera
+        with transaction.atomic():
+            ServicioSincronizacion.registrar_escritura(self.id_usuario_id)
+            id_meta = self.pk
+            resultado = super().delete(*args, **kwargs)
+            ServicioSincronizacion.registrar_eliminacion(self.id_usuario_id, 'meta', id_meta)
+            ServicioVersionFinanciera.incrementar(self.id_usuario_id)
+        return resultado
+    
     @property
     def porcentaje_completado(self):
         if self.monto_objetivo > 0:
             return round((self.monto_actual / self.monto_objetivo) * 100, 2)
-        return 0
\ No newline at end of file
+        return 0
+
+
+class AporteMeta(models.Model):
+    """Libro de aportes a una meta; monto_actual es la suma de sus aportes"""
+    id_aporte = models.AutoField(primary_key=True)
+    id_meta = models.ForeignKey(MetaFinanciera, on_delete=models.CASCADE, related_name='aportes')
+    monto = models.DecimalField(max_digits=12, decimal_places=2)
+    fecha = models.DateTimeField(default=timezone.now)
+    descripcion = models.CharField(max_length=200, blank=True)
+    
+    class Meta:
+        db_table = 'aporte_meta'
+        verbose_name = 'Aporte a Meta'
+        verbose_name_plural = 'Aportes a Metas'
+        ordering = ['-fecha', '-id_aporte']
+        indexes = [
+            models.Index(fields=['id_meta', 'fecha'], name='aporte_meta_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.monto} -> {self.id_meta.nombre}"
+
+
+class ProyeccionMeta(models.Model):
+    """Última proyección calculada de una meta activa (ver finanzas/proyecciones.py)"""
+    id_meta = models.OneToOneField(MetaFinanciera, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='proyeccion')
+    ahorro_semanal_requerido = models.DecimalField(max_digits=14, decimal_places=2)
+    ahorro_semanal_estimado = models.DecimalField(max_digits=14, decimal_places=2)
+    semanas_estimadas = models.IntegerField(null=True, blank=True)  # None: no se alcanza al ritmo actual
+    fecha_estimada = models.DateField(null=True, blank=True)
+    en_camino = models.BooleanField(default=False)
+    version_registros = models.BigIntegerField(default=0)
+    fecha_calculo = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'proyeccion_meta'
+        verbose_name = 'Proyección de Meta'
+        verbose_name_plural = 'Proyecciones de Metas'
+    
+    def __str__(self):
+        return f"Proyección {self.id_meta_id}: {self.fecha_estimada or 'sin fecha'}"
+
+
+class VersionFinanciera(models.Model):
+    """Contador de cambios del libro y las metas de un usuario.
+    
+    Se incrementa en la misma transacción que cada escritura; las vistas en
+    caché incluyen la versión en su clave, así nunca se sirve una versión vieja.
+    """
+    id_usuario = models.OneToOneField('usuarios.Usuario', on_delete=models.CASCADE, primary_key=True,
+                                      related_name='version_financiera')
+    version = models.BigIntegerField(default=0)
+    fecha_modificacion = models.DateTimeField(default=timezone.now)
+    # Mayor secuencia_cambio de las eliminaciones ya purgadas: una marca anterior exige sincronizar todo
+    secuencia_purgada = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'version_financiera'
+        verbose_name = 'Versión Financiera'
+        verbose_name_plural = 'Versiones Financieras'
+    
+    def __str__(self):
+        return f"{self.id_usuario_id} v{self.version}"
+
+
+class Eliminacion(models.Model):
+    """Lápida de un registro o meta eliminado, para que los clientes lo quiten de su copia local"""
+    MODELO_CHOICES = [
+        ('registro', 'Registro Financiero'),
+        ('meta', 'Meta Financiera'),
+    ]
+    
+    id_eliminacion = models.BigAutoField(primary_key=True)
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='eliminaciones',
+                                   db_index=False)
+    modelo = models.CharField(max_length=10, choices=MODELO_CHOICES)
+    id_objeto = models.IntegerField()
+    secuencia_cambio = models.BigIntegerField(db_default=SiguienteCambio(), editable=False)
+    fecha_eliminacion = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'eliminacion_sincronizada'
+        verbose_name = 'Eliminación'
+        verbose_name_plural = 'Eliminaciones'
+        indexes = [
+            models.Index(fields=['id_usuario', 'secuencia_cambio'], name='eliminacion_usuario_cambio_idx'),
+            models.Index(fields=['fecha_eliminacion'], name='eliminacion_fecha_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.modelo} {self.id_objeto} eliminado (#{self.secuencia_cambio})"
+
+
+class ArchivoRegistros(models.Model):
+    """Catálogo de los años de registros archivados en archivos comprimidos (ver finanzas/archivo.py).
+    
+    Cada fila es un usuario y un año calendario: sus registros ya no están en
+    registro_financiero sino en el .npz de ruta, con los totales a mano para
+    no abrirlo. primera_semana y ultima_semana (AAAASS, ISO) acotan las
+    semanas cuyos resúmenes no se pueden verificar contra la tabla.
+    """
+    id_archivo = models.AutoField(primary_key=True)
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='archivos_registros',
+                                   db_index=False)
+    anio = models.IntegerField()
+    ruta = models.CharField(max_length=255)  # relativa a ARCHIVO_REGISTROS_RUTA
+    cantidad = models.IntegerField()
+    total_ingresos = models.DecimalField(max_digits=14, decimal_places=2)
+    total_gastos = models.DecimalField(max_digits=14, decimal_places=2)
+    primera_semana = models.IntegerField()
+    ultima_semana = models.IntegerField()
+    bytes = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    fecha_archivo = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'archivo_registros'
+        verbose_name = 'Archivo de Registros'
+        verbose_name_plural = 'Archivos de Registros'
+        ordering = ['id_usuario', 'anio']
+        constraints = [
+            models.UniqueConstraint(fields=['id_usuario', 'anio'], name='archivo_usuario_anio_unico'),
+        ]
+    
+    def __str__(self):
+        return f"Registros {self.anio} de {self.id_usuario_id} ({self.cantidad})"
+
+
+class AnomaliaGasto(models.Model):
+    """Gasto, semana o patrón de gastos inusual detectado (ver finanzas/anomalias.py).
+    
+    Se recalcula por usuario: cada detección reemplaza las anomalías anteriores
+    del usuario, así el dashboard solo lee esta tabla.
+    """
+    TIPO_CHOICES = [
+        ('registro', 'Gasto inusual'),
+        ('semana', 'Semana inusual'),
+        ('hormiga', 'Gastos hormiga'),
+    ]
+    
+    id_anomalia = models.AutoField(primary_key=True)
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='anomalias_gasto')
+    # Sin constraint en la base: la anomalía es derivada y se reemplaza en la siguiente detección
+    id_registro = models.ForeignKey(RegistroFinanciero, on_delete=models.CASCADE, null=True, blank=True,
+                                    db_constraint=False, related_name='anomalias')
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    categoria = models.CharField(max_length=30)
+    anio = models.IntegerField()
+    semana = models.IntegerField()
+    monto = models.DecimalField(max_digits=14, decimal_places=2)
+    referencia = models.DecimalField(max_digits=14, decimal_places=2)  # mediana móvil o umbral de comparación
+    puntaje = models.FloatField(null=True, blank=True)  # z robusto; None en gastos hormiga
+    cantidad = models.IntegerField(default=1)
+    version_registros = models.BigIntegerField(default=0)
+    fecha_deteccion = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'anomalia_gasto'
+        verbose_name = 'Anomalía de Gasto'
+        verbose_name_plural = 'Anomalías de Gasto'
+        ordering = ['-anio', '-semana', '-monto']
+        indexes = [
+            models.Index(fields=['id_usuario', 'anio', 'semana'], name='anomalia_usuario_semana_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.categoria} {self.anio}-S{self.semana}"
+
+
+class PresupuestoCategoria(models.Model):
+    """Límite de gasto de un usuario en una categoría por semana ISO o por mes (hora de Lima).
+    
+    Lo gastado en cada periodo vive en GastoPresupuesto, que se incrementa en
+    la misma transacción que cada escritura del libro (ver ServicioPresupuestos).
+    desde es el inicio del periodo en que se creó: los periodos anteriores no
+    se cuentan.
+    """
+    PERIODO_CHOICES = [
+        ('semanal', 'Semanal'),
+        ('mensual', 'Mensual'),
+    ]
+    
+    id_presupuesto = models.AutoField(primary_key=True)
+    # Sin índice propio: presupuesto_usuario_categoria_unico empieza por id_usuario
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='presupuestos',
+                                   db_index=False)
+    categoria = models.CharField(max_length=30, choices=RegistroFinanciero.CATEGORIA_CHOICES)
+    periodo = models.CharField(max_length=10, choices=PERIODO_CHOICES, default='mensual')
+    limite = models.DecimalField(max_digits=12, decimal_places=2)
+    desde = models.DateField(editable=False)
+    fecha_creacion = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'presupuesto_categoria'
+        verbose_name = 'Presupuesto por Categoría'
+        verbose_name_plural = 'Presupuestos por Categoría'
+        ordering = ['categoria', 'periodo']
+        constraints = [
+            models.UniqueConstraint(fields=['id_usuario', 'categoria', 'periodo'],
+                                    name='presupuesto_usuario_categoria_unico'),
+        ]
+    
+    def __str__(self):
+        return f"{self.categoria} ({self.periodo}): {self.limite}"
+    
+    def save(self, *args, **kwargs):
+        """Guarda el presupuesto; si es nuevo o cambió de categoría o periodo, rehace su contador"""
+        from .servicios import ServicioPresupuestos, ServicioVersionFinanciera
+        with transaction.atomic():
+            anterior = None
+            if self.pk is not None:
+                # Sin select_for_update: FOR UPDATE choca con el FOR KEY SHARE de las escrituras que
+                # incrementan el contador, que ya tienen el bloqueo compartido que reiniciar() espera
+                anterior = PresupuestoCategoria.objects.filter(pk=self.pk).values('categoria', 'periodo').first()
+            reiniciar = anterior != {'categoria': self.categoria, 'periodo': self.periodo}
+            if reiniciar:
+                self.desde = ServicioPresupuestos.inicio_periodo(self.periodo, timezone.now())
+            super().save(*args, **kwargs)
+            if reiniciar:
+                ServicioPresupuestos.reiniciar(self)
+            ServicioVersionFinanciera.incrementar(self.id_usuario_id)
+    
+    def delete(self, *args, **kwargs):
+        """Elimina el presupuesto con sus contadores y eventos"""
+        from .servicios import ServicioSincronizacion, ServicioVersionFinanciera
+        # Espera a las escrituras en curso del usuario: podrían estar incrementando su contador
+        with bloqueo_exclusivo(ServicioSincronizacion.nombre_bloqueo(self.id_usuario_id)):
+            resultado = super().delete(*args, **kwargs)
+            ServicioVersionFinanciera.incrementar(self.id_usuario_id)
+        return resultado
+
+
+class GastoPresupuesto(models.Model):
+    """Contador de lo gastado en un periodo de un presupuesto (inicio: lunes o día 1 del mes)"""
+    id_gasto = models.BigAutoField(primary_key=True)
+    id_presupuesto = models.ForeignKey(PresupuestoCategoria, on_delete=models.CASCADE, related_name='gastos',
+                                       db_index=False)
+    inicio = models.DateField()
+    gastado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cantidad_registros = models.IntegerField(default=0)
+    
+    class Meta:
+        db_table = 'gasto_presupuesto'
+        verbose_name = 'Gasto de Presupuesto'
+        verbose_name_plural = 'Gastos de Presupuestos'
+        ordering = ['id_presupuesto', '-inicio']
+        constraints = [
+            models.UniqueConstraint(fields=['id_presupuesto', 'inicio'], name='gasto_presupuesto_periodo_unico'),
+        ]
+    
+    def __str__(self):
+        return f"Presupuesto {self.id_presupuesto_id} desde {self.inicio}: {self.gastado}"
+
+
+class EventoPresupuesto(models.Model):
+    """Cruce de un umbral del límite de un presupuesto en un periodo.
+    
+    Se registra en la escritura que lleva lo gastado del periodo a 80% o 100%
+    del límite; uno por umbral y periodo aunque el gasto baje y vuelva a subir.
+    """
+    UMBRAL_CHOICES = [
+        (80, '80% del límite'),
+        (100, 'Límite alcanzado'),
+    ]
+    
+    id_evento = models.BigAutoField(primary_key=True)
+    id_usuario = models.ForeignKey('usuarios.Usuario', on_delete=models.CASCADE, related_name='eventos_presupuesto',
+                                   db_index=False)
+    id_presupuesto = models.ForeignKey(PresupuestoCategoria, on_delete=models.CASCADE, related_name='eventos',
+                                       db_index=False)
+    inicio = models.DateField()
+    umbral = models.SmallIntegerField(choices=UMBRAL_CHOICES)
+    gastado = models.DecimalField(max_digits=14, decimal_places=2)
+    limite = models.DecimalField(max_digits=12, decimal_places=2)
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'evento_presupuesto'
+        verbose_name = 'Evento de Presupuesto'
+        verbose_name_plural = 'Eventos de Presupuestos'
+        ordering = ['-fecha', '-id_evento']
+        constraints = [
+            models.UniqueConstraint(fields=['id_presupuesto', 'inicio', 'umbral'], name='evento_presupuesto_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['id_usuario', 'fecha'], name='evento_presupuesto_usuario_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Presupuesto {self.id_presupuesto_id} {self.inicio}: {self.umbral}%"
@@ -0,0 +1,177 @@
+"""Particionado por año de registro_financiero (solo PostgreSQL).
+
+registro_financiero es una tabla particionada por rango sobre fecha: una
+partición por año calendario en hora de Lima (registro_financiero_2025, ...)
+y registro_financiero_default para las fechas de años sin partición. Las
+consultas acotadas por fecha (semana, dashboard, resumen anual) solo leen la
+partición de su año, y VACUUM y el mantenimiento de índices de los años
+cerrados no vuelven a tocarse.
+
+PostgreSQL exige la clave de partición en los índices únicos, así que la
+clave primaria física es (id_registro, fecha) y la base ya no impide repetir
+un id_registro en dos años. La unicidad es un invariante del código: los ids
+solo salen de la secuencia registro_financiero_id_seq, y el único camino que
+inserta ids explícitos, archivo.restaurar(), devuelve ids que salieron de la
+tabla al archivar y se niega a hacerlo si alguno ya está en ella.
+ids_repetidos() lo comprueba (particiones_registros verificar).
+
+Cada partición se crea como tabla suelta con los índices del padre (nombre
+<índice>_<año>), se llena y recién entonces se adjunta: PostgreSQL reutiliza
+esos índices en lugar de construir otros con la tabla bloqueada.
+
+Las particiones no se desprenden: los años cerrados salen de la tabla solo
+con finanzas/archivo.py, que todos los lectores del libro combinan.
+"""
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+TABLA = 'registro_financiero'
+DEFECTO = 'default'
+PATRON = re.compile(rf'^{TABLA}_(\d{{4}}|{DEFECTO})$')
+
+
+def _q(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def nombre_particion(anio):
+    return f'{TABLA}_{anio}'
+
+
+def limites(anio):
+    """[inicio, fin) del año calendario en la zona del proyecto"""
+    zona = ZoneInfo(settings.TIME_ZONE)
+    return datetime(anio, 1, 1, tzinfo=zona), datetime(anio + 1, 1, 1, tzinfo=zona)
+
+
+def _literal(momento):
+    # Los límites de partición no admiten parámetros; el valor lo arma limites()
+    return "'%s'::timestamptz" % momento.isoformat()
+
+
+def esta_particionada():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))',
+                       [TABLA])
+        return cursor.fetchone()[0]
+
+
+def particiones():
+    """Particiones de la tabla, de la más antigua a la más nueva.
+
+    [{'nombre', 'anio' (None para default), 'filas' (estimadas), 'bytes'}]
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [TABLA]
+        )
+        filas = cursor.fetchall()
+    resultado = []
+    for nombre, estimadas, tamano in filas:
+        sufijo = PATRON.match(nombre).group(1)
+        resultado.append({
+            'nombre': nombre,
+            'anio': None if sufijo == DEFECTO else int(sufijo),
+            'filas': estimadas,
+            'bytes': tamano,
+        })
+    return sorted(resultado, key=lambda p: (p['anio'] is None, p['anio'] or 0))
+
+
+def ids_repetidos(limite=100):
+    """id_registro que aparecen en más de una fila (debería ser siempre [])"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT id_registro FROM {_q(TABLA)} GROUP BY id_registro HAVING count(*) > 1 '
+            f'ORDER BY id_registro LIMIT %s',
+            [limite]
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _indices_padre(cursor):
+    """[(nombre, 'UNIQUE ' o '', columnas, es_primaria)] de los índices de la tabla particionada"""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisunique, i.indisprimary
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+        """,
+        [TABLA]
+    )
+    return [(nombre, 'UNIQUE ' if unico else '', definicion.split(' USING ', 1)[1], primaria)
+            for nombre, definicion, unico, primaria in cursor.fetchall()]
+
+
+def _crear_indices(cursor, tabla, sufijo):
+    for nombre, unico, columnas, primaria in _indices_padre(cursor):
+        if primaria:
+            # "btree (id_registro, fecha)" -> "(id_registro, fecha)"
+            cursor.execute(f'ALTER TABLE {_q(tabla)} ADD CONSTRAINT {_q(tabla + "_pkey")} '
+                           f'PRIMARY KEY {columnas[columnas.index("("):]}')
+        else:
+            cursor.execute(f'CREATE {unico}INDEX {_q(f"{nombre}_{sufijo}"[:63])} ON {_q(tabla)} USING {columnas}')
+
+
+def _condicion(anio):
+    """(límites SQL de la partición, filtro de sus filas)"""
+    if anio == DEFECTO:
+        return 'DEFAULT', None
+    inicio, fin = limites(anio)
+    return (f'FOR VALUES FROM ({_literal(inicio)}) TO ({_literal(fin)})',
+            f'fecha >= {_literal(inicio)} AND fecha < {_literal(fin)}')
+
+
+def _mover_desde_defecto(cursor, destino, filtro):
+    """Pasa a destino las filas de la partición default que le corresponden. Retorna cuántas"""
+    defecto = nombre_particion(DEFECTO)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [defecto])
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute(
+        f'WITH movidas AS (DELETE FROM {_q(defecto)} WHERE {filtro} RETURNING *) '
+        f'INSERT INTO {_q(destino)} SELECT * FROM movidas'
+    )
+    return cursor.rowcount
+
+
+def crear_particion(anio):
+    """Crea y adjunta la partición de un año (o DEFECTO). Retorna las filas que recibió.
+
+    Toma las filas de ese año que hubieran caído en la partición default. Si
+    la partición ya existe no hace nada.
+    """
+    nombre = nombre_particion(anio)
+    valores, filtro = _condicion(anio)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [nombre])
+        if cursor.fetchone()[0]:
+            return 0
+        cursor.execute(f'CREATE TABLE {_q(nombre)} (LIKE {_q(TABLA)} INCLUDING DEFAULTS)')
+        filas = _mover_desde_defecto(cursor, nombre, filtro) if filtro else 0
+        _crear_indices(cursor, nombre, anio)
+        cursor.execute(f'ALTER TABLE {_q(TABLA)} ATTACH PARTITION {_q(nombre)} {valores}')
+    return filas
+
+
+def asegurar(hoy=None):
+    """Crea las particiones del año actual y del siguiente si faltan. Retorna los años creados"""
+    if not esta_particionada():
+        return []
+    anio = (hoy or timezone.localdate()).year
+    existentes = {p['anio'] for p in particiones()}
+    creados = [a for a in (anio, anio + 1) if a not in existentes]
+    for a in creados:
+        crear_particion(a)
+    return creados
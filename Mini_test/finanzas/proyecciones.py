@@ -0,0 +1,175 @@
+"""Proyección vectorizada de metas financieras activas.
+
+El ahorro semanal de cada usuario sale de su balance neto por semana
+(ResumenSemanalCategoria, que se mantiene en la misma transacción que cada
+registro). Se carga una matriz usuarios x semanas por lote y todas las metas
+del lote se proyectan con NumPy en una sola pasada, sin bucles por meta.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from . import dinero
+from .models import MetaFinanciera, ProyeccionMeta, ResumenSemanalCategoria, VersionFinanciera
+
+
+SEMANAS_HISTORIA = 26
+# Vida media (en semanas) del promedio ponderado: las semanas recientes pesan más
+VIDA_MEDIA = 8
+# Más allá de este horizonte la meta se considera inalcanzable al ritmo actual
+MAX_SEMANAS = 52 * 50
+
+
+def semanas_cerradas(hoy=None, cantidad=SEMANAS_HISTORIA):
+    """[(anio, semana)] de las últimas semanas ISO completas, de la más antigua a la más reciente"""
+    hoy = hoy or timezone.localdate()
+    lunes = hoy - timedelta(days=hoy.weekday())
+    semanas = []
+    for i in range(cantidad, 0, -1):
+        anio, semana, _ = (lunes - timedelta(weeks=i)).isocalendar()
+        semanas.append((anio, semana))
+    return semanas
+
+
+def rango_semanas(semanas):
+    """Filtro sobre (anio, semana) de ResumenSemanalCategoria entre la primera y la última semana"""
+    (anio_ini, sem_ini), (anio_fin, sem_fin) = semanas[0], semanas[-1]
+    if anio_ini == anio_fin:
+        return Q(anio=anio_ini, semana__gte=sem_ini, semana__lte=sem_fin)
+    return (Q(anio=anio_ini, semana__gte=sem_ini) | Q(anio__gt=anio_ini, anio__lt=anio_fin)
+            | Q(anio=anio_fin, semana__lte=sem_fin))
+
+
+def series_netas(usuario_ids, semanas):
+    """Matriz float64 (usuarios x semanas) de ingresos - gastos, con ceros en semanas sin movimientos"""
+    columnas = {clave: i for i, clave in enumerate(semanas)}
+    filas = {usuario_id: i for i, usuario_id in enumerate(usuario_ids)}
+    datos = (
+        ResumenSemanalCategoria.objects
+        .filter(rango_semanas(semanas), id_usuario_id__in=usuario_ids)
+        .values('id_usuario', 'anio', 'semana')
+        .annotate(neto=Sum(F('total_ingresos') - F('total_gastos')))
+        .order_by()
+        .values_list('id_usuario', 'anio', 'semana', 'neto')
+    )
+    serie = np.zeros((len(usuario_ids), len(semanas)))
+    for usuario_id, anio, semana, neto in datos:
+        serie[filas[usuario_id], columnas[(anio, semana)]] = neto
+    return serie
+
+
+def pesos_exponenciales(cantidad, vida_media=VIDA_MEDIA):
+    """Pesos que se reducen a la mitad cada vida_media semanas hacia atrás, normalizados a 1"""
+    edad = np.arange(cantidad - 1, -1, -1)
+    pesos = 0.5 ** (edad / vida_media)
+    return pesos / pesos.sum()
+
+
+def ahorro_requerido(faltante, semanas_restantes):
+    """Ahorro semanal que necesita cada meta para llegar a tiempo (una semana como mínimo)"""
+    return np.where(faltante > 0, faltante / np.maximum(semanas_restantes, 1), 0.0)
+
+
+def participaciones(indice_usuario, requerido, cantidad_usuarios):
+    """Fracción del ahorro de su usuario que le toca a cada meta, proporcional a lo que requiere"""
+    requerido_usuario = np.bincount(indice_usuario, weights=requerido, minlength=cantidad_usuarios)
+    total = requerido_usuario[indice_usuario]
+    return np.divide(requerido, total, out=np.zeros_like(requerido), where=total > 0)
+
+
+def proyectar(ritmo_usuario, indice_usuario, faltante, semanas_restantes):
+    """Proyección de todas las metas a la vez.
+
+    ritmo_usuario: ahorro semanal estimado de cada usuario (U,).
+    indice_usuario, faltante, semanas_restantes: una posición por meta (M,).
+
+    El ahorro de cada usuario se reparte entre sus metas en proporción al
+    ahorro semanal que cada una requiere para llegar a tiempo. Retorna un dict
+    de arreglos (M,): requerido, estimado, semanas_estimadas (inf si el
+    ahorro estimado no alcanza en MAX_SEMANAS) y en_camino.
+    """
+    requerido = ahorro_requerido(faltante, semanas_restantes)
+    participacion = participaciones(indice_usuario, requerido, len(ritmo_usuario))
+    estimado = np.maximum(ritmo_usuario[indice_usuario], 0.0) * participacion
+
+    semanas_estimadas = np.full(faltante.shape, np.inf)
+    np.divide(faltante, estimado, out=semanas_estimadas, where=estimado > 0)
+    semanas_estimadas = np.where(faltante <= 0, 0.0, np.ceil(semanas_estimadas))
+    semanas_estimadas[semanas_estimadas > MAX_SEMANAS] = np.inf
+    return {
+        'requerido': requerido,
+        'estimado': estimado,
+        'semanas_estimadas': semanas_estimadas,
+        'en_camino': semanas_estimadas <= semanas_restantes,
+    }
+
+
+def proyectar_usuarios(usuario_ids, hoy=None, guardar=True):
+    """Proyecta las metas activas de un lote de usuarios.
+
+    Tres consultas por lote (metas, series y versiones) más el upsert de
+    ProyeccionMeta si guardar es True. Retorna la lista de ProyeccionMeta.
+    """
+    hoy = hoy or timezone.localdate()
+    metas = list(
+        MetaFinanciera.objects.filter(id_usuario_id__in=usuario_ids, estado='activa')
+        .order_by('id_meta')
+        .values_list('id_meta', 'id_usuario_id', 'monto_objetivo', 'monto_actual', 'fecha_objetivo')
+    )
+    if not metas:
+        return []
+
+    usuarios = sorted({m[1] for m in metas})
+    posicion = {usuario_id: i for i, usuario_id in enumerate(usuarios)}
+    semanas = semanas_cerradas(hoy)
+    ritmo = series_netas(usuarios, semanas) @ pesos_exponenciales(len(semanas))
+
+    indice_usuario = np.fromiter((posicion[m[1]] for m in metas), dtype=np.intp, count=len(metas))
+    faltante = np.fromiter((max(m[2] - m[3], 0) for m in metas), dtype=float, count=len(metas))
+    dias = np.fromiter(((m[4] - hoy).days for m in metas), dtype=float, count=len(metas))
+    semanas_restantes = np.maximum(np.ceil(dias / 7), 0)
+
+    resultado = proyectar(ritmo, indice_usuario, faltante, semanas_restantes)
+    versiones = dict(
+        VersionFinanciera.objects.filter(id_usuario_id__in=usuarios).values_list('id_usuario_id', 'version')
+    )
+    ahora = timezone.now()
+    proyecciones = []
+    for i, (id_meta, usuario_id, _, _, _) in enumerate(metas):
+        semanas_estimadas = resultado['semanas_estimadas'][i]
+        finita = bool(np.isfinite(semanas_estimadas))
+        proyecciones.append(ProyeccionMeta(
+            id_meta_id=id_meta,
+            ahorro_semanal_requerido=dinero.redondear(float(resultado['requerido'][i])),
+            ahorro_semanal_estimado=dinero.redondear(float(resultado['estimado'][i])),
+            semanas_estimadas=int(semanas_estimadas) if finita else None,
+            fecha_estimada=hoy + timedelta(weeks=int(semanas_estimadas)) if finita else None,
+            en_camino=bool(resultado['en_camino'][i]),
+            version_registros=versiones.get(usuario_id, 0),
+            fecha_calculo=ahora,
+        ))
+
+    if guardar:
+        ProyeccionMeta.objects.bulk_create(
+            proyecciones,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['id_meta'],
+            update_fields=['ahorro_semanal_requerido', 'ahorro_semanal_estimado', 'semanas_estimadas',
+                           'fecha_estimada', 'en_camino', 'version_registros', 'fecha_calculo']
+        )
+    return proyecciones
+
+
+def proyectar_todas(tamano_lote=2000, hoy=None):
+    """Proyecta las metas activas de todos los usuarios, por lotes. Retorna la cantidad de metas"""
+    usuario_ids = list(
+        MetaFinanciera.objects.filter(estado='activa')
+        .order_by('id_usuario_id').values_list('id_usuario_id', flat=True).distinct()
+    )
+    total = 0
+    for i in range(0, len(usuario_ids), tamano_lote):
+        total += len(proyectar_usuarios(usuario_ids[i:i + tamano_lote], hoy=hoy))
+    return total
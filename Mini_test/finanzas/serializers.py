@@ -1,19 +1,37 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import RegistroFinanciero, ReporteFinanciero, MetaFinanciera
+from . import categorizador
+from .models import (RegistroFinanciero, ReporteFinanciero, MetaFinanciera, AporteMeta, ProyeccionMeta, AnomaliaGasto,
+                     PresupuestoCategoria, EventoPresupuesto)
 
 # En finanzas/serializers.py
 
 class RegistroFinancieroSerializer(serializers.ModelSerializer):
     class Meta:
         model = RegistroFinanciero
-        fields = ['id_registro', 'tipo', 'monto', 'fecha', 'categoria', 'descripcion', 'fecha_creacion', 'id_usuario']
-        read_only_fields = ['id_registro', 'fecha_creacion', 'id_usuario']  # id_usuario es read_only
+        fields = ['id_registro', 'tipo', 'monto', 'fecha', 'categoria', 'descripcion', 'fecha_creacion', 'id_usuario',
+                  'secuencia_cambio']
+        read_only_fields = ['id_registro', 'fecha_creacion', 'id_usuario', 'secuencia_cambio']  # id_usuario es read_only
+        # Sin categoría al crear, se sugiere a partir de la descripción (ver finanzas/categorizador.py)
+        extra_kwargs = {'categoria': {'required': False}}
+    
+    def validate(self, attrs):
+        if self.instance is None and not attrs.get('categoria'):
+            categoria = categorizador.categorizar(attrs.get('descripcion'), attrs.get('tipo'), attrs.get('monto'))
+            if categoria is None:
+                raise serializers.ValidationError({'categoria': 'Requerida si no hay descripción para sugerirla'})
+            attrs['categoria'] = categoria
+        return attrs
 
 class ReporteFinancieroSerializer(serializers.ModelSerializer):
+    # Se mantiene el formato del antiguo campo JSON, ahora armado desde DetalleReporteCategoria
+    detalle_por_categoria = serializers.ReadOnlyField()
+    
     class Meta:
         model = ReporteFinanciero
-        fields = ['id_reporte', 'id_usuario', 'mes', 'anio', 'total_ingresos', 
-                  'total_gastos', 'balance', 'detalle_por_categoria', 'fecha_generacion']
+        fields = ['id_reporte', 'id_usuario', 'semana', 'anio', 'total_ingresos', 
+                  'total_gastos', 'balance', 'detalle_por_categoria', 'fecha_generacion',
+                  'fecha_inicio_semana', 'fecha_fin_semana']
         read_only_fields = ['id_reporte', 'fecha_generacion']
 
 class MetaFinancieraSerializer(serializers.ModelSerializer):
@@ -23,8 +41,73 @@ class MetaFinancieraSerializer(serializers.ModelSerializer):
         model = MetaFinanciera
         fields = ['id_meta', 'id_usuario', 'nombre', 'monto_objetivo', 
                   'monto_actual', 'fecha_inicio', 'fecha_objetivo', 
-                  'estado', 'descripcion', 'porcentaje_completado']
-        read_only_fields = ['id_meta']
+                  'estado', 'descripcion', 'porcentaje_completado', 'secuencia_cambio']
+        # monto_actual solo cambia con aportes (agregar_monto / aportar)
+        read_only_fields = ['id_meta', 'monto_actual', 'secuencia_cambio']
+
+
+class AporteMetaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AporteMeta
+        fields = ['id_aporte', 'id_meta', 'monto', 'fecha', 'descripcion']
+        read_only_fields = ['id_aporte', 'id_meta', 'fecha']
+
+
+class ProyeccionMetaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProyeccionMeta
+        fields = ['id_meta', 'ahorro_semanal_requerido', 'ahorro_semanal_estimado', 'semanas_estimadas',
+                  'fecha_estimada', 'en_camino', 'fecha_calculo']
+
+
+class AnomaliaGastoSerializer(serializers.ModelSerializer):
+    tipo_display = serializers.CharField(source='get_tipo_display', read_only=True)
+    
+    class Meta:
+        model = AnomaliaGasto
+        fields = ['id_anomalia', 'tipo', 'tipo_display', 'categoria', 'anio', 'semana', 'id_registro',
+                  'monto', 'referencia', 'puntaje', 'cantidad', 'fecha_deteccion']
+
+
+class PresupuestoCategoriaSerializer(serializers.ModelSerializer):
+    limite = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    
+    class Meta:
+        model = PresupuestoCategoria
+        fields = ['id_presupuesto', 'categoria', 'periodo', 'limite', 'desde', 'fecha_creacion']
+        read_only_fields = ['id_presupuesto', 'desde', 'fecha_creacion']
+    
+    def validate(self, attrs):
+        # id_usuario no viene en el cuerpo: la unicidad se revisa con el usuario de la petición
+        usuario = self.context['request'].user
+        categoria = attrs.get('categoria', getattr(self.instance, 'categoria', None))
+        periodo = attrs.get('periodo', getattr(self.instance, 'periodo', 'mensual'))
+        existentes = PresupuestoCategoria.objects.filter(id_usuario=usuario, categoria=categoria, periodo=periodo)
+        if self.instance is not None:
+            existentes = existentes.exclude(pk=self.instance.pk)
+        if existentes.exists():
+            raise serializers.ValidationError({'categoria': 'Ya hay un presupuesto para esta categoría y periodo'})
+        return attrs
+
+
+class EventoPresupuestoSerializer(serializers.ModelSerializer):
+    categoria = serializers.CharField(source='id_presupuesto.categoria', read_only=True)
+    periodo = serializers.CharField(source='id_presupuesto.periodo', read_only=True)
+    
+    class Meta:
+        model = EventoPresupuesto
+        fields = ['id_evento', 'id_presupuesto', 'categoria', 'periodo', 'inicio', 'umbral', 'gastado', 'limite',
+                  'fecha']
+
+
+class AporteItemSerializer(serializers.Serializer):
+    id_meta = serializers.IntegerField()
+    monto = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    descripcion = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+
+
+class AportesLoteSerializer(serializers.Serializer):
+    aportes = AporteItemSerializer(many=True, allow_empty=False, max_length=1000)
 
 
 class DashboardSerializer(serializers.Serializer):
@@ -37,10 +120,14 @@ class DashboardSerializer(serializers.Serializer):
     - resumen_por_categoria: lista de {categoria, total} en periodo reciente
     - registros_recientes: últimos registros (lista de dicts)
     - metas_activas: metas activas del usuario (lista de dicts)
+    - alertas_gasto: anomalías de gasto más recientes (lista de dicts)
+    - presupuestos: límite, gastado y restante de cada presupuesto en el periodo en curso
     """
     total_ingresos = serializers.FloatField()
     total_gastos = serializers.FloatField()
     balance = serializers.FloatField()
     resumen_por_categoria = serializers.ListField(child=serializers.DictField(), allow_empty=True)
     registros_recientes = serializers.ListField(child=serializers.DictField(), allow_empty=True)
-    metas_activas = serializers.ListField(child=serializers.DictField(), allow_empty=True)
\ No newline at end of file
+    metas_activas = serializers.ListField(child=serializers.DictField(), allow_empty=True)
+    alertas_gasto = serializers.ListField(child=serializers.DictField(), allow_empty=True)
+    presupuestos = serializers.ListField(child=serializers.DictField(), allow_empty=True)
@@ -0,0 +1,23 @@
+"""Servicios de finanzas, un módulo por área.
+
+- reportes: ventanas semanales, reportes y resumen anual (ServicioFinanzas)
+- resumenes: resúmenes semanales por categoría
+- presupuestos: contadores de gasto por presupuesto y sus umbrales
+- exportacion / importacion: CSV y JSON del libro de registros
+- sincronizacion: números de cambio y eliminaciones para clientes offline
+- cache: versión financiera por usuario y caché del dashboard
+- agregados: series por periodo en rangos arbitrarios
+- metas: aportes a metas financieras
+
+Todo se sigue importando desde finanzas.servicios.
+"""
+from .agregados import ServicioAgregados
+from .cache import ServicioCacheDashboard, ServicioVersionFinanciera
+from .exportacion import ServicioExportacion
+from .importacion import ServicioImportacion
+from .metas import ServicioMetas
+from .presupuestos import ServicioPresupuestos
+from .reportes import ServicioFinanzas
+from .resumenes import ServicioResumenSemanal
+from .sincronizacion import ServicioSincronizacion
+
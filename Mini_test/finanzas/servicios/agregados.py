@@ -0,0 +1,106 @@
+from decimal import Decimal
+from django.db.models import DateField, Sum, Count, Q
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncQuarter, TruncYear
+from django.utils import timezone
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from ..models import RegistroFinanciero
+from .. import archivo, dinero
+from .cache import ServicioVersionFinanciera
+from .reportes import ServicioFinanzas
+
+
+class ServicioAgregados:
+    """Series de ingresos/gastos por periodo para rangos arbitrarios.
+    
+    Una sola consulta GROUP BY truncando la fecha en la zona horaria local, más
+    las filas de los años archivados que toque el rango; el resultado se guarda
+    en caché por usuario, parámetros y versión financiera.
+    """
+    
+    PREFIJO = 'finanzas:agregados'
+    BUCKETS = {
+        'dia': TruncDay,
+        'semana': TruncWeek,
+        'mes': TruncMonth,
+        'trimestre': TruncQuarter,
+        'anio': TruncYear,
+    }
+    AGRUPACIONES = ('tipo', 'categoria')
+    
+    @staticmethod
+    def truncar(dia, bucket):
+        """Primer día del periodo que contiene dia, como los Trunc* de BUCKETS"""
+        if bucket == 'semana':
+            return dia - timedelta(days=dia.weekday())
+        if bucket == 'mes':
+            return dia.replace(day=1)
+        if bucket == 'trimestre':
+            return dia.replace(month=(dia.month - 1) // 3 * 3 + 1, day=1)
+        if bucket == 'anio':
+            return dia.replace(month=1, day=1)
+        return dia
+    
+    @staticmethod
+    def calcular(usuario_id, desde, hasta, bucket, agrupar_por=()):
+        truncar = ServicioAgregados.BUCKETS[bucket]
+        inicio, fin = ServicioFinanzas.ventana_fechas(desde, hasta)
+        filas = (
+            RegistroFinanciero.objects
+            .filter(id_usuario_id=usuario_id, fecha__gte=inicio, fecha__lt=fin)
+            .annotate(periodo=truncar('fecha', output_field=DateField(), tzinfo=timezone.get_current_timezone()))
+            .values('periodo', *agrupar_por)
+            .annotate(
+                ingresos=Sum('monto', filter=Q(tipo='ingreso'), default=Decimal('0')),
+                gastos=Sum('monto', filter=Q(tipo='gasto'), default=Decimal('0')),
+                cantidad=Count('id_registro'),
+            )
+            .order_by('periodo', *agrupar_por)
+        )
+        sumas = {
+            (fila['periodo'], *(fila[campo] for campo in agrupar_por)):
+                [dinero.centavos(fila['ingresos']), dinero.centavos(fila['gastos']), fila['cantidad']]
+            for fila in filas
+        }
+        # Los años archivados se suman fila a fila, truncando la fecha como el SQL
+        posiciones = {'tipo': 2, 'categoria': 3}
+        for fila in archivo.rango(usuario_id, inicio, fin):
+            clave = (ServicioAgregados.truncar(timezone.localtime(fila[1]).date(), bucket),
+                     *(fila[posiciones[campo]] for campo in agrupar_por))
+            suma = sumas.setdefault(clave, [0, 0, 0])
+            suma[0 if fila[2] == 'ingreso' else 1] += dinero.centavos(fila[4])
+            suma[2] += 1
+        serie = []
+        for clave in sorted(sumas):
+            ingresos, gastos, cantidad = sumas[clave]
+            punto = {'periodo': clave[0].isoformat()}
+            punto.update(zip(agrupar_por, clave[1:]))
+            punto.update({
+                'ingresos': dinero.a_float(ingresos),
+                'gastos': dinero.a_float(gastos),
+                'balance': dinero.a_float(ingresos - gastos),
+                'cantidad': cantidad,
+            })
+            serie.append(punto)
+        return {
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'bucket': bucket,
+            'group_by': list(agrupar_por),
+            'serie': serie,
+        }
+    
+    @staticmethod
+    def obtener(usuario_id, desde, hasta, bucket, agrupar_por=(), version=None):
+        if version is None:
+            version, _ = ServicioVersionFinanciera.obtener(usuario_id)
+        clave = '{}:{}:v{}:{}:{}:{}:{}'.format(
+            ServicioAgregados.PREFIJO, usuario_id, version, desde.isoformat(), hasta.isoformat(),
+            bucket, ','.join(agrupar_por)
+        )
+        datos = cache.get(clave)
+        if datos is None:
+            datos = ServicioAgregados.calcular(usuario_id, desde, hasta, bucket, agrupar_por)
+            cache.set(clave, datos, timeout=getattr(settings, 'AGREGADOS_CACHE_TIMEOUT', 600))
+        return datos
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import threading
+from django.db.models import F
+from django.utils import timezone
+from django.conf import settings
+from django.core.cache import cache
+from ..models import VersionFinanciera
+
+
+class ServicioVersionFinanciera:
+    """Contador de cambios por usuario usado para invalidar cachés"""
+    
+    @staticmethod
+    def incrementar(usuario_id):
+        """Incrementa la versión del usuario; llamar dentro de la transacción de la escritura"""
+        ahora = timezone.now()
+        actualizadas = VersionFinanciera.objects.filter(id_usuario_id=usuario_id).update(
+            version=F('version') + 1, fecha_modificacion=ahora
+        )
+        if not actualizadas:
+            _, creada = VersionFinanciera.objects.get_or_create(
+                id_usuario_id=usuario_id, defaults={'version': 1, 'fecha_modificacion': ahora}
+            )
+            if not creada:
+                VersionFinanciera.objects.filter(id_usuario_id=usuario_id).update(
+                    version=F('version') + 1, fecha_modificacion=ahora
+                )
+    
+    @staticmethod
+    def obtener(usuario_id):
+        """Retorna (version, fecha_modificacion); (0, None) si el usuario nunca escribió"""
+        fila = VersionFinanciera.objects.filter(id_usuario_id=usuario_id).values_list(
+            'version', 'fecha_modificacion'
+        ).first()
+        return fila or (0, None)
+    
+    @staticmethod
+    def validadores_http(usuario_id, *variantes):
+        """(etag, last_modified, version) de una lectura a partir de la versión del usuario.
+        
+        variantes distingue respuestas distintas con la misma versión (ruta,
+        parámetros, tipo de contenido). La semana y el mes actuales también entran
+        en los validadores porque las vistas por defecto cambian de semana y los
+        presupuestos mensuales de periodo sin escrituras.
+        """
+        from .reportes import ServicioFinanzas
+        version, modificado = ServicioVersionFinanciera.obtener(usuario_id)
+        semana, anio, fecha_inicio, _ = ServicioFinanzas.obtener_fecha_semana()
+        mes = timezone.localdate().replace(day=1)
+        base = ':'.join(str(parte) for parte in (usuario_id, version, anio, semana, mes, *variantes))
+        etag = '"%s"' % hashlib.sha1(base.encode()).hexdigest()[:24]
+        inicio_periodo = ServicioFinanzas.inicio_del_dia(max(fecha_inicio, mes))
+        ultima_modificacion = max(modificado, inicio_periodo) if modificado else inicio_periodo
+        return etag, ultima_modificacion, version
+
+
+class ServicioCacheDashboard:
+    """Caché del payload del dashboard por usuario, semana ISO, mes y versión.
+    
+    El mes entra en la clave porque los presupuestos mensuales del payload
+    empiezan de cero el día 1, que puede caer a mitad de semana.
+    
+    Los aciertos y fallos se cuentan en memoria de cada proceso: contarlos en
+    la caché costaba dos viajes más por lectura y, en la caché en archivos,
+    incr() lee y escribe sin atomicidad y pierde cuentas con lectores
+    simultáneos.
+    """
+    
+    PREFIJO = 'finanzas:dashboard'
+    _contadores = {'hits': 0, 'misses': 0}
+    _guardia = threading.Lock()
+    
+    @staticmethod
+    def clave(usuario_id, anio, semana, version, mes):
+        return f'{ServicioCacheDashboard.PREFIJO}:{usuario_id}:{anio}-{semana}:{mes:%Y-%m}:v{version}'
+    
+    @staticmethod
+    def _contar(nombre):
+        with ServicioCacheDashboard._guardia:
+            ServicioCacheDashboard._contadores[nombre] += 1
+    
+    @staticmethod
+    def obtener(usuario_id, anio, semana, calcular, version=None, mes=None):
+        """Retorna (datos, acierto). calcular() se ejecuta solo si no hay datos para la versión actual"""
+        if version is None:
+            version, _ = ServicioVersionFinanciera.obtener(usuario_id)
+        clave = ServicioCacheDashboard.clave(usuario_id, anio, semana, version,
+                                             mes or timezone.localdate().replace(day=1))
+        datos = cache.get(clave)
+        if datos is not None:
+            ServicioCacheDashboard._contar('hits')
+            return datos, True
+        
+        ServicioCacheDashboard._contar('misses')
+        datos = calcular()
+        cache.set(clave, datos, timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+        return datos, False
+    
+    @staticmethod
+    def estadisticas():
+        """Aciertos y fallos de este proceso desde que arrancó (cada worker lleva los suyos)"""
+        with ServicioCacheDashboard._guardia:
+            hits, misses = ServicioCacheDashboard._contadores['hits'], ServicioCacheDashboard._contadores['misses']
+        total = hits + misses
+        return {
+            'proceso': os.getpid(),
+            'hits': hits,
+            'misses': misses,
+            'tasa_aciertos': round(hits / total, 4) if total else 0.0,
+        }
+    
+    @staticmethod
+    def reiniciar_estadisticas():
+        with ServicioCacheDashboard._guardia:
+            ServicioCacheDashboard._contadores.update(hits=0, misses=0)
@@ -0,0 +1,69 @@
+import csv
+import heapq
+import json
+from django.utils import timezone
+from datetime import timedelta
+from ..models import RegistroFinanciero
+from .. import archivo
+from .reportes import ServicioFinanzas
+
+
+class _Eco:
+    """Pseudo-buffer para csv.writer: retorna la línea en lugar de guardarla"""
+    def write(self, valor):
+        return valor
+
+
+class ServicioExportacion:
+    """Exportación en streaming del libro de registros de un usuario"""
+    
+    CAMPOS = ['id_registro', 'fecha', 'tipo', 'categoria', 'monto', 'descripcion']
+    TAMANO_BLOQUE = 2000
+    
+    @staticmethod
+    def filtrar(usuario, desde=None, hasta=None, tipo=None, categoria=None):
+        """Registros del usuario filtrados por rango de días [desde, hasta], tipo y categoría"""
+        registros = RegistroFinanciero.objects.filter(id_usuario=usuario)
+        if desde:
+            registros = registros.filter(fecha__gte=ServicioFinanzas.inicio_del_dia(desde))
+        if hasta:
+            registros = registros.filter(fecha__lt=ServicioFinanzas.inicio_del_dia(hasta + timedelta(days=1)))
+        if tipo:
+            registros = registros.filter(tipo=tipo)
+        if categoria:
+            registros = registros.filter(categoria=categoria)
+        return registros.order_by('fecha', 'id_registro')
+    
+    @staticmethod
+    def archivados(usuario, desde=None, hasta=None, tipo=None, categoria=None):
+        """Los registros archivados con los mismos filtros que filtrar(), en el mismo orden"""
+        inicio = ServicioFinanzas.inicio_del_dia(desde) if desde else None
+        fin = ServicioFinanzas.inicio_del_dia(hasta + timedelta(days=1)) if hasta else None
+        for fila in archivo.rango(usuario.pk, inicio, fin, tipo=tipo, categoria=categoria):
+            yield fila[:len(ServicioExportacion.CAMPOS)]
+    
+    @staticmethod
+    def _filas(registros, archivados=()):
+        """Itera con un cursor del servidor sin cargar el libro completo en memoria.
+        
+        Intercala por (fecha, id_registro) las filas archivadas, que vienen en ese orden.
+        """
+        filas = heapq.merge(
+            archivados,
+            registros.values_list(*ServicioExportacion.CAMPOS).iterator(chunk_size=ServicioExportacion.TAMANO_BLOQUE),
+            key=lambda f: (f[1], f[0])
+        )
+        for id_registro, fecha, tipo, categoria, monto, descripcion in filas:
+            yield [id_registro, timezone.localtime(fecha).isoformat(), tipo, categoria, str(monto), descripcion]
+    
+    @staticmethod
+    def lineas_csv(registros, archivados=()):
+        escritor = csv.writer(_Eco())
+        yield escritor.writerow(ServicioExportacion.CAMPOS)
+        for fila in ServicioExportacion._filas(registros, archivados):
+            yield escritor.writerow(fila)
+    
+    @staticmethod
+    def lineas_ndjson(registros, archivados=()):
+        for fila in ServicioExportacion._filas(registros, archivados):
+            yield json.dumps(dict(zip(ServicioExportacion.CAMPOS, fila)), ensure_ascii=False) + '\n'
@@ -0,0 +1,151 @@
+import codecs
+import csv
+import json
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from ..models import RegistroFinanciero
+from .. import categorizador, dinero
+from .cache import ServicioVersionFinanciera
+from .presupuestos import ServicioPresupuestos
+from .reportes import ServicioFinanzas
+from .resumenes import ServicioResumenSemanal
+from .sincronizacion import ServicioSincronizacion
+
+
+class ServicioImportacion:
+    """Importación masiva de registros desde CSV o JSON-lines"""
+    
+    TAMANO_LOTE = 1000
+    MAX_ERRORES = 1000
+    MONTO_MAXIMO = Decimal('99999999.99')  # max_digits=10, decimal_places=2
+    TIPOS = {t for t, _ in RegistroFinanciero.TIPO_CHOICES}
+    CATEGORIAS = {c for c, _ in RegistroFinanciero.CATEGORIA_CHOICES}
+    
+    @staticmethod
+    def detectar_formato(nombre_archivo):
+        nombre = (nombre_archivo or '').lower()
+        if nombre.endswith(('.jsonl', '.ndjson')):
+            return 'ndjson'
+        if nombre.endswith('.csv'):
+            return 'csv'
+        return None
+    
+    @staticmethod
+    def leer_filas(archivo, formato):
+        """Genera (número de fila, dict o None si no se pudo leer) sin cargar el archivo completo"""
+        lineas = codecs.iterdecode(archivo, 'utf-8-sig')
+        if formato == 'csv':
+            # La fila 1 es la cabecera
+            for numero, fila in enumerate(csv.DictReader(lineas), start=2):
+                yield numero, fila
+            return
+        for numero, linea in enumerate(lineas, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                fila = None
+            yield numero, fila if isinstance(fila, dict) else None
+    
+    @staticmethod
+    def validar_fila(fila, zona=None, sugerir=False):
+        """Retorna (datos, errores) de una fila; datos es None si hay errores.
+        
+        Con sugerir, una fila sin categoría pero con descripción es válida y
+        queda con categoria vacía para que la complete el categorizador.
+        """
+        if fila is None:
+            return None, {'fila': 'No es un objeto JSON válido'}
+        
+        errores = {}
+        tipo = str(fila.get('tipo') or '').strip()
+        categoria = str(fila.get('categoria') or '').strip()
+        descripcion = fila.get('descripcion') or ''
+        
+        if tipo not in ServicioImportacion.TIPOS:
+            errores['tipo'] = 'Debe ser "ingreso" o "gasto"'
+        if categoria not in ServicioImportacion.CATEGORIAS and not (
+                sugerir and not categoria and str(descripcion).strip()):
+            errores['categoria'] = 'Categoría no válida'
+        
+        monto = None
+        try:
+            monto = dinero.redondear(fila.get('monto'))
+            if monto <= 0 or monto > ServicioImportacion.MONTO_MAXIMO:
+                errores['monto'] = 'Debe ser un número positivo menor a 100 000 000'
+        except ValueError:
+            errores['monto'] = 'No es un número válido'
+        
+        fecha_str = str(fila.get('fecha') or '').strip()
+        fecha = ServicioFinanzas.normalizar_fecha(fecha_str, zona)
+        if fecha_str and fecha is None:
+            errores['fecha'] = 'Debe tener formato ISO 8601'
+        
+        if errores:
+            return None, errores
+        return {
+            'tipo': tipo,
+            'categoria': categoria,
+            'monto': monto,
+            'fecha': fecha or timezone.localtime(timezone.now()),
+            'descripcion': str(descripcion),
+        }, None
+    
+    @staticmethod
+    def _insertar(lote, modelo=None):
+        """Inserta el lote; las filas sin categoría se clasifican juntas. Retorna cuántas se sugirieron"""
+        pendientes = [r for r in lote if not r.categoria]
+        if pendientes:
+            sugeridas = modelo.predecir_lote([r.descripcion for r in pendientes], [r.tipo for r in pendientes],
+                                             [r.monto for r in pendientes])
+            for registro, (categoria, _) in zip(pendientes, sugeridas):
+                registro.categoria = categoria
+        RegistroFinanciero.objects.bulk_create(lote)
+        # bulk_create no pasa por save(): los resúmenes y los presupuestos se actualizan con un delta por clave
+        ServicioResumenSemanal.registrar_registros(lote)
+        ServicioPresupuestos.registrar_registros(lote)
+        return len(pendientes)
+    
+    @staticmethod
+    def importar(usuario, archivo, formato):
+        """Valida e inserta en lotes dentro de una transacción.
+        
+        Las filas inválidas no detienen la importación: se reportan en
+        'errores' (hasta MAX_ERRORES) y se cuentan en 'total_errores'. Si hay
+        un categorizador entrenado, las filas sin categoría se completan con
+        la sugerida ('categorias_sugeridas').
+        """
+        modelo = categorizador.obtener()
+        creados = 0
+        sugeridas = 0
+        total_errores = 0
+        errores = []
+        lote = []
+        zona = timezone.get_current_timezone()
+        with transaction.atomic():
+            # Las filas toman su secuencia_cambio del valor por defecto de la columna
+            ServicioSincronizacion.registrar_escritura(usuario.pk)
+            for numero, fila in ServicioImportacion.leer_filas(archivo, formato):
+                datos, errores_fila = ServicioImportacion.validar_fila(fila, zona, sugerir=modelo is not None)
+                if errores_fila:
+                    total_errores += 1
+                    if len(errores) < ServicioImportacion.MAX_ERRORES:
+                        errores.append({'fila': numero, 'errores': errores_fila})
+                    continue
+                
+                lote.append(RegistroFinanciero(id_usuario=usuario, **datos))
+                if len(lote) >= ServicioImportacion.TAMANO_LOTE:
+                    sugeridas += ServicioImportacion._insertar(lote, modelo)
+                    creados += len(lote)
+                    lote = []
+            
+            if lote:
+                sugeridas += ServicioImportacion._insertar(lote, modelo)
+                creados += len(lote)
+            if creados:
+                ServicioVersionFinanciera.incrementar(usuario.pk)
+        
+        return {'creados': creados, 'categorias_sugeridas': sugeridas, 'total_errores': total_errores,
+                'errores': errores}
@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from ..models import MetaFinanciera, AporteMeta, SiguienteCambio
+from .. import dinero
+from .cache import ServicioVersionFinanciera
+from .sincronizacion import ServicioSincronizacion
+
+
+class ServicioMetas:
+    @staticmethod
+    def aplicar_aportes(usuario, aportes):
+        """Registra aportes [(id_meta, monto, descripcion)] en una sola transacción.
+        
+        Las metas se bloquean en orden de id (select_for_update) y monto_actual
+        se actualiza con F() en un único UPDATE con CASE por meta, así los
+        aportes simultáneos nunca se pisan. Las metas que alcanzan el objetivo
+        pasan a 'completada' en otro UPDATE por conjunto. Lanza ValueError si
+        alguna meta no existe, no es del usuario o está cancelada.
+        """
+        totales = {}
+        for id_meta, monto, _ in aportes:
+            totales[id_meta] = totales.get(id_meta, 0) + dinero.centavos(monto)
+        ids = sorted(totales)
+        
+        with transaction.atomic():
+            ServicioSincronizacion.registrar_escritura(usuario.pk)
+            disponibles = list(
+                MetaFinanciera.objects.select_for_update()
+                .filter(id_usuario=usuario, id_meta__in=ids)
+                .exclude(estado='cancelada')
+                .order_by('id_meta')
+                .values_list('id_meta', flat=True)
+            )
+            faltantes = sorted(set(ids) - set(disponibles))
+            if faltantes:
+                raise ValueError(f'Metas inexistentes o canceladas: {faltantes}')
+            
+            AporteMeta.objects.bulk_create([
+                AporteMeta(id_meta_id=id_meta, monto=monto, descripcion=descripcion)
+                for id_meta, monto, descripcion in aportes
+            ])
+            metas = MetaFinanciera.objects.filter(id_meta__in=ids)
+            metas.update(monto_actual=F('monto_actual') + Case(
+                *[When(id_meta=id_meta, then=Value(dinero.a_decimal(total))) for id_meta, total in totales.items()],
+                output_field=DecimalField(max_digits=12, decimal_places=2)
+            ), secuencia_cambio=SiguienteCambio())
+            metas.filter(estado='activa', monto_actual__gte=F('monto_objetivo')).update(
+                estado='completada', secuencia_cambio=SiguienteCambio()
+            )
+            # update() no pasa por save(): la versión se incrementa a mano
+            ServicioVersionFinanciera.incrementar(usuario.pk)
+        
+        return list(MetaFinanciera.objects.filter(id_meta__in=ids).order_by('id_meta'))
@@ -0,0 +1,257 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, DateField, DecimalField, Sum, Count, Exists, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, TruncWeek, TruncMonth
+from django.utils import timezone
+from datetime import datetime, timedelta, date
+from minitest.bloqueos import bloqueo_exclusivo
+from ..models import RegistroFinanciero, PresupuestoCategoria, GastoPresupuesto, EventoPresupuesto
+from .. import archivo, dinero, upsert
+from .reportes import ServicioFinanzas
+from .sincronizacion import ServicioSincronizacion
+
+
+class ServicioPresupuestos:
+    """Contadores de gasto de los presupuestos por categoría.
+    
+    Cada escritura de un gasto suma (o resta) su monto al contador del periodo
+    (GastoPresupuesto) de los presupuestos de su usuario y categoría, con el
+    mismo upsert incremental que los resúmenes semanales: saber cuánto queda
+    lee una fila por presupuesto y nunca recorre el libro. La escritura que
+    lleva lo gastado de un periodo a UMBRALES por ciento del límite crea el
+    EventoPresupuesto. La verificación nocturna compara los contadores con el
+    libro y rehace los de los usuarios con diferencias.
+    """
+    UMBRALES = (80, 100)
+    
+    @staticmethod
+    def inicio_periodo(periodo, fecha, zona=None):
+        """Lunes de la semana ISO o día 1 del mes de una fecha o de un instante en hora de Lima"""
+        if isinstance(fecha, datetime):
+            if timezone.is_aware(fecha):
+                fecha = fecha.astimezone(zona or timezone.get_current_timezone())
+            fecha = fecha.date()
+        if periodo == 'semanal':
+            return fecha - timedelta(days=fecha.weekday())
+        return fecha.replace(day=1)
+    
+    @staticmethod
+    def fin_periodo(periodo, inicio):
+        """Inicio del periodo siguiente"""
+        if periodo == 'semanal':
+            return inicio + timedelta(weeks=1)
+        return (inicio + timedelta(days=32)).replace(day=1)
+    
+    @staticmethod
+    def _presupuestos(presupuestos):
+        """{(usuario, categoría): [(id, periodo, desde, límite en centavos)]} de un queryset de presupuestos"""
+        resultado = {}
+        for id_presupuesto, usuario_id, categoria, periodo, desde, limite in presupuestos.values_list(
+            'id_presupuesto', 'id_usuario_id', 'categoria', 'periodo', 'desde', 'limite'
+        ):
+            resultado.setdefault((usuario_id, categoria), []).append(
+                (id_presupuesto, periodo, desde, dinero.centavos(limite))
+            )
+        return resultado
+    
+    @staticmethod
+    def _acumular(deltas, presupuestos, valores, signo, zona=None):
+        if valores['tipo'] != 'gasto':
+            return
+        monto = dinero.centavos(valores['monto']) * signo
+        for id_presupuesto, periodo, desde, _ in presupuestos.get((valores['id_usuario_id'], valores['categoria']), ()):
+            inicio = ServicioPresupuestos.inicio_periodo(periodo, valores['fecha'], zona)
+            if inicio < desde:
+                continue
+            gastado, cantidad = deltas.get((id_presupuesto, inicio), (0, 0))
+            deltas[(id_presupuesto, inicio)] = (gastado + monto, cantidad + signo)
+    
+    @staticmethod
+    def _aplicar(deltas, presupuestos, tamano_bloque=500):
+        """Suma los deltas a los contadores y registra los umbrales que quedaron cruzados.
+        
+        El upsert incrementa en la base y retorna el valor nuevo, así el valor
+        anterior es nuevo - delta aunque otra transacción haya escrito antes.
+        """
+        filas = [(clave, delta) for clave, delta in sorted(deltas.items()) if any(delta)]
+        if not filas:
+            return
+        limites = {
+            id_presupuesto: (usuario_id, limite)
+            for (usuario_id, _), grupo in presupuestos.items() for id_presupuesto, _, _, limite in grupo
+        }
+        
+        escritos = upsert.sumar(
+            GastoPresupuesto, ['id_presupuesto_id', 'inicio'], ['gastado', 'cantidad_registros'],
+            [(id_presupuesto, inicio, dinero.a_decimal(gastado), cantidad)
+             for (id_presupuesto, inicio), (gastado, cantidad) in filas],
+            retornar=['id_presupuesto_id', 'inicio', 'gastado'], tamano_bloque=tamano_bloque,
+        )
+        eventos = []
+        for id_presupuesto, inicio, gastado in escritos:
+            usuario_id, limite = limites[id_presupuesto]
+            nuevo = dinero.centavos(gastado)
+            anterior = nuevo - deltas[(id_presupuesto, inicio)][0]
+            eventos.extend(
+                EventoPresupuesto(id_usuario_id=usuario_id, id_presupuesto_id=id_presupuesto, inicio=inicio,
+                                  umbral=umbral, gastado=gastado, limite=dinero.a_decimal(limite))
+                for umbral in ServicioPresupuestos.UMBRALES
+                if anterior * 100 < limite * umbral <= nuevo * 100
+            )
+        if eventos:
+            EventoPresupuesto.objects.bulk_create(eventos, ignore_conflicts=True)
+    
+    @staticmethod
+    def registrar_cambio(anterior, actual):
+        """Traslada a los contadores el cambio de un registro (None = no existía / ya no existe)"""
+        ServicioPresupuestos.registrar_valores([(anterior, -1), (actual, 1)])
+    
+    @staticmethod
+    def registrar_registros(registros, signo=1):
+        """Suma (o resta con signo=-1) un lote de registros con un solo upsert por contador"""
+        ServicioPresupuestos.registrar_valores([(r.valores_resumen(), signo) for r in registros])
+    
+    @staticmethod
+    def registrar_valores(cambios):
+        """Aplica [(valores_resumen o None, signo)]; sin gastos no consulta nada"""
+        gastos = [(valores, signo) for valores, signo in cambios if valores is not None and valores['tipo'] == 'gasto']
+        if not gastos:
+            return
+        presupuestos = ServicioPresupuestos._presupuestos(PresupuestoCategoria.objects.filter(
+            id_usuario__in={v['id_usuario_id'] for v, _ in gastos},
+            categoria__in={v['categoria'] for v, _ in gastos},
+        ))
+        if not presupuestos:
+            return
+        deltas = {}
+        zona = timezone.get_current_timezone()
+        for valores, signo in gastos:
+            ServicioPresupuestos._acumular(deltas, presupuestos, valores, signo, zona)
+        with transaction.atomic():
+            ServicioPresupuestos._aplicar(deltas, presupuestos)
+    
+    @staticmethod
+    def calcular_desde_registros(presupuestos):
+        """{(id_presupuesto, inicio): (gastado en centavos, cantidad)} del libro, agrupado en SQL por periodo"""
+        indice = ServicioPresupuestos._presupuestos(presupuestos)
+        resultado = {}
+        for periodo, truncar in (('semanal', TruncWeek), ('mensual', TruncMonth)):
+            del_periodo = presupuestos.filter(periodo=periodo)
+            desde = del_periodo.order_by('desde').values_list('desde', flat=True).first()
+            if desde is None:
+                continue
+            filas = (
+                RegistroFinanciero.objects
+                .filter(tipo='gasto', fecha__gte=ServicioFinanzas.inicio_del_dia(desde))
+                .annotate(inicio=truncar('fecha', output_field=DateField()))
+                .filter(Exists(del_periodo.filter(id_usuario=OuterRef('id_usuario'), categoria=OuterRef('categoria'),
+                                                  desde__lte=OuterRef('inicio'))))
+                .values('id_usuario', 'categoria', 'inicio')
+                .annotate(gastado=Sum('monto'), cantidad=Count('id_registro'))
+                .order_by()
+            )
+            for fila in filas:
+                for id_presupuesto, periodo_presupuesto, _, _ in indice[(fila['id_usuario'], fila['categoria'])]:
+                    if periodo_presupuesto == periodo:
+                        resultado[(id_presupuesto, fila['inicio'])] = (dinero.centavos(fila['gastado']),
+                                                                        fila['cantidad'])
+        return resultado
+    
+    @staticmethod
+    def _comparar(presupuestos):
+        """(esperado, actual, claves) de los contadores; claves son las del horizonte verificable"""
+        esperado = ServicioPresupuestos.calcular_desde_registros(presupuestos)
+        actual = {
+            (id_presupuesto, inicio): (dinero.centavos(gastado), cantidad)
+            for id_presupuesto, inicio, gastado, cantidad in GastoPresupuesto.objects.filter(
+                id_presupuesto__in=presupuestos
+            ).values_list('id_presupuesto', 'inicio', 'gastado', 'cantidad_registros').iterator()
+        }
+        # Los periodos anteriores al horizonte pueden tener registros archivados, que ya no están en la tabla
+        horizonte = date(archivo.primer_anio_activo(), 1, 1)
+        claves = {clave for clave in set(esperado) | set(actual) if clave[1] >= horizonte}
+        return esperado, actual, claves
+    
+    @staticmethod
+    def verificar(usuario_ids=None):
+        """Compara los contadores con el libro y retorna la lista de diferencias encontradas"""
+        presupuestos = PresupuestoCategoria.objects.all()
+        if usuario_ids is not None:
+            presupuestos = presupuestos.filter(id_usuario__in=usuario_ids)
+        usuarios = dict(presupuestos.values_list('id_presupuesto', 'id_usuario_id'))
+        esperado, actual, claves = ServicioPresupuestos._comparar(presupuestos)
+        diferencias = []
+        for clave in sorted(claves):
+            if esperado.get(clave, (0, 0)) != actual.get(clave, (0, 0)):
+                id_presupuesto, inicio = clave
+                diferencias.append({
+                    'id_usuario': usuarios[id_presupuesto],
+                    'id_presupuesto': id_presupuesto,
+                    'inicio': inicio,
+                    'esperado': esperado.get(clave),
+                    'actual': actual.get(clave),
+                })
+        return diferencias
+    
+    @staticmethod
+    def reconstruir(usuario_ids):
+        """Rehace desde el libro los contadores verificables de los usuarios; no crea eventos"""
+        for usuario_id in sorted(usuario_ids):
+            # El bloqueo exclusivo espera a las escrituras en curso del usuario y detiene las nuevas
+            with bloqueo_exclusivo(ServicioSincronizacion.nombre_bloqueo(usuario_id)):
+                presupuestos = PresupuestoCategoria.objects.filter(id_usuario=usuario_id)
+                esperado, actual, claves = ServicioPresupuestos._comparar(presupuestos)
+                for id_presupuesto, inicio in claves & set(actual):
+                    GastoPresupuesto.objects.filter(id_presupuesto=id_presupuesto, inicio=inicio).delete()
+                GastoPresupuesto.objects.bulk_create([
+                    GastoPresupuesto(id_presupuesto_id=id_presupuesto, inicio=inicio,
+                                     gastado=dinero.a_decimal(gastado), cantidad_registros=cantidad)
+                    for (id_presupuesto, inicio), (gastado, cantidad) in sorted(esperado.items())
+                    if (id_presupuesto, inicio) in claves
+                ])
+    
+    @staticmethod
+    def reiniciar(presupuesto):
+        """Cuenta desde el libro lo gastado en los periodos del presupuesto a partir de desde.
+        
+        Se llama al crearlo o al cambiar su categoría o periodo; los umbrales
+        ya superados generan sus eventos.
+        """
+        with bloqueo_exclusivo(ServicioSincronizacion.nombre_bloqueo(presupuesto.id_usuario_id)):
+            GastoPresupuesto.objects.filter(id_presupuesto=presupuesto).delete()
+            EventoPresupuesto.objects.filter(id_presupuesto=presupuesto).delete()
+            presupuestos = PresupuestoCategoria.objects.filter(pk=presupuesto.pk)
+            ServicioPresupuestos._aplicar(
+                ServicioPresupuestos.calcular_desde_registros(presupuestos),
+                ServicioPresupuestos._presupuestos(presupuestos)
+            )
+    
+    @staticmethod
+    def estado(usuario, fecha=None):
+        """Lo gastado y lo que queda de cada presupuesto en el periodo en curso, leído de los contadores"""
+        hoy = fecha or timezone.localdate()
+        semana = ServicioPresupuestos.inicio_periodo('semanal', hoy)
+        mes = ServicioPresupuestos.inicio_periodo('mensual', hoy)
+        presupuestos = PresupuestoCategoria.objects.filter(id_usuario=usuario).annotate(
+            inicio=Case(When(periodo='semanal', then=Value(semana)), default=Value(mes), output_field=DateField()),
+        ).annotate(gastado=Coalesce(
+            Subquery(GastoPresupuesto.objects.filter(
+                id_presupuesto=OuterRef('pk'), inicio=OuterRef('inicio')
+            ).values('gastado')[:1]),
+            Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ))
+        resultado = []
+        for p in presupuestos:
+            limite, gastado = dinero.centavos(p.limite), dinero.centavos(p.gastado)
+            resultado.append({
+                'id_presupuesto': p.id_presupuesto,
+                'categoria': p.categoria,
+                'periodo': p.periodo,
+                'inicio': p.inicio.isoformat(),
+                'fin': (ServicioPresupuestos.fin_periodo(p.periodo, p.inicio) - timedelta(days=1)).isoformat(),
+                'limite': dinero.a_float(limite),
+                'gastado': dinero.a_float(gastado),
+                'restante': dinero.a_float(limite - gastado),
+                'porcentaje': round(gastado * 100 / limite, 1) if limite else 0,
+            })
+        return resultado
@@ -0,0 +1,485 @@
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from django.db.models.functions import ExtractIsoYear, ExtractWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta, date, time
+from minitest.bloqueos import bloqueo_exclusivo
+from ..models import RegistroFinanciero, ReporteFinanciero, VersionFinanciera, DetalleReporteCategoria
+from .. import archivo, dinero
+from .cache import ServicioVersionFinanciera
+
+
+class ServicioFinanzas:
+    
+    @staticmethod
+    def obtener_fecha_semana(fecha=None):
+        """Obtiene el número de semana y las fechas de inicio/fin de la semana"""
+        if fecha is None:
+            fecha = timezone.localdate()
+        
+        # Obtener número de semana (ISO: lunes es el primer día)
+        semana = fecha.isocalendar()[1]
+        anio = fecha.isocalendar()[0]
+        
+        # Calcular lunes de esa semana
+        dia_semana = fecha.weekday()  # 0 = lunes, 6 = domingo
+        fecha_inicio = fecha - timedelta(days=dia_semana)
+        fecha_fin = fecha_inicio + timedelta(days=6)
+        
+        return semana, anio, fecha_inicio, fecha_fin
+    
+    @staticmethod
+    def normalizar_fecha(valor, zona=None):
+        """Convierte un texto ISO (fecha u hora) a datetime aware en hora de Lima.
+        
+        Las horas sin zona se interpretan en hora de Lima y las fechas sin hora
+        como medianoche. Retorna None si el valor está vacío o no es válido.
+        """
+        if not valor:
+            return None
+        try:
+            fecha_dt = parse_datetime(valor)
+            if fecha_dt is None:
+                solo_fecha = parse_date(valor)
+                if solo_fecha is None:
+                    return None
+                fecha_dt = datetime.combine(solo_fecha, time.min)
+        except (TypeError, ValueError):
+            return None
+        zona = zona or timezone.get_current_timezone()
+        if timezone.is_naive(fecha_dt):
+            fecha_dt = timezone.make_aware(fecha_dt, zona)
+        return fecha_dt.astimezone(zona)
+    
+    @staticmethod
+    def inicio_del_dia(fecha):
+        """Medianoche de una fecha en hora de Lima como datetime aware"""
+        return timezone.make_aware(datetime.combine(fecha, time.min))
+    
+    @staticmethod
+    def ventana_fechas(fecha_inicio, fecha_fin):
+        """Límites [inicio, fin) aware que cubren los días fecha_inicio..fecha_fin completos.
+        
+        Filtrar con fecha__gte=inicio, fecha__lt=fin compara la columna sin
+        convertirla, así Postgres puede recorrer el índice (id_usuario, fecha).
+        """
+        return (
+            ServicioFinanzas.inicio_del_dia(fecha_inicio),
+            ServicioFinanzas.inicio_del_dia(fecha_fin + timedelta(days=1))
+        )
+    
+    @staticmethod
+    def ventana_semana(semana=None, anio=None):
+        """Ventana de una semana ISO (por defecto la actual).
+        
+        Retorna (semana, anio, fecha_inicio, fecha_fin, inicio, fin): el lunes y
+        domingo como fechas y los límites [inicio, fin) como datetimes aware.
+        """
+        if semana is None or anio is None:
+            semana, anio, fecha_inicio, fecha_fin = ServicioFinanzas.obtener_fecha_semana()
+        else:
+            fecha_inicio = date.fromisocalendar(anio, semana, 1)
+            fecha_fin = fecha_inicio + timedelta(days=6)
+        inicio, fin = ServicioFinanzas.ventana_fechas(fecha_inicio, fecha_fin)
+        return semana, anio, fecha_inicio, fecha_fin, inicio, fin
+    
+    @staticmethod
+    def obtener_reporte_semanal(usuario, semana=None, anio=None):
+        """Reporte vigente de la semana, generándolo una sola vez aunque lleguen pedidos simultáneos.
+        
+        Un reporte está vigente si se calculó con la versión financiera actual
+        del usuario. Si no lo está, se toma un bloqueo por (usuario, semana,
+        año): el primero en entrar lo genera y los demás esperan y, al obtener
+        el bloqueo, reutilizan el reporte recién guardado.
+        """
+        semana, anio, _, _, _, _ = ServicioFinanzas.ventana_semana(semana, anio)
+        reporte = ServicioFinanzas.reporte_vigente(usuario, semana, anio)
+        if reporte:
+            return reporte
+        
+        with bloqueo_exclusivo(f'finanzas:reporte:{usuario.pk}:{anio}:{semana}'):
+            reporte = ServicioFinanzas.reporte_vigente(usuario, semana, anio)
+            if reporte:
+                return reporte
+            return ServicioFinanzas.generar_reporte_semanal(usuario, semana, anio)
+    
+    @staticmethod
+    def reporte_vigente(usuario, semana, anio):
+        version, _ = ServicioVersionFinanciera.obtener(usuario.pk)
+        return ReporteFinanciero.objects.filter(
+            id_usuario=usuario, semana=semana, anio=anio, version_registros=version
+        ).first()
+    
+    @staticmethod
+    def generar_reporte_semanal(usuario, semana=None, anio=None):
+        """Genera un reporte financiero para una semana específica"""
+        semana, anio, fecha_inicio, fecha_fin, inicio, fin = ServicioFinanzas.ventana_semana(semana, anio)
+        # La versión se lee antes de agregar: si hay una escritura en medio, el
+        # reporte queda con una versión vieja y se regenera en el próximo pedido
+        version, _ = ServicioVersionFinanciera.obtener(usuario.pk)
+        
+        # Totales por categoría en una consulta agrupada
+        filas = list(
+            RegistroFinanciero.objects
+            .filter(id_usuario=usuario, fecha__gte=inicio, fecha__lt=fin)
+            .values('categoria')
+            .annotate(
+                ingresos=Sum('monto', filter=Q(tipo='ingreso'), default=Decimal('0')),
+                gastos=Sum('monto', filter=Q(tipo='gasto'), default=Decimal('0')),
+            )
+            .order_by('categoria')
+        )
+        if ServicioFinanzas.puede_estar_archivado(inicio):
+            filas = ServicioFinanzas.sumar_archivados(
+                filas, archivo.totales(usuario.pk, inicio, fin, por='categoria')
+            )
+        total_ingresos = dinero.sumar(f['ingresos'] for f in filas)
+        total_gastos = dinero.sumar(f['gastos'] for f in filas)
+        
+        # Crear o actualizar reporte junto con su detalle por categoría
+        with transaction.atomic():
+            reporte, created = ReporteFinanciero.objects.update_or_create(
+                id_usuario=usuario,
+                semana=semana,
+                anio=anio,
+                defaults={
+                    'total_ingresos': dinero.a_decimal(total_ingresos),
+                    'total_gastos': dinero.a_decimal(total_gastos),
+                    'balance': dinero.a_decimal(total_ingresos - total_gastos),
+                    'fecha_inicio_semana': fecha_inicio,
+                    'fecha_fin_semana': fecha_fin,
+                    'version_registros': version
+                }
+            )
+            ServicioFinanzas.reemplazar_detalles([reporte], {reporte.pk: filas})
+        
+        return reporte
+    
+    @staticmethod
+    def puede_estar_archivado(inicio):
+        """Solo se archivan años anteriores al actual: desde el 1 de enero no hace falta leer el catálogo"""
+        return timezone.localtime(inicio).year < timezone.localdate().year
+    
+    @staticmethod
+    def sumar_archivados(filas, archivados):
+        """Suma a las filas por categoría de la tabla los totales archivados {categoria: (ingresos, gastos)} en centavos"""
+        por_categoria = {f['categoria']: dict(f) for f in filas}
+        for categoria, (ingresos, gastos) in archivados.items():
+            fila = por_categoria.setdefault(
+                categoria, {'categoria': categoria, 'ingresos': Decimal('0'), 'gastos': Decimal('0')}
+            )
+            fila['ingresos'] = dinero.a_decimal(dinero.centavos(fila['ingresos']) + ingresos)
+            fila['gastos'] = dinero.a_decimal(dinero.centavos(fila['gastos']) + gastos)
+        return [por_categoria[c] for c in sorted(por_categoria)]
+    
+    @staticmethod
+    def reemplazar_detalles(reportes, filas_por_reporte):
+        """Reescribe las filas DetalleReporteCategoria de los reportes.
+        
+        filas_por_reporte: {id_reporte: [{'categoria', 'ingresos', 'gastos'}]}.
+        Debe llamarse dentro de la transacción que escribe los reportes.
+        """
+        DetalleReporteCategoria.objects.filter(id_reporte__in=[r.pk for r in reportes]).delete()
+        DetalleReporteCategoria.objects.bulk_create([
+            DetalleReporteCategoria(
+                id_reporte_id=reporte.pk, id_usuario_id=reporte.id_usuario_id, anio=reporte.anio,
+                semana=reporte.semana, categoria=fila['categoria'], ingresos=fila['ingresos'], gastos=fila['gastos']
+            )
+            for reporte in reportes for fila in filas_por_reporte.get(reporte.pk, [])
+        ], batch_size=1000)
+    
+    @staticmethod
+    def tendencia_categoria(usuario, anio, categoria=None):
+        """Montos por categoría de los reportes del año, desde DetalleReporteCategoria.
+        
+        Con categoría, la serie semanal de esa categoría; sin ella, el total
+        del año por categoría. En ambos casos una consulta sobre el índice
+        (usuario, categoría, año, semana).
+        """
+        detalles = DetalleReporteCategoria.objects.filter(id_usuario=usuario, anio=anio)
+        if categoria:
+            semanas = list(
+                detalles.filter(categoria=categoria)
+                .order_by('semana')
+                .values('semana', 'ingresos', 'gastos')
+            )
+            return {
+                'anio': anio,
+                'categoria': categoria,
+                'total_ingresos': dinero.a_float(dinero.sumar(s['ingresos'] for s in semanas)),
+                'total_gastos': dinero.a_float(dinero.sumar(s['gastos'] for s in semanas)),
+                'semanas': [
+                    {'semana': s['semana'], 'ingresos': float(s['ingresos']), 'gastos': float(s['gastos'])}
+                    for s in semanas
+                ],
+            }
+        categorias = (
+            detalles.values('categoria')
+            .annotate(ingresos=Sum('ingresos'), gastos=Sum('gastos'), semanas=Count('semana'))
+            .order_by('-gastos', 'categoria')
+        )
+        return {
+            'anio': anio,
+            'categorias': [
+                {'categoria': c['categoria'], 'ingresos': float(c['ingresos']), 'gastos': float(c['gastos']),
+                 'semanas': c['semanas']}
+                for c in categorias
+            ],
+        }
+    
+    @staticmethod
+    def semanas_del_anio(anio):
+        """Cantidad de semanas ISO del año (52 o 53)"""
+        return date(anio, 12, 28).isocalendar()[1]
+    
+    @staticmethod
+    def totales_por_semana(usuario, inicio, fin, filtro=None):
+        """{semana ISO: (ingresos, gastos)} en centavos de los registros en [inicio, fin), una consulta GROUP BY"""
+        registros = RegistroFinanciero.objects.filter(id_usuario=usuario, fecha__gte=inicio, fecha__lt=fin)
+        if filtro is not None:
+            registros = registros.filter(filtro)
+        filas = (
+            registros
+            .annotate(semana_iso=ExtractWeek('fecha'))
+            .values('semana_iso')
+            .annotate(
+                ingresos=Sum('monto', filter=Q(tipo='ingreso'), default=Decimal('0')),
+                gastos=Sum('monto', filter=Q(tipo='gasto'), default=Decimal('0')),
+            )
+            .order_by()
+        )
+        return {f['semana_iso']: (dinero.centavos(f['ingresos']), dinero.centavos(f['gastos'])) for f in filas}
+    
+    @staticmethod
+    def obtener_resumen_anual(usuario, anio, modo='registros'):
+        """Resumen de las 52/53 semanas ISO del año.
+        
+        modo='registros' agrupa los registros financieros del año por semana en
+        una sola consulta; las semanas sin movimientos aparecen en cero.
+        modo='hibrido' toma las semanas cerradas de los reportes guardados con
+        la versión financiera actual y solo consulta en vivo la semana abierta
+        y las semanas sin reporte vigente.
+        En ambos, las semanas en vivo suman los registros archivados del año.
+        modo='reportes' conserva el comportamiento anterior (solo semanas con
+        reporte generado).
+        """
+        if modo == 'reportes':
+            return ServicioFinanzas._resumen_anual_reportes(usuario, anio)
+        
+        total = ServicioFinanzas.semanas_del_anio(anio)
+        inicio_anio, fin_anio = ServicioFinanzas.ventana_fechas(
+            date.fromisocalendar(anio, 1, 1), date.fromisocalendar(anio, total, 7)
+        )
+        
+        if modo == 'hibrido':
+            hoy = timezone.localdate()
+            version, _ = ServicioVersionFinanciera.obtener(usuario.pk)
+            totales = {
+                r['semana']: (dinero.centavos(r['total_ingresos']), dinero.centavos(r['total_gastos']))
+                for r in ReporteFinanciero.objects.filter(
+                    id_usuario=usuario, anio=anio, fecha_fin_semana__lt=hoy, version_registros=version
+                ).values('semana', 'total_ingresos', 'total_gastos')
+            }
+            pendientes = Q()
+            for semana in range(1, total + 1):
+                if semana not in totales:
+                    inicio, fin = ServicioFinanzas.ventana_fechas(
+                        date.fromisocalendar(anio, semana, 1), date.fromisocalendar(anio, semana, 7)
+                    )
+                    pendientes |= Q(fecha__gte=inicio, fecha__lt=fin)
+            cerradas = set(totales)
+            if pendientes:
+                totales.update(ServicioFinanzas.totales_por_semana(usuario, inicio_anio, fin_anio, pendientes))
+        else:
+            cerradas = set()
+            totales = ServicioFinanzas.totales_por_semana(usuario, inicio_anio, fin_anio)
+        if ServicioFinanzas.puede_estar_archivado(inicio_anio):
+            for semana, (ingresos, gastos) in archivo.totales_por_semana(usuario.pk, inicio_anio, fin_anio).items():
+                if semana not in cerradas:
+                    anteriores = totales.get(semana, (0, 0))
+                    totales[semana] = (anteriores[0] + ingresos, anteriores[1] + gastos)
+        
+        # Todo en centavos; float solo en la respuesta
+        reportes_semanales = []
+        for semana in range(1, total + 1):
+            ingresos, gastos = totales.get(semana, (0, 0))
+            fecha_inicio = date.fromisocalendar(anio, semana, 1)
+            reportes_semanales.append({
+                'semana': semana,
+                'fecha_inicio': fecha_inicio.isoformat(),
+                'fecha_fin': (fecha_inicio + timedelta(days=6)).isoformat(),
+                'ingresos': dinero.a_float(ingresos),
+                'gastos': dinero.a_float(gastos),
+                'balance': dinero.a_float(ingresos - gastos)
+            })
+        
+        total_ingresos_anual = sum(ingresos for ingresos, _ in totales.values())
+        total_gastos_anual = sum(gastos for _, gastos in totales.values())
+        return {
+            'anio': anio,
+            'modo': modo,
+            'total_semanas': total,
+            'semanas_con_movimientos': sum(1 for i, g in totales.values() if i or g),
+            'total_ingresos': dinero.a_float(total_ingresos_anual),
+            'total_gastos': dinero.a_float(total_gastos_anual),
+            'balance_total': dinero.a_float(total_ingresos_anual - total_gastos_anual),
+            'reportes_semanales': reportes_semanales
+        }
+    
+    @staticmethod
+    def _resumen_anual_reportes(usuario, anio):
+        """Resumen anual a partir de los reportes ya generados (comportamiento anterior)"""
+        reportes = ReporteFinanciero.objects.filter(
+            id_usuario=usuario,
+            anio=anio
+        ).order_by('semana')
+        
+        total_ingresos_anual = reportes.aggregate(Sum('total_ingresos'))['total_ingresos__sum'] or 0
+        total_gastos_anual = reportes.aggregate(Sum('total_gastos'))['total_gastos__sum'] or 0
+        balance_anual = total_ingresos_anual - total_gastos_anual
+        
+        resumen = {
+            'anio': anio,
+            'total_semanas': reportes.count(),
+            'total_ingresos': float(total_ingresos_anual),
+            'total_gastos': float(total_gastos_anual),
+            'balance_total': float(balance_anual),
+            'reportes_semanales': [
+                {
+                    'semana': r.semana,
+                    'fecha_inicio': r.fecha_inicio_semana.isoformat() if hasattr(r, 'fecha_inicio_semana') else None,
+                    'fecha_fin': r.fecha_fin_semana.isoformat() if hasattr(r, 'fecha_fin_semana') else None,
+                    'ingresos': float(r.total_ingresos),
+                    'gastos': float(r.total_gastos),
+                    'balance': float(r.balance)
+                }
+                for r in reportes
+            ]
+        }
+        
+        return resumen
+    
+    @staticmethod
+    def agrupar_por_semana(registros):
+        """GROUP BY (usuario, año ISO, semana ISO, categoría) con ingresos, gastos y cantidad"""
+        return (
+            registros
+            .annotate(anio_iso=ExtractIsoYear('fecha'), semana_iso=ExtractWeek('fecha'))
+            .values('id_usuario', 'anio_iso', 'semana_iso', 'categoria')
+            .annotate(
+                ingresos=Sum('monto', filter=Q(tipo='ingreso'), default=Decimal('0')),
+                gastos=Sum('monto', filter=Q(tipo='gasto'), default=Decimal('0')),
+                cantidad=Count('id_registro'),
+            )
+            .order_by()
+        )
+    
+    @staticmethod
+    def semanas_en_rango(desde, hasta):
+        """Lista de (semana, anio, fecha_inicio, fecha_fin) de las semanas ISO que tocan el rango"""
+        inicio = desde - timedelta(days=desde.weekday())
+        semanas = []
+        while inicio <= hasta:
+            anio, semana, _ = inicio.isocalendar()
+            semanas.append((semana, anio, inicio, inicio + timedelta(days=6)))
+            inicio += timedelta(weeks=1)
+        return semanas
+    
+    @staticmethod
+    def generar_reportes_lote(usuario_ids, semanas):
+        """Genera los reportes de un lote de usuarios para varias semanas.
+        
+        Una sola consulta agrupada para todo el lote (más los totales de los
+        años archivados), un upsert masivo sobre (id_usuario, semana, anio) y
+        la reescritura de sus filas por categoría.
+        Retorna la cantidad de reportes escritos.
+        """
+        if not usuario_ids or not semanas:
+            return 0
+        
+        versiones = dict(
+            VersionFinanciera.objects.filter(id_usuario_id__in=usuario_ids).values_list('id_usuario_id', 'version')
+        )
+        inicio, fin = ServicioFinanzas.ventana_fechas(semanas[0][2], semanas[-1][3])
+        registros = RegistroFinanciero.objects.filter(
+            id_usuario__in=usuario_ids,
+            fecha__gte=inicio,
+            fecha__lt=fin
+        )
+        
+        totales = {}
+        detalles = {}
+        for fila in ServicioFinanzas.agrupar_por_semana(registros):
+            clave = (fila['id_usuario'], fila['anio_iso'], fila['semana_iso'])
+            ingresos, gastos = totales.get(clave, (0, 0))
+            totales[clave] = (ingresos + dinero.centavos(fila['ingresos']), gastos + dinero.centavos(fila['gastos']))
+            detalles.setdefault(clave, []).append(fila)
+        if ServicioFinanzas.puede_estar_archivado(inicio):
+            # Como en generar_reporte_semanal: los años archivados ya no están en la tabla
+            for clave, archivados in archivo.totales_por_usuario_y_semana(usuario_ids, inicio, fin).items():
+                detalles[clave] = ServicioFinanzas.sumar_archivados(detalles.get(clave, []), archivados)
+                ingresos, gastos = totales.get(clave, (0, 0))
+                totales[clave] = (ingresos + sum(i for i, _ in archivados.values()),
+                                  gastos + sum(g for _, g in archivados.values()))
+        
+        reportes = []
+        for usuario_id in usuario_ids:
+            for semana, anio, fecha_inicio, fecha_fin in semanas:
+                clave = (usuario_id, anio, semana)
+                total_ingresos, total_gastos = totales.get(clave, (0, 0))
+                reportes.append(ReporteFinanciero(
+                    id_usuario_id=usuario_id,
+                    semana=semana,
+                    anio=anio,
+                    total_ingresos=dinero.a_decimal(total_ingresos),
+                    total_gastos=dinero.a_decimal(total_gastos),
+                    balance=dinero.a_decimal(total_ingresos - total_gastos),
+                    fecha_inicio_semana=fecha_inicio,
+                    fecha_fin_semana=fecha_fin,
+                    version_registros=versiones.get(usuario_id, 0)
+                ))
+        
+        with transaction.atomic():
+            # En PostgreSQL el upsert devuelve el id de cada reporte, insertado o actualizado
+            ReporteFinanciero.objects.bulk_create(
+                reportes,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['id_usuario', 'semana', 'anio'],
+                update_fields=['total_ingresos', 'total_gastos', 'balance',
+                               'fecha_inicio_semana', 'fecha_fin_semana', 'version_registros']
+            )
+            ServicioFinanzas.reemplazar_detalles(reportes, {
+                r.pk: detalles.get((r.id_usuario_id, r.anio, r.semana), []) for r in reportes
+            })
+        return len(reportes)
+    
+    @staticmethod
+    def cerrar_semana(hoy=None, tamano_lote=500):
+        """Precalcula los reportes de todos los usuarios activos al cerrar una semana.
+        
+        Genera la semana recién cerrada y la que empieza, ambos con la versión
+        actual de cada usuario, para que las primeras lecturas del lunes ya
+        encuentren su reporte vigente. Retorna la cantidad de reportes escritos.
+        """
+        from usuarios.models import Usuario
+        hoy = hoy or timezone.localdate()
+        lunes = hoy - timedelta(days=hoy.weekday())
+        semanas = ServicioFinanzas.semanas_en_rango(lunes - timedelta(weeks=1), lunes)
+        usuario_ids = list(
+            Usuario.objects.filter(is_active=True).order_by('id_usuario').values_list('id_usuario', flat=True)
+        )
+        total = 0
+        for i in range(0, len(usuario_ids), tamano_lote):
+            total += ServicioFinanzas.generar_reportes_lote(usuario_ids[i:i + tamano_lote], semanas)
+        return total
+    
+    # Mantener compatibilidad con código antiguo (opcional)
+    @staticmethod
+    def generar_reporte_mensual(usuario, mes, anio):
+        """Método legacy - redirige a reporte semanal de la primera semana del mes"""
+        primer_dia_mes = date(anio, mes, 1)
+        semana, anio_iso, _, _ = ServicioFinanzas.obtener_fecha_semana(primer_dia_mes)
+        return ServicioFinanzas.generar_reporte_semanal(usuario, semana, anio_iso)
@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from ..models import RegistroFinanciero, ResumenSemanalCategoria, ArchivoRegistros
+from .. import archivo, dinero, upsert
+from .reportes import ServicioFinanzas
+
+
+class ServicioResumenSemanal:
+    """Mantiene la tabla ResumenSemanalCategoria sincronizada con los registros"""
+    
+    @staticmethod
+    def clave(usuario_id, fecha, categoria, zona=None):
+        """Clave (usuario, año ISO, semana ISO, categoría) de un registro en hora de Lima"""
+        if timezone.is_aware(fecha):
+            fecha = fecha.astimezone(zona or timezone.get_current_timezone())
+        anio, semana, _ = fecha.isocalendar()
+        return (usuario_id, anio, semana, categoria)
+    
+    @staticmethod
+    def _acumular(deltas, valores, signo, zona=None):
+        clave = ServicioResumenSemanal.clave(
+            valores['id_usuario_id'], valores['fecha'], valores['categoria'], zona
+        )
+        # En centavos: un lote de importación acumula miles de montos sin crear Decimals
+        ingresos, gastos, cantidad = deltas.get(clave, (0, 0, 0))
+        monto = dinero.centavos(valores['monto']) * signo
+        if valores['tipo'] == 'ingreso':
+            ingresos += monto
+        else:
+            gastos += monto
+        deltas[clave] = (ingresos, gastos, cantidad + signo)
+    
+    @staticmethod
+    def _aplicar(deltas, tamano_bloque=500):
+        """Aplica los deltas con un upsert que incrementa en la base (upsert.sumar)"""
+        # Orden fijo de claves para evitar bloqueos mutuos entre transacciones
+        filas = [(clave, delta) for clave, delta in sorted(deltas.items()) if any(delta)]
+        if not filas:
+            return
+        upsert.sumar(
+            ResumenSemanalCategoria, ['id_usuario_id', 'anio', 'semana', 'categoria'],
+            ['total_ingresos', 'total_gastos', 'cantidad_registros'],
+            [(*clave, dinero.a_decimal(ingresos), dinero.a_decimal(gastos), cantidad)
+             for clave, (ingresos, gastos, cantidad) in filas],
+            tamano_bloque=tamano_bloque,
+        )
+        
+        # Las filas sin registros se eliminan para que el dashboard lea solo categorías activas
+        if any(delta[2] < 0 for _, delta in filas):
+            ResumenSemanalCategoria.objects.filter(
+                id_usuario_id__in={clave[0] for clave, _ in filas},
+                cantidad_registros__lte=0
+            ).delete()
+    
+    @staticmethod
+    def registrar_cambio(anterior, actual):
+        """Traslada al resumen el cambio de un registro (None = no existía / ya no existe)"""
+        deltas = {}
+        if anterior is not None:
+            ServicioResumenSemanal._acumular(deltas, anterior, -1)
+        if actual is not None:
+            ServicioResumenSemanal._acumular(deltas, actual, 1)
+        with transaction.atomic():
+            ServicioResumenSemanal._aplicar(deltas)
+    
+    @staticmethod
+    def registrar_registros(registros, signo=1):
+        """Suma (o resta con signo=-1) un lote de registros con un solo delta por clave"""
+        deltas = {}
+        zona = timezone.get_current_timezone()
+        for registro in registros:
+            ServicioResumenSemanal._acumular(deltas, registro.valores_resumen(), signo, zona)
+        with transaction.atomic():
+            ServicioResumenSemanal._aplicar(deltas)
+    
+    @staticmethod
+    def calcular_desde_registros(usuario_ids=None):
+        """Agrupa el libro de registros en SQL con la misma forma que la tabla de resúmenes"""
+        registros = RegistroFinanciero.objects.all()
+        if usuario_ids is not None:
+            registros = registros.filter(id_usuario__in=usuario_ids)
+        return ServicioFinanzas.agrupar_por_semana(registros)
+    
+    @staticmethod
+    def excluida(usuario_id, anio, semana, archivadas):
+        """Si la semana toca un año archivado del usuario (archivo.semanas_archivadas)"""
+        clave = anio * 100 + semana
+        return any(p <= clave <= u for p, u in archivadas.get(usuario_id, ()))
+    
+    @staticmethod
+    def reconstruir(usuario_ids=None, tamano_lote=1000):
+        """Borra y vuelve a poblar los resúmenes desde cero. Retorna la cantidad de filas creadas"""
+        archivadas = archivo.semanas_archivadas(usuario_ids)
+        with transaction.atomic():
+            existentes = ResumenSemanalCategoria.objects.all()
+            if usuario_ids is not None:
+                existentes = existentes.filter(id_usuario__in=usuario_ids)
+            existentes.annotate(clave=F('anio') * 100 + F('semana')).exclude(Exists(
+                ArchivoRegistros.objects.filter(id_usuario=OuterRef('id_usuario'), primera_semana__lte=OuterRef('clave'),
+                                                ultima_semana__gte=OuterRef('clave'))
+            )).delete()
+            
+            lote = []
+            total = 0
+            for fila in ServicioResumenSemanal.calcular_desde_registros(usuario_ids).iterator(chunk_size=tamano_lote):
+                if ServicioResumenSemanal.excluida(fila['id_usuario'], fila['anio_iso'], fila['semana_iso'],
+                                                   archivadas):
+                    continue
+                lote.append(ResumenSemanalCategoria(
+                    id_usuario_id=fila['id_usuario'],
+                    anio=fila['anio_iso'],
+                    semana=fila['semana_iso'],
+                    categoria=fila['categoria'],
+                    total_ingresos=fila['ingresos'],
+                    total_gastos=fila['gastos'],
+                    cantidad_registros=fila['cantidad'],
+                ))
+                if len(lote) >= tamano_lote:
+                    ResumenSemanalCategoria.objects.bulk_create(lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                ResumenSemanalCategoria.objects.bulk_create(lote)
+                total += len(lote)
+        return total
+    
+    @staticmethod
+    def verificar(usuario_ids=None):
+        """Compara los resúmenes con el libro y retorna la lista de diferencias encontradas"""
+        esperado = {}
+        for fila in ServicioResumenSemanal.calcular_desde_registros(usuario_ids).iterator():
+            clave = (fila['id_usuario'], fila['anio_iso'], fila['semana_iso'], fila['categoria'])
+            esperado[clave] = (fila['ingresos'], fila['gastos'], fila['cantidad'])
+        
+        resumenes = ResumenSemanalCategoria.objects.all()
+        if usuario_ids is not None:
+            resumenes = resumenes.filter(id_usuario__in=usuario_ids)
+        actual = {
+            (r['id_usuario'], r['anio'], r['semana'], r['categoria']):
+                (r['total_ingresos'], r['total_gastos'], r['cantidad_registros'])
+            for r in resumenes.values('id_usuario', 'anio', 'semana', 'categoria',
+                                      'total_ingresos', 'total_gastos', 'cantidad_registros').iterator()
+        }
+        
+        archivadas = archivo.semanas_archivadas(usuario_ids)
+        diferencias = []
+        for clave in sorted(set(esperado) | set(actual)):
+            if ServicioResumenSemanal.excluida(*clave[:3], archivadas):
+                continue
+            if esperado.get(clave) != actual.get(clave):
+                usuario_id, anio, semana, categoria = clave
+                diferencias.append({
+                    'id_usuario': usuario_id,
+                    'anio': anio,
+                    'semana': semana,
+                    'categoria': categoria,
+                    'esperado': esperado.get(clave),
+                    'actual': actual.get(clave),
+                })
+        return diferencias
@@ -0,0 +1,118 @@
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from datetime import timedelta
+from django.conf import settings
+from minitest.bloqueos import bloqueo_exclusivo, clave_bloqueo
+from ..models import RegistroFinanciero, VersionFinanciera, MetaFinanciera, Eliminacion
+from .. import archivo
+
+
+class ServicioSincronizacion:
+    """Cambios del libro y las metas de un usuario a partir de una marca de agua.
+    
+    Cada escritura toma un número de la secuencia global finanzas_secuencia_cambio
+    (secuencia_cambio de la fila, o de su Eliminacion si se borró). Los números
+    se reparten antes de confirmar, así que uno menor puede hacerse visible
+    después de uno mayor: por eso las escrituras toman un bloqueo advisory
+    compartido por usuario y la marca se lee con el bloqueo exclusivo, que
+    espera a que terminen las transacciones en curso de ese usuario. Todo
+    cambio con número <= marca ya es visible y los siguientes serán mayores.
+    """
+    LIMITE = 1000
+    
+    @staticmethod
+    def nombre_bloqueo(usuario_id):
+        return f'finanzas:sincronizacion:{usuario_id}'
+    
+    @staticmethod
+    def registrar_escritura(usuario_id):
+        """Toma el bloqueo compartido del usuario y retorna un número de cambio nuevo.
+        
+        Llamar dentro de la transacción de la escritura y antes de escribir.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock_shared(%s), nextval('finanzas_secuencia_cambio')",
+                [clave_bloqueo(ServicioSincronizacion.nombre_bloqueo(usuario_id))]
+            )
+            numero = cursor.fetchone()[1]
+        return numero
+    
+    @staticmethod
+    def registrar_eliminacion(usuario_id, modelo, id_objeto):
+        Eliminacion.objects.create(id_usuario_id=usuario_id, modelo=modelo, id_objeto=id_objeto)
+    
+    @staticmethod
+    def marca_actual(usuario_id):
+        """Mayor número de cambio tal que todos los cambios del usuario hasta él están confirmados"""
+        with bloqueo_exclusivo(ServicioSincronizacion.nombre_bloqueo(usuario_id)):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END '
+                               'FROM finanzas_secuencia_cambio')
+                return cursor.fetchone()[0]
+    
+    @staticmethod
+    def cambios(usuario_id, desde=0, limite=LIMITE):
+        """Registros y metas con desde < secuencia_cambio <= marca, más las eliminaciones.
+        
+        Con desde 0 (o anterior a las eliminaciones ya purgadas) se envía todo y
+        completo es True: el cliente debe reemplazar su copia. Cada tipo trae a lo
+        sumo limite filas; si alguno queda truncado la marca retrocede hasta su
+        último cambio, hay_mas es True y el cliente repite con desde=marca.
+        Los registros de años archivados se envían con su secuencia original.
+        """
+        marca = ServicioSincronizacion.marca_actual(usuario_id)
+        purgada = VersionFinanciera.objects.filter(id_usuario_id=usuario_id).values_list(
+            'secuencia_purgada', flat=True
+        ).first() or 0
+        completo = desde <= 0 or desde < purgada
+        if completo:
+            desde = 0
+        
+        rango = {'id_usuario_id': usuario_id, 'secuencia_cambio__gt': desde, 'secuencia_cambio__lte': marca}
+        consultas = {
+            'registros': RegistroFinanciero.objects.filter(**rango),
+            'metas': MetaFinanciera.objects.filter(**rango),
+        }
+        if not completo:
+            consultas['eliminaciones'] = Eliminacion.objects.filter(**rango)
+        
+        lotes = {nombre: list(qs.order_by('secuencia_cambio')[:limite + 1]) for nombre, qs in consultas.items()}
+        archivados = archivo.cambios(usuario_id, desde, marca, limite + 1)
+        if archivados:
+            lotes['registros'] = sorted(lotes['registros'] + archivados,
+                                        key=lambda r: r.secuencia_cambio)[:limite + 1]
+        truncados = [lote[limite - 1].secuencia_cambio for lote in lotes.values() if len(lote) > limite]
+        if truncados:
+            # Los números son únicos: hasta el menor corte, ningún tipo queda con huecos
+            marca = min(truncados)
+            lotes = {nombre: [o for o in lote if o.secuencia_cambio <= marca] for nombre, lote in lotes.items()}
+        
+        eliminaciones = lotes.pop('eliminaciones', [])
+        return {
+            'marca': marca,
+            'completo': completo,
+            'hay_mas': bool(truncados),
+            **lotes,
+            'eliminados': {
+                'registros': [e.id_objeto for e in eliminaciones if e.modelo == 'registro'],
+                'metas': [e.id_objeto for e in eliminaciones if e.modelo == 'meta'],
+            },
+        }
+    
+    @staticmethod
+    def purgar_eliminaciones(dias=None):
+        """Borra las eliminaciones viejas y recuerda por usuario la mayor secuencia purgada"""
+        dias = settings.SINCRONIZACION_RETENCION_DIAS if dias is None else dias
+        viejas = Eliminacion.objects.filter(fecha_eliminacion__lt=timezone.now() - timedelta(days=dias))
+        with transaction.atomic():
+            VersionFinanciera.objects.filter(id_usuario__in=viejas.values('id_usuario')).update(
+                secuencia_purgada=Greatest(F('secuencia_purgada'), Subquery(
+                    viejas.filter(id_usuario=OuterRef('id_usuario'))
+                    .order_by('-secuencia_cambio').values('secuencia_cambio')[:1]
+                ))
+            )
+            borradas, _ = viejas.delete()
+        return borradas
@@ -0,0 +1,142 @@
+"""Simulación Monte Carlo del saldo de un usuario en las próximas semanas.
+
+Cada trayectoria remuestrea con reemplazo (bootstrap) semanas completas del
+historial del usuario: el vector de ingresos y gastos por categoría de una
+semana se toma entero, así se conserva la relación entre categorías dentro de
+la misma semana. Todo el cálculo es matricial (trayectorias x semanas).
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import MetaFinanciera, ResumenSemanalCategoria
+from .proyecciones import ahorro_requerido, participaciones, rango_semanas, semanas_cerradas
+
+
+PREFIJO = 'finanzas:simulacion'
+PERCENTILES = [5, 25, 50, 75, 95]
+MAX_SEMANAS = 156
+MAX_TRAYECTORIAS = 20000
+
+
+def historial_por_categoria(usuario_id, semanas):
+    """(categorías, matriz float64 semanas x categorías de ingresos - gastos) con ceros en semanas vacías"""
+    filas = list(
+        ResumenSemanalCategoria.objects
+        .filter(rango_semanas(semanas), id_usuario_id=usuario_id)
+        .values_list('anio', 'semana', 'categoria', 'total_ingresos', 'total_gastos')
+    )
+    categorias = sorted({f[2] for f in filas})
+    columnas = {categoria: i for i, categoria in enumerate(categorias)}
+    posicion = {clave: i for i, clave in enumerate(semanas)}
+    historial = np.zeros((len(semanas), len(categorias)))
+    for anio, semana, categoria, ingresos, gastos in filas:
+        historial[posicion[(anio, semana)], columnas[categoria]] = ingresos - gastos
+    return categorias, historial
+
+
+def saldo_actual(usuario_id):
+    """Ingresos - gastos acumulados de todo el historial del usuario"""
+    saldo = ResumenSemanalCategoria.objects.filter(id_usuario_id=usuario_id).aggregate(
+        saldo=Sum(F('total_ingresos') - F('total_gastos'))
+    )['saldo']
+    return float(saldo or 0)
+
+
+def simular_trayectorias(flujo_semanal, semanas, trayectorias, rng):
+    """Ahorro acumulado (trayectorias x semanas) remuestreando el flujo neto de semanas históricas"""
+    indices = rng.integers(0, len(flujo_semanal), size=(trayectorias, semanas))
+    return np.cumsum(flujo_semanal[indices], axis=1)
+
+
+def probabilidad_metas(acumulado, monto_actual, monto_objetivo, semanas_restantes):
+    """Probabilidad de que cada meta alcance su objetivo en su plazo.
+
+    El ahorro simulado se reparte entre las metas igual que en la proyección:
+    en proporción al ahorro semanal que cada una requiere. Las metas con plazo
+    más allá del horizonte se evalúan al final del horizonte.
+    """
+    faltante = np.maximum(monto_objetivo - monto_actual, 0.0)
+    requerido = ahorro_requerido(faltante, semanas_restantes)
+    participacion = participaciones(np.zeros(len(faltante), dtype=np.intp), requerido, 1)
+
+    plazo = np.clip(semanas_restantes, 0, acumulado.shape[1]).astype(np.intp)
+    ahorro = np.where(plazo > 0, acumulado[:, np.maximum(plazo - 1, 0)], 0.0)
+    alcanzada = monto_actual + np.maximum(ahorro, 0.0) * participacion >= monto_objetivo
+    return alcanzada.mean(axis=0)
+
+
+def simular(usuario_id, semanas=52, trayectorias=10000, semilla=None, hoy=None):
+    """Bandas de percentiles del saldo y probabilidad de cada meta activa"""
+    hoy = hoy or timezone.localdate()
+    rng = np.random.default_rng(semilla)
+    categorias, historial = historial_por_categoria(usuario_id, semanas_cerradas(hoy))
+    flujo_semanal = historial.sum(axis=1)
+    saldo = saldo_actual(usuario_id)
+
+    metas = list(
+        MetaFinanciera.objects.filter(id_usuario_id=usuario_id, estado='activa')
+        .order_by('fecha_objetivo', 'id_meta')
+        .values_list('id_meta', 'nombre', 'monto_objetivo', 'monto_actual', 'fecha_objetivo')
+    )
+    semanas_restantes = np.array([max(-(-(m[4] - hoy).days // 7), 0) for m in metas], dtype=float)
+    horizonte = int(min(max([semanas, *semanas_restantes]), MAX_SEMANAS))
+
+    acumulado = simular_trayectorias(flujo_semanal, horizonte, trayectorias, rng)
+    bandas = saldo + np.percentile(acumulado[:, :semanas], PERCENTILES, axis=0)
+
+    probabilidades = probabilidad_metas(
+        acumulado,
+        np.array([float(m[3]) for m in metas]),
+        np.array([float(m[2]) for m in metas]),
+        semanas_restantes,
+    ) if metas else []
+
+    lunes = hoy - timedelta(days=hoy.weekday())
+    return {
+        'semanas': semanas,
+        'trayectorias': trayectorias,
+        'saldo_actual': round(saldo, 2),
+        'flujo_semanal_promedio': round(float(flujo_semanal.mean()), 2),
+        'por_categoria': [
+            {'categoria': categoria, 'promedio_semanal': round(float(promedio), 2)}
+            for categoria, promedio in zip(categorias, historial.mean(axis=0))
+        ],
+        'bandas': [
+            {
+                'semana': i + 1,
+                'fecha_fin': (lunes + timedelta(weeks=i, days=6)).isoformat(),
+                **{f'p{p}': round(float(bandas[j, i]), 2) for j, p in enumerate(PERCENTILES)},
+            }
+            for i in range(semanas)
+        ],
+        'metas': [
+            {
+                'id_meta': id_meta,
+                'nombre': nombre,
+                'monto_objetivo': float(objetivo),
+                'fecha_objetivo': fecha_objetivo.isoformat(),
+                'probabilidad': round(float(probabilidad), 4),
+            }
+            for (id_meta, nombre, objetivo, _, fecha_objetivo), probabilidad in zip(metas, probabilidades)
+        ],
+    }
+
+
+def obtener(usuario_id, version, semanas=52, trayectorias=10000):
+    """Simulación en caché por usuario, versión financiera, semana actual y parámetros.
+
+    La semilla depende del usuario y la versión: mientras el libro no cambie,
+    recalcular da exactamente el mismo resultado.
+    """
+    anio, semana, _ = timezone.localdate().isocalendar()
+    clave = f'{PREFIJO}:{usuario_id}:v{version}:{anio}-{semana}:{semanas}:{trayectorias}'
+    datos = cache.get(clave)
+    if datos is None:
+        datos = simular(usuario_id, semanas, trayectorias, semilla=[usuario_id, version])
+        cache.set(clave, datos, timeout=getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+    return datos
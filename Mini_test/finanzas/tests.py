@@ -1,3 +1,1480 @@
-from django.test import TestCase
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from usuarios.models import Usuario
+from . import anomalias, archivo, categorizador, dinero, instantaneas, particiones, proyecciones, simulacion
+from .models import (AnomaliaGasto, AporteMeta, ArchivoRegistros, DetalleReporteCategoria, Eliminacion,
+					 EventoPresupuesto, GastoPresupuesto, MetaFinanciera, PresupuestoCategoria, ProyeccionMeta,
+					 RegistroFinanciero, ReporteFinanciero, ResumenSemanalCategoria, SiguienteCambio)
+from .servicios import (ServicioCacheDashboard, ServicioFinanzas, ServicioPresupuestos, ServicioResumenSemanal,
+					    ServicioSincronizacion, ServicioVersionFinanciera)
+
+
+class ResumenSemanalTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='f@test.com', nombre='Finanzas', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def resumen(self, categoria):
+		semana, anio = timezone.localdate().isocalendar()[1], timezone.localdate().isocalendar()[0]
+		return ResumenSemanalCategoria.objects.get(id_usuario=self.user, anio=anio, semana=semana, categoria=categoria)
+
+	def test_crear_actualizar_y_eliminar_mantienen_resumen(self):
+		resp = self.client.post('/api/finanzas/registros/', {
+			'tipo': 'gasto', 'monto': '25.50', 'categoria': 'alimentacion'
+		}, format='json')
+		self.assertEqual(resp.status_code, 201)
+		resp = self.client.post('/api/finanzas/dashboard/', {
+			'tipo': 'gasto', 'monto': 10, 'categoria': 'alimentacion'
+		}, format='json')
+		self.assertEqual(resp.status_code, 201)
+
+		resumen = self.resumen('alimentacion')
+		self.assertEqual(resumen.total_gastos, Decimal('35.50'))
+		self.assertEqual(resumen.cantidad_registros, 2)
+
+		# Cambiar de categoría mueve el monto entre filas
+		registro_id = resp.data['id_registro']
+		resp = self.client.patch(f'/api/finanzas/registros/{registro_id}/', {'categoria': 'transporte'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(self.resumen('alimentacion').total_gastos, Decimal('25.50'))
+		self.assertEqual(self.resumen('transporte').total_gastos, Decimal('10'))
+
+		resp = self.client.delete(f'/api/finanzas/registros/{registro_id}/')
+		self.assertEqual(resp.status_code, 204)
+		self.assertFalse(ResumenSemanalCategoria.objects.filter(categoria='transporte').exists())
+		self.assertEqual(ServicioResumenSemanal.verificar(), [])
+
+	def test_dashboard_usa_resumen(self):
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='ingreso', monto=Decimal('100'), categoria='salario')
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('30'), categoria='vivienda')
+
+		cache.clear()
+		# versión + resúmenes de la semana + recientes + metas + alertas + presupuestos
+		with self.assertNumQueries(6):
+			resp = self.client.get('/api/finanzas/dashboard/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['total_ingresos'], 100.0)
+		self.assertEqual(resp.data['total_gastos'], 30.0)
+		self.assertEqual(resp.data['balance'], 70.0)
+		self.assertEqual(resp.data['resumen_por_categoria'][0], {'categoria': 'salario', 'total': 100.0})
+
+	def test_reconstruir_y_verificar(self):
+		fecha = timezone.make_aware(datetime(2025, 3, 5, 23, 30))
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('12'), categoria='salud', fecha=fecha)
+		ResumenSemanalCategoria.objects.all().delete()
+
+		self.assertEqual(len(ServicioResumenSemanal.verificar()), 1)
+		call_command('reconstruir_resumenes', stdout=StringIO())
+		call_command('verificar_resumenes', stdout=StringIO())
+		resumen = ResumenSemanalCategoria.objects.get(id_usuario=self.user, categoria='salud')
+		self.assertEqual((resumen.anio, resumen.semana), (2025, 10))
+
+
+class ReportesMasivosTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='r@test.com', nombre='Reportes', password='testpass')
+		self.otro = Usuario.objects.create_user(correo='o@test.com', nombre='Otro', password='testpass')
+
+	def test_comando_coincide_con_reporte_individual(self):
+		for dia, tipo, monto, categoria in [(3, 'ingreso', '500', 'salario'), (4, 'gasto', '40.25', 'alimentacion'),
+											(4, 'gasto', '9.75', 'alimentacion'), (12, 'gasto', '15', 'transporte')]:
+			RegistroFinanciero.objects.create(
+				id_usuario=self.user, tipo=tipo, monto=Decimal(monto), categoria=categoria,
+				fecha=timezone.make_aware(datetime(2025, 3, dia, 10, 0))
+			)
+
+		salida = StringIO()
+		call_command('generar_reportes_semanales', '--desde', '2025-03-03', '--hasta', '2025-03-16', stdout=salida)
+		self.assertIn('4 reportes', salida.getvalue())
+		self.assertIn('reportes/s', salida.getvalue())
+
+		reporte = ReporteFinanciero.objects.get(id_usuario=self.user, anio=2025, semana=10)
+		self.assertEqual(reporte.total_ingresos, Decimal('500'))
+		self.assertEqual(reporte.total_gastos, Decimal('50'))
+		self.assertEqual(reporte.detalle_por_categoria['alimentacion'], {'ingresos': 0.0, 'gastos': 50.0})
+		self.assertEqual(ReporteFinanciero.objects.get(id_usuario=self.otro, anio=2025, semana=11).balance, 0)
+
+		# El comando es idempotente y sobrescribe los reportes existentes
+		individual = ServicioFinanzas.generar_reporte_semanal(self.user, 11, 2025)
+		call_command('generar_reportes_semanales', '--desde', '2025-03-10', '--hasta', '2025-03-10', stdout=StringIO())
+		individual.refresh_from_db()
+		self.assertEqual(individual.total_gastos, Decimal('15'))
+		self.assertEqual(ReporteFinanciero.objects.count(), 4)
+
+
+class VentanaSemanaTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='v@test.com', nombre='Ventanas', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def test_limites_semiabiertos_en_hora_de_lima(self):
+		semana, anio, fecha_inicio, fecha_fin, inicio, fin = ServicioFinanzas.ventana_semana(1, 2025)
+		self.assertEqual((fecha_inicio.isoformat(), fecha_fin.isoformat()), ('2024-12-30', '2025-01-05'))
+		self.assertEqual(timezone.localtime(inicio).isoformat(), '2024-12-30T00:00:00-05:00')
+		self.assertEqual(fin - inicio, timezone.timedelta(days=7))
+
+		# Domingo 23:59 (lunes en UTC) pertenece a la semana; el lunes siguiente 00:00 no
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('5'), categoria='ropa',
+										  fecha=timezone.make_aware(datetime(2025, 1, 5, 23, 59)))
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('7'), categoria='ropa',
+										  fecha=timezone.make_aware(datetime(2025, 1, 6, 0, 0)))
+		reporte = ServicioFinanzas.generar_reporte_semanal(self.user, 1, 2025)
+		self.assertEqual(reporte.total_gastos, Decimal('5'))
+		resp = self.client.get('/api/finanzas/registros/por_semana/', {'semana': 2, 'anio': 2025})
+		self.assertEqual([r['monto'] for r in resp.data], ['7.00'])
+
+	@skipUnlessDBFeature('supports_explaining_query_execution')
+	def test_consultas_semanales_usan_indice(self):
+		# Un año de registros y estadísticas al día: sin ellos el planificador empata índices al azar
+		RegistroFinanciero.objects.bulk_create([
+			RegistroFinanciero(id_usuario=self.user, tipo='gasto', monto=Decimal('1'), categoria='ropa',
+							   fecha=timezone.make_aware(datetime(2025, 1, 1, 12)) + timedelta(days=dia))
+			for dia in range(365)
+		])
+		with connection.cursor() as cursor:
+			cursor.execute('ANALYZE registro_financiero')
+		with CaptureQueriesContext(connection) as consultas:
+			self.client.get('/api/finanzas/registros/por_semana/', {'semana': 10, 'anio': 2025})
+			ServicioFinanzas.generar_reporte_semanal(self.user, 10, 2025)
+			ServicioFinanzas.generar_reportes_lote([self.user.id_usuario], ServicioFinanzas.semanas_en_rango(
+				datetime(2025, 3, 3).date(), datetime(2025, 3, 9).date()))
+
+		semanales = [q['sql'] for q in consultas.captured_queries
+					 if 'FROM "registro_financiero"' in q['sql'] and '"fecha" >=' in q['sql']]
+		# por_semana, el reporte individual (una consulta agrupada) y el lote
+		self.assertGreaterEqual(len(semanales), 3)
+		with connection.cursor() as cursor:
+			# Con una tabla casi vacía el planificador preferiría un seq scan
+			cursor.execute('SET LOCAL enable_seqscan = off')
+			for sql in semanales:
+				self.assertNotIn('::date', sql)
+				cursor.execute('EXPLAIN ' + sql)
+				plan = '\n'.join(fila[0] for fila in cursor.fetchall())
+				self.assertIn('registro_usuario_fecha_idx', plan, plan)
+
+
+class ExportacionTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='e@test.com', nombre='Export', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		for dia, tipo, categoria in [(1, 'ingreso', 'salario'), (2, 'gasto', 'ropa'), (3, 'gasto', 'salud')]:
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo=tipo, monto=Decimal('10.50'), categoria=categoria,
+											  descripcion='café, pan', fecha=timezone.make_aware(datetime(2025, 4, dia, 12, 0)))
+
+	def test_exportar_csv_y_ndjson(self):
+		resp = self.client.get('/api/finanzas/registros/exportar/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertTrue(resp.streaming)
+		lineas = b''.join(resp.streaming_content).decode().splitlines()
+		self.assertEqual(lineas[0], 'id_registro,fecha,tipo,categoria,monto,descripcion')
+		self.assertEqual(len(lineas), 4)
+		self.assertIn('"café, pan"', lineas[1])
+
+		resp = self.client.get('/api/finanzas/registros/exportar/', {
+			'formato': 'ndjson', 'tipo': 'gasto', 'desde': '2025-04-02', 'hasta': '2025-04-02'
+		})
+		filas = [json.loads(l) for l in b''.join(resp.streaming_content).decode().splitlines()]
+		self.assertEqual([(f['categoria'], f['monto']) for f in filas], [('ropa', '10.50')])
+		self.assertEqual(filas[0]['fecha'], '2025-04-02T12:00:00-05:00')
+
+	def test_parametros_invalidos(self):
+		self.assertEqual(self.client.get('/api/finanzas/registros/exportar/', {'formato': 'xml'}).status_code, 400)
+		self.assertEqual(self.client.get('/api/finanzas/registros/exportar/', {'desde': '02/04/2025'}).status_code, 400)
+
+
+class ImportacionTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='i@test.com', nombre='Import', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def test_importar_csv_con_errores_por_fila(self):
+		contenido = (
+			'tipo,monto,categoria,descripcion,fecha\n'
+			'gasto,12.5,alimentacion,menú,2025-05-05T13:00:00\n'
+			'ingreso,1000,salario,,2025-05-05\n'
+			'gasto,-3,ropa,,\n'
+			'otro,5,viaje,,ayer\n'
+		).encode()
+		archivo = SimpleUploadedFile('movimientos.csv', contenido, content_type='text/csv')
+		resp = self.client.post('/api/finanzas/registros/importar/', {'archivo': archivo}, format='multipart')
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual(resp.data['creados'], 2)
+		self.assertEqual(resp.data['total_errores'], 2)
+		self.assertEqual([e['fila'] for e in resp.data['errores']], [4, 5])
+		self.assertEqual(set(resp.data['errores'][1]['errores']), {'tipo', 'categoria', 'fecha'})
+
+		gasto = RegistroFinanciero.objects.get(id_usuario=self.user, tipo='gasto')
+		self.assertEqual(timezone.localtime(gasto.fecha).isoformat(), '2025-05-05T13:00:00-05:00')
+		self.assertEqual(ServicioResumenSemanal.verificar(), [])
+
+	def test_importar_ndjson(self):
+		lineas = [json.dumps({'tipo': 'gasto', 'monto': 3.2, 'categoria': 'transporte'}), '', 'no-json']
+		archivo = SimpleUploadedFile('movimientos.jsonl', '\n'.join(lineas).encode())
+		resp = self.client.post('/api/finanzas/registros/importar/', {'archivo': archivo}, format='multipart')
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual((resp.data['creados'], resp.data['total_errores']), (1, 1))
+		self.assertEqual(RegistroFinanciero.objects.get(id_usuario=self.user).monto, Decimal('3.20'))
+
+
+class PaginacionCursorTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='p@test.com', nombre='Paginas', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		# Varias filas con la misma fecha para ejercitar el desempate por id_registro
+		for i in range(45):
+			RegistroFinanciero.objects.create(
+				id_usuario=self.user, tipo='gasto', monto=Decimal(i + 1), categoria='otro_gasto',
+				fecha=timezone.make_aware(datetime(2025, 6, 1 + i // 4, 12, 0))
+			)
+
+	def test_recorrer_adelante_y_atras_sin_count(self):
+		esperado = list(RegistroFinanciero.objects.filter(id_usuario=self.user).values_list('id_registro', flat=True))
+
+		resp = self.client.get('/api/finanzas/registros/', {'paginacion': 'cursor'})
+		self.assertNotIn('count', resp.data)
+		self.assertIsNone(resp.data['previous'])
+		vistos = [r['id_registro'] for r in resp.data['results']]
+		paginas = [resp.data]
+		while resp.data['next']:
+			# Versión financiera (GET condicional) + la página + los años archivados, sin COUNT(*)
+			with self.assertNumQueries(3):
+				resp = self.client.get(resp.data['next'])
+			paginas.append(resp.data)
+			vistos += [r['id_registro'] for r in resp.data['results']]
+		self.assertEqual(vistos, esperado)
+		self.assertEqual([len(p['results']) for p in paginas], [20, 20, 5])
+
+		resp = self.client.get(paginas[2]['previous'])
+		self.assertEqual(resp.data['results'], paginas[1]['results'])
+		resp = self.client.get(resp.data['previous'])
+		self.assertEqual(resp.data['results'], paginas[0]['results'])
+		self.assertIsNone(resp.data['previous'])
+
+	def test_modo_por_defecto_y_cursor_invalido(self):
+		resp = self.client.get('/api/finanzas/registros/')
+		self.assertEqual(resp.data['count'], 45)
+		self.assertEqual(self.client.get('/api/finanzas/registros/', {'cursor': 'xyz'}).status_code, 404)
+
+
+
+class CacheDashboardTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		ServicioCacheDashboard.reiniciar_estadisticas()
+		self.user = Usuario.objects.create_user(correo='c@test.com', nombre='Cache', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def get_dashboard(self, estado_esperado):
+		resp = self.client.get('/api/finanzas/dashboard/')
+		self.assertEqual(resp['X-Cache'], estado_esperado)
+		return resp.data
+
+	def verificar_sin_datos_viejos(self):
+		self.assertEqual(self.get_dashboard('MISS')['total_gastos'], 0.0)
+		with self.assertNumQueries(1):
+			self.get_dashboard('HIT')
+
+		# Cada camino de escritura invalida la respuesta en caché
+		resp = self.client.post('/api/finanzas/dashboard/', {'tipo': 'gasto', 'monto': 10, 'categoria': 'ropa'}, format='json')
+		self.assertEqual(self.get_dashboard('MISS')['total_gastos'], 10.0)
+		self.client.patch(f"/api/finanzas/registros/{resp.data['id_registro']}/", {'monto': '12'}, format='json')
+		self.assertEqual(self.get_dashboard('MISS')['total_gastos'], 12.0)
+
+		meta = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Laptop', monto_objetivo=Decimal('100'),
+											 fecha_inicio=date(2025, 1, 1), fecha_objetivo=date(2030, 1, 1))
+		self.assertEqual(len(self.get_dashboard('MISS')['metas_activas']), 1)
+		self.get_dashboard('HIT')
+		self.client.post(f'/api/finanzas/metas/{meta.pk}/agregar_monto/', {'monto': 5}, format='json')
+		self.assertEqual(self.get_dashboard('MISS')['metas_activas'][0]['monto_actual'], '5.00')
+
+		# Escritura directa sobre el modelo, como la hace el admin
+		registro = RegistroFinanciero.objects.get(id_usuario=self.user)
+		registro.delete()
+		self.assertEqual(self.get_dashboard('MISS')['total_gastos'], 0.0)
+
+		stats = self.client.get('/api/finanzas/dashboard/estadisticas_cache/')
+		self.assertEqual(stats.status_code, 403)
+		self.assertEqual(ServicioCacheDashboard.estadisticas()['hits'], 2)
+
+	def test_memoria_local(self):
+		self.verificar_sin_datos_viejos()
+
+	def test_cache_en_archivos(self):
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, True)
+		with override_settings(CACHES={'default': {
+			'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio
+		}}):
+			cache.clear()
+			self.verificar_sin_datos_viejos()
+
+	def test_contadores_exactos_con_lectores_simultaneos(self):
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, True)
+		with override_settings(CACHES={'default': {
+			'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directorio
+		}}):
+			ServicioCacheDashboard.obtener(self.user.pk, 2025, 1, dict, version=1)
+
+			def leer():
+				for _ in range(50):
+					ServicioCacheDashboard.obtener(self.user.pk, 2025, 1, dict, version=1)
+
+			hilos = [threading.Thread(target=leer) for _ in range(8)]
+			for hilo in hilos:
+				hilo.start()
+			for hilo in hilos:
+				hilo.join()
+		estadisticas = ServicioCacheDashboard.estadisticas()
+		self.assertEqual((estadisticas['hits'], estadisticas['misses']), (400, 1))
+		self.assertEqual(estadisticas['proceso'], os.getpid())
+
+
+class GetCondicionalTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='etag@test.com', nombre='ETag', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		cache.clear()
+
+	def test_304_sin_cambios_y_200_tras_escritura(self):
+		urls = [
+			'/api/finanzas/dashboard/',
+			'/api/finanzas/registros/',
+			'/api/finanzas/reportes/reporte_semana/',
+			'/api/finanzas/reportes/resumen_anual/?anio=2025',
+		]
+		for url in urls:
+			resp = self.client.get(url)
+			self.assertEqual(resp.status_code, 200, url)
+			etag = resp['ETag']
+			self.assertIn('Last-Modified', resp)
+			self.assertEqual(resp['Cache-Control'], 'private, no-cache')
+
+			# Solo se consulta la versión del usuario, sin agregaciones
+			with self.assertNumQueries(1):
+				resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(resp.status_code, 304, url)
+			self.assertEqual(resp['ETag'], etag)
+
+			resp = self.client.post('/api/finanzas/registros/', {
+				'tipo': 'gasto', 'monto': '5', 'categoria': 'ropa'
+			}, format='json')
+			self.assertEqual(resp.status_code, 201, resp.data)
+			resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(resp.status_code, 200, url)
+			self.assertNotEqual(resp['ETag'], etag)
+
+	def test_etag_distinto_por_parametros(self):
+		a = self.client.get('/api/finanzas/reportes/resumen_anual/?anio=2024')
+		b = self.client.get('/api/finanzas/reportes/resumen_anual/?anio=2025')
+		self.assertNotEqual(a['ETag'], b['ETag'])
+		resp = self.client.get('/api/finanzas/reportes/resumen_anual/?anio=2025', HTTP_IF_NONE_MATCH=a['ETag'])
+		self.assertEqual(resp.status_code, 200)
+
+
+class ResumenAnualTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='anual@test.com', nombre='Anual', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		lima = timezone.get_current_timezone()
+		for fecha, tipo, monto in [
+			(datetime(2020, 1, 1, 10), 'gasto', '10'),      # semana 1 de 2020
+			(datetime(2020, 12, 31, 23, 30), 'ingreso', '100'),  # semana 53 de 2020 (hora Lima)
+			(datetime(2021, 1, 3, 12), 'gasto', '5'),       # todavía semana 53 de 2020
+			(datetime(2021, 1, 4, 0, 30), 'gasto', '7'),    # semana 1 de 2021
+		]:
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo=tipo, monto=Decimal(monto),
+											  categoria='ropa', fecha=timezone.make_aware(fecha, lima))
+
+	def test_desde_registros_una_consulta_con_semanas_en_cero(self):
+		# La agregación y el catálogo de años archivados
+		with self.assertNumQueries(2):
+			resumen = ServicioFinanzas.obtener_resumen_anual(self.user, 2020)
+		self.assertEqual(resumen['total_semanas'], 53)
+		self.assertEqual(len(resumen['reportes_semanales']), 53)
+		self.assertEqual(resumen['semanas_con_movimientos'], 2)
+		semanas = {s['semana']: s for s in resumen['reportes_semanales']}
+		self.assertEqual(semanas[1]['gastos'], 10.0)
+		self.assertEqual(semanas[53]['ingresos'], 100.0)
+		self.assertEqual(semanas[53]['gastos'], 5.0)
+		self.assertEqual(semanas[2]['balance'], 0.0)
+		self.assertEqual(resumen['balance_total'], 85.0)
+
+	def test_hibrido_usa_reportes_de_semanas_cerradas(self):
+		ServicioFinanzas.generar_reporte_semanal(self.user, 1, 2020)
+		# Un reporte guardado se toma tal cual para la semana cerrada
+		ReporteFinanciero.objects.filter(id_usuario=self.user, semana=1, anio=2020).update(total_gastos=Decimal('11'))
+		resumen = ServicioFinanzas.obtener_resumen_anual(self.user, 2020, modo='hibrido')
+		semanas = {s['semana']: s for s in resumen['reportes_semanales']}
+		self.assertEqual(semanas[1]['gastos'], 11.0)
+		self.assertEqual(semanas[53]['ingresos'], 100.0)
+		self.assertEqual(resumen['total_gastos'], 16.0)
+
+	def test_hibrido_ignora_reportes_de_otra_version(self):
+		ServicioFinanzas.generar_reporte_semanal(self.user, 1, 2020)
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('3'), categoria='ropa',
+										  fecha=timezone.make_aware(datetime(2020, 1, 2, 10)))
+		resumen = ServicioFinanzas.obtener_resumen_anual(self.user, 2020, modo='hibrido')
+		self.assertEqual(resumen, ServicioFinanzas.obtener_resumen_anual(self.user, 2020) | {'modo': 'hibrido'})
+		self.assertEqual(resumen['reportes_semanales'][0]['gastos'], 13.0)
+
+	def test_endpoint(self):
+		resp = self.client.get('/api/finanzas/reportes/resumen_anual/', {'anio': 2021})
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['total_semanas'], 52)
+		self.assertEqual(resp.data['total_gastos'], 7.0)
+		resp = self.client.get('/api/finanzas/reportes/resumen_anual/', {'anio': 2021, 'modo': 'otro'})
+		self.assertEqual(resp.status_code, 400)
+
+
+class AgregadosTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='agg@test.com', nombre='Agregados', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		cache.clear()
+		lima = timezone.get_current_timezone()
+		for fecha, tipo, categoria, monto in [
+			(datetime(2025, 1, 31, 22), 'gasto', 'alimentacion', '10'),  # 03:00 UTC del 1 de febrero
+			(datetime(2025, 2, 1, 9), 'gasto', 'ropa', '20'),
+			(datetime(2025, 2, 15, 9), 'ingreso', 'salario', '100'),
+			(datetime(2025, 4, 2, 9), 'gasto', 'alimentacion', '5'),
+		]:
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo=tipo, categoria=categoria,
+											  monto=Decimal(monto), fecha=timezone.make_aware(fecha, lima))
+
+	def get(self, **params):
+		params = {'desde': '2025-01-01', 'hasta': '2025-12-31', **params}
+		return self.client.get('/api/finanzas/registros/agregados/', params)
+
+	def test_mes_en_hora_local(self):
+		resp = self.get(bucket='mes')
+		self.assertEqual(resp.status_code, 200)
+		serie = {p['periodo']: p for p in resp.data['serie']}
+		self.assertEqual(list(serie), ['2025-01-01', '2025-02-01', '2025-04-01'])
+		self.assertEqual(serie['2025-01-01']['gastos'], 10.0)
+		self.assertEqual(serie['2025-02-01']['balance'], 80.0)
+		self.assertEqual(serie['2025-02-01']['cantidad'], 2)
+
+	def test_trimestre_por_categoria_y_cache(self):
+		# Versión, la agregación y el catálogo de años archivados
+		with self.assertNumQueries(3):
+			resp = self.get(bucket='trimestre', group_by='tipo,categoria')
+		self.assertEqual(resp.data['serie'][0], {
+			'periodo': '2025-01-01', 'tipo': 'gasto', 'categoria': 'alimentacion',
+			'ingresos': 0.0, 'gastos': 10.0, 'balance': -10.0, 'cantidad': 1,
+		})
+		self.assertEqual(len(resp.data['serie']), 4)
+		# Segunda llamada: solo la versión, la serie sale de la caché
+		with self.assertNumQueries(1):
+			self.get(bucket='trimestre', group_by='tipo,categoria')
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', categoria='ropa', monto=Decimal('1'),
+										  fecha=timezone.make_aware(datetime(2025, 5, 1, 9)))
+		resp = self.get(bucket='anio')
+		self.assertEqual(resp.data['serie'][0]['gastos'], 36.0)
+
+	def test_parametros_invalidos(self):
+		self.assertEqual(self.get(bucket='hora').status_code, 400)
+		self.assertEqual(self.get(group_by='descripcion').status_code, 400)
+		self.assertEqual(self.get(desde='2026-01-01').status_code, 400)
+		self.assertEqual(self.client.get('/api/finanzas/registros/agregados/').status_code, 400)
+
+
+class ReporteUnicoConcurrenteTest(TransactionTestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='vuelo@test.com', nombre='Vuelo', password='testpass')
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('8'), categoria='ropa')
+
+	def test_50_pedidos_simultaneos_una_sola_agregacion(self):
+		original = ServicioFinanzas.generar_reporte_semanal
+		llamadas = []
+
+		def generar_lento(*args, **kwargs):
+			llamadas.append(args)
+			time.sleep(0.3)
+			return original(*args, **kwargs)
+
+		barrera = threading.Barrier(50)
+		respuestas = []
+
+		def pedir():
+			cliente = APIClient()
+			cliente.force_authenticate(user=self.user)
+			try:
+				barrera.wait()
+				respuestas.append(cliente.get('/api/finanzas/reportes/reporte_semana/'))
+			finally:
+				connections.close_all()
+
+		with mock.patch.object(ServicioFinanzas, 'generar_reporte_semanal', side_effect=generar_lento):
+			hilos = [threading.Thread(target=pedir) for _ in range(50)]
+			for hilo in hilos:
+				hilo.start()
+			for hilo in hilos:
+				hilo.join()
+
+		self.assertEqual(len(llamadas), 1)
+		self.assertEqual([r.status_code for r in respuestas], [200] * 50)
+		self.assertEqual({r.data['id_reporte'] for r in respuestas}, {ReporteFinanciero.objects.get().pk})
+		self.assertTrue(all(r.data['total_gastos'] == '8.00' for r in respuestas))
+
+	def test_reporte_se_regenera_tras_escritura(self):
+		primero = ServicioFinanzas.obtener_reporte_semanal(self.user)
+		with self.assertNumQueries(2):
+			self.assertEqual(ServicioFinanzas.obtener_reporte_semanal(self.user).pk, primero.pk)
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('2'), categoria='ropa')
+		self.assertEqual(ServicioFinanzas.obtener_reporte_semanal(self.user).total_gastos, Decimal('10.00'))
+
+
+class AportesMetaTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='meta@test.com', nombre='Metas', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		self.laptop = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Laptop', monto_objetivo=Decimal('100'),
+													 fecha_inicio=date(2025, 1, 1), fecha_objetivo=date(2030, 1, 1))
+		self.viaje = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Viaje', monto_objetivo=Decimal('500'),
+													fecha_inicio=date(2025, 1, 1), fecha_objetivo=date(2030, 1, 1))
+
+	def test_lote_en_una_transaccion(self):
+		resp = self.client.post('/api/finanzas/metas/aportar/', {'aportes': [
+			{'id_meta': self.laptop.pk, 'monto': '60.00'},
+			{'id_meta': self.viaje.pk, 'monto': '10.50'},
+			{'id_meta': self.laptop.pk, 'monto': '40.00', 'descripcion': 'Gratificación'},
+		]}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.laptop.refresh_from_db()
+		self.viaje.refresh_from_db()
+		self.assertEqual((self.laptop.monto_actual, self.laptop.estado), (Decimal('100.00'), 'completada'))
+		self.assertEqual((self.viaje.monto_actual, self.viaje.estado), (Decimal('10.50'), 'activa'))
+		resp = self.client.get(f'/api/finanzas/metas/{self.laptop.pk}/aportes/')
+		self.assertEqual([a['monto'] for a in resp.data], ['40.00', '60.00'])
+
+	def test_lote_invalido_no_aplica_nada(self):
+		otro = Usuario.objects.create_user(correo='otro@test.com', nombre='Otro', password='x')
+		ajena = MetaFinanciera.objects.create(id_usuario=otro, nombre='Ajena', monto_objetivo=Decimal('10'),
+											  fecha_inicio=date(2025, 1, 1), fecha_objetivo=date(2030, 1, 1))
+		resp = self.client.post('/api/finanzas/metas/aportar/', {'aportes': [
+			{'id_meta': self.laptop.pk, 'monto': '5'}, {'id_meta': ajena.pk, 'monto': '5'},
+		]}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		resp = self.client.post(f'/api/finanzas/metas/{self.laptop.pk}/agregar_monto/', {'monto': '-3'}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.laptop.refresh_from_db()
+		self.assertEqual(self.laptop.monto_actual, Decimal('0'))
+		self.assertFalse(AporteMeta.objects.exists())
+
+	def test_monto_actual_solo_por_aportes(self):
+		resp = self.client.patch(f'/api/finanzas/metas/{self.laptop.pk}/', {'monto_actual': '99'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['monto_actual'], '0.00')
+
+	def test_bajar_objetivo_completa_la_meta(self):
+		self.client.post(f'/api/finanzas/metas/{self.viaje.pk}/agregar_monto/', {'monto': '120'}, format='json')
+		resp = self.client.patch(f'/api/finanzas/metas/{self.viaje.pk}/', {'monto_objetivo': '150'}, format='json')
+		self.assertEqual((resp.data['estado'], resp.data['monto_actual']), ('activa', '120.00'))
+		# La instancia que usa la vista puede estar vieja: el monto se relee de la base
+		MetaFinanciera.objects.filter(pk=self.viaje.pk).update(monto_actual=Decimal('130'))
+		resp = self.client.put(f'/api/finanzas/metas/{self.viaje.pk}/', {
+			'id_usuario': self.user.pk, 'nombre': 'Viaje', 'monto_objetivo': '125', 'monto_actual': '0', 'fecha_inicio': '2025-01-01',
+			'fecha_objetivo': '2030-01-01', 'estado': 'activa',
+		}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual((resp.data['estado'], resp.data['monto_actual']), ('completada', '130.00'))
+
+
+class AportesConcurrentesTest(TransactionTestCase):
+	def test_sin_actualizaciones_perdidas(self):
+		user = Usuario.objects.create_user(correo='carrera@test.com', nombre='Carrera', password='testpass')
+		meta = MetaFinanciera.objects.create(id_usuario=user, nombre='Fondo', monto_objetivo=Decimal('100'),
+											 fecha_inicio=date(2025, 1, 1), fecha_objetivo=date(2030, 1, 1))
+		barrera = threading.Barrier(20)
+		codigos = []
+
+		def aportar():
+			cliente = APIClient()
+			cliente.force_authenticate(user=user)
+			try:
+				barrera.wait()
+				for _ in range(5):
+					codigos.append(cliente.post(f'/api/finanzas/metas/{meta.pk}/agregar_monto/',
+												{'monto': '1.00'}, format='json').status_code)
+			finally:
+				connections.close_all()
+
+		hilos = [threading.Thread(target=aportar) for _ in range(20)]
+		for hilo in hilos:
+			hilo.start()
+		for hilo in hilos:
+			hilo.join()
+
+		meta.refresh_from_db()
+		self.assertEqual(codigos, [200] * 100)
+		self.assertEqual(meta.monto_actual, Decimal('100.00'))
+		self.assertEqual(meta.estado, 'completada')
+		self.assertEqual(AporteMeta.objects.filter(id_meta=meta).count(), 100)
+
+
+class ProyeccionMetasTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='proy@test.com', nombre='Proyección', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def test_proyeccion_vectorizada(self):
+		import numpy as np
+		resultado = proyecciones.proyectar(
+			ritmo_usuario=np.array([100.0, -20.0]),
+			indice_usuario=np.array([0, 0, 1, 0]),
+			faltante=np.array([300.0, 900.0, 50.0, 0.0]),
+			semanas_restantes=np.array([10.0, 10.0, 5.0, 3.0]),
+		)
+		# El usuario 0 necesita 30 + 90 por semana y ahorra 100: se reparte 25 / 75
+		np.testing.assert_allclose(resultado['requerido'], [30, 90, 10, 0])
+		np.testing.assert_allclose(resultado['estimado'], [25, 75, 0, 0])
+		np.testing.assert_array_equal(resultado['semanas_estimadas'], [12, 12, np.inf, 0])
+		np.testing.assert_array_equal(resultado['en_camino'], [False, False, False, True])
+
+	def test_endpoint_desde_balance_semanal(self):
+		hoy = timezone.localdate()
+		lunes = hoy - timedelta(days=hoy.weekday())
+		for semanas_atras in range(1, 27):
+			fecha = timezone.make_aware(datetime.combine(lunes - timedelta(weeks=semanas_atras), datetime.min.time()))
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo='ingreso', monto=Decimal('150'),
+											  categoria='salario', fecha=fecha)
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('50'),
+											  categoria='alimentacion', fecha=fecha)
+		meta = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Bici', monto_objetivo=Decimal('1000'),
+											 fecha_inicio=hoy, fecha_objetivo=hoy + timedelta(weeks=20))
+		MetaFinanciera.objects.create(id_usuario=self.user, nombre='Vieja', monto_objetivo=Decimal('10'),
+									  fecha_inicio=hoy, fecha_objetivo=hoy, estado='completada')
+
+		resp = self.client.get('/api/finanzas/metas/proyecciones/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.data), 1)
+		proyeccion = resp.data[0]
+		self.assertEqual(proyeccion['id_meta'], meta.pk)
+		self.assertEqual(proyeccion['ahorro_semanal_requerido'], '50.00')
+		self.assertEqual(proyeccion['ahorro_semanal_estimado'], '100.00')
+		self.assertEqual(proyeccion['semanas_estimadas'], 10)
+		self.assertEqual(proyeccion['fecha_estimada'], (hoy + timedelta(weeks=10)).isoformat())
+		self.assertTrue(proyeccion['en_camino'])
+		self.assertEqual(ProyeccionMeta.objects.get().semanas_estimadas, 10)
+
+		self.assertEqual(proyecciones.proyectar_todas(), 1)
+
+
+class SimulacionTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = Usuario.objects.create_user(correo='sim@test.com', nombre='Simulación', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		hoy = timezone.localdate()
+		lunes = hoy - timedelta(days=hoy.weekday())
+		# Semanas alternas de +200 y -50: ahorro promedio de 75 por semana
+		for semanas_atras in range(1, 27):
+			fecha = timezone.make_aware(datetime.combine(lunes - timedelta(weeks=semanas_atras), datetime.min.time()))
+			if semanas_atras % 2:
+				RegistroFinanciero.objects.create(id_usuario=self.user, tipo='ingreso', monto=Decimal('200'),
+												  categoria='salario', fecha=fecha)
+			else:
+				RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('50'),
+												  categoria='alimentacion', fecha=fecha)
+		self.facil = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Fácil', monto_objetivo=Decimal('100'),
+												   fecha_inicio=hoy, fecha_objetivo=hoy + timedelta(weeks=30))
+
+	def test_bandas_y_probabilidades(self):
+		resp = self.client.get('/api/finanzas/dashboard/simulacion/?semanas=20&trayectorias=2000')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.data['bandas']), 20)
+		self.assertEqual(resp.data['saldo_actual'], 1950.0)
+		self.assertEqual(resp.data['flujo_semanal_promedio'], 75.0)
+		for banda in resp.data['bandas']:
+			self.assertLessEqual(banda['p5'], banda['p50'])
+			self.assertLessEqual(banda['p50'], banda['p95'])
+		self.assertEqual([m['id_meta'] for m in resp.data['metas']], [self.facil.pk])
+		self.assertGreater(resp.data['metas'][0]['probabilidad'], 0.95)
+
+		# El ahorro se reparte según lo que requiere cada meta: la imposible se lleva casi todo y no llega
+		hoy = timezone.localdate()
+		imposible = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Imposible',
+												  monto_objetivo=Decimal('100000'), fecha_inicio=hoy,
+												  fecha_objetivo=hoy + timedelta(weeks=10))
+		resultado = simulacion.simular(self.user.pk, semanas=20, trayectorias=2000, semilla=0)
+		probabilidades = {m['id_meta']: m['probabilidad'] for m in resultado['metas']}
+		self.assertEqual(probabilidades[imposible.pk], 0.0)
+		self.assertLess(probabilidades[self.facil.pk], 0.5)
+
+		self.assertEqual(self.client.get('/api/finanzas/dashboard/simulacion/?semanas=0').status_code, 400)
+		self.assertEqual(self.client.get('/api/finanzas/dashboard/simulacion/?trayectorias=x').status_code, 400)
+
+	def test_cache_por_version(self):
+		url = '/api/finanzas/dashboard/simulacion/?trayectorias=500'
+		primera = self.client.get(url)
+		# Misma versión: se sirve de la caché (solo se consulta la versión)
+		with self.assertNumQueries(1):
+			self.assertEqual(self.client.get(url).data, primera.data)
+		self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+		RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('10'),
+										  categoria='ropa', fecha=timezone.now())
+		segunda = self.client.get(url)
+		self.assertNotEqual(segunda['ETag'], primera['ETag'])
+		self.assertEqual(segunda.data['saldo_actual'], 1940.0)
+
+	def test_nucleo_vectorizado(self):
+		import numpy as np
+		rng = np.random.default_rng(0)
+		flujo = rng.normal(50, 100, 26)
+		simulacion.simular_trayectorias(flujo, 52, 10000, rng)
+		inicio = time.perf_counter()
+		acumulado = simulacion.simular_trayectorias(flujo, 52, 10000, rng)
+		np.percentile(acumulado, simulacion.PERCENTILES, axis=0)
+		self.assertEqual(acumulado.shape, (10000, 52))
+		# Referencia local ~30 ms; margen amplio para máquinas lentas
+		self.assertLess(time.perf_counter() - inicio, 0.5)
+
+
+class AnomaliasGastoTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, True)
+		ajuste = override_settings(INSTANTANEAS_RUTA=directorio)
+		ajuste.enable()
+		self.addCleanup(ajuste.disable)
+		self.user = Usuario.objects.create_user(correo='anom@test.com', nombre='Anomalías', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		hoy = timezone.localdate()
+		self.lunes = hoy - timedelta(days=hoy.weekday())
+		for semanas_atras in range(2, 21):
+			self.gasto('alimentacion', '50', semanas_atras)
+		self.inusual = self.gasto('alimentacion', '500', 1)
+		# 4 compras pequeñas por semana en las últimas 3 semanas cerradas
+		for semanas_atras in range(1, 4):
+			for _ in range(4):
+				self.gasto('transporte', '3.50', semanas_atras)
+
+	def gasto(self, categoria, monto, semanas_atras):
+		fecha = timezone.make_aware(datetime.combine(self.lunes - timedelta(weeks=semanas_atras), datetime.min.time()))
+		return RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal(monto),
+												 categoria=categoria, fecha=fecha + timedelta(hours=12))
+
+	def test_z_robusto_con_mediana_movil(self):
+		import numpy as np
+		serie = np.array([[10, 12, 11, 10, 13, 40, 11], [5, 5, 5, 5, 5, 5, 5]], dtype=float)
+		mediana, z = anomalias.z_movil(serie, 4)
+		np.testing.assert_allclose(mediana, [[10.5, 11.5, 12], [5, 5, 5]])
+		self.assertGreater(z[0, 1], anomalias.UMBRAL_Z)
+		self.assertLess(z[0, 0], anomalias.UMBRAL_Z)
+		# Sin dispersión no hay división por cero ni anomalías
+		np.testing.assert_array_equal(z[1], [0, 0, 0])
+
+	def test_detecta_gasto_semana_y_hormiga(self):
+		self.assertEqual(self.client.get('/api/finanzas/dashboard/anomalias/').data, [])
+		anomalias.detectar_usuarios([self.user.pk])
+		resp = self.client.get('/api/finanzas/dashboard/anomalias/')
+		self.assertEqual(resp.status_code, 200)
+		# Las semanas regulares y el primer gasto de cada categoría no son anomalías
+		self.assertEqual({(a['tipo'], a['categoria']) for a in resp.data},
+						 {('registro', 'alimentacion'), ('semana', 'alimentacion'), ('hormiga', 'transporte')})
+
+		registro = next(a for a in resp.data if a['tipo'] == 'registro')
+		self.assertEqual(registro['id_registro'], self.inusual.pk)
+		self.assertEqual(registro['referencia'], '50.00')
+		hormiga = next(a for a in resp.data if a['tipo'] == 'hormiga')
+		self.assertEqual((hormiga['cantidad'], hormiga['monto']), (12, '42.00'))
+
+		# El dashboard solo lee la tabla
+		self.assertEqual(len(self.client.get('/api/finanzas/dashboard/').data['alertas_gasto']), 3)
+
+	def test_get_no_escribe_y_deteccion_invalida_dashboard(self):
+		with CaptureQueriesContext(connection) as consultas:
+			self.client.get('/api/finanzas/dashboard/anomalias/')
+		self.assertFalse([c for c in consultas.captured_queries if not c['sql'].startswith('SELECT')])
+		self.assertEqual(self.client.get('/api/finanzas/dashboard/').data['alertas_gasto'], [])
+
+		version, _ = ServicioVersionFinanciera.obtener(self.user.pk)
+		anomalias.detectar_usuarios([self.user.pk])
+		self.assertEqual(ServicioVersionFinanciera.obtener(self.user.pk)[0], version + 1)
+		self.assertEqual(len(self.client.get('/api/finanzas/dashboard/').data['alertas_gasto']), 3)
+		# Sin cambios en las anomalías la versión (y la caché) se conserva
+		anomalias.detectar_usuarios([self.user.pk])
+		self.assertEqual(ServicioVersionFinanciera.obtener(self.user.pk)[0], version + 1)
+
+		RegistroFinanciero.objects.filter(id_usuario=self.user).delete()
+		version, _ = ServicioVersionFinanciera.obtener(self.user.pk)
+		anomalias.detectar_todas()
+		self.assertEqual(ServicioVersionFinanciera.obtener(self.user.pk)[0], version + 1)
+		self.assertEqual(self.client.get('/api/finanzas/dashboard/').data['alertas_gasto'], [])
+
+	def test_recalculo_reemplaza_anomalias(self):
+		anomalias.detectar_usuarios([self.user.pk])
+		self.inusual.delete()
+		self.assertFalse(AnomaliaGasto.objects.filter(tipo='registro').exists())
+
+		salida = StringIO()
+		call_command('detectar_anomalias', '--lote', '10', stdout=salida)
+		self.assertIn('anomalías detectadas', salida.getvalue())
+		self.assertFalse(AnomaliaGasto.objects.filter(categoria='alimentacion').exists())
+		self.assertTrue(AnomaliaGasto.objects.filter(tipo='hormiga').exists())
+
+
+class CategorizadorTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='cat@test.com', nombre='Categorías', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		ejemplos = [
+			('gasto', 'alimentacion', ['almuerzo menú', 'mercado verduras', 'pollo a la brasa', 'café y pan']),
+			('gasto', 'transporte', ['taxi al centro', 'pasaje bus', 'combi trabajo', 'gasolina']),
+			('gasto', 'servicios', ['recibo de luz', 'internet casa', 'agua sedapal', 'plan celular']),
+			('ingreso', 'salario', ['sueldo quincena', 'pago planilla', 'sueldo del mes', 'remuneración']),
+		]
+		registros = [
+			RegistroFinanciero(id_usuario=self.user, tipo=tipo, monto=Decimal('20'), categoria=categoria,
+							   descripcion=descripcion)
+			for tipo, categoria, descripciones in ejemplos for descripcion in descripciones * 10
+		]
+		RegistroFinanciero.objects.bulk_create(registros)
+		ServicioResumenSemanal.registrar_registros(registros)
+
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, True)
+		self.ruta = f'{directorio}/categorizador.npz'
+		ajuste = override_settings(CATEGORIZADOR_RUTA=self.ruta)
+		ajuste.enable()
+		self.addCleanup(ajuste.disable)
+
+	def entrenar(self):
+		salida = StringIO()
+		call_command('entrenar_categorizador', '--salida', self.ruta, stdout=salida)
+		return salida.getvalue()
+
+	def test_entrena_y_sugiere(self):
+		resp = self.client.get('/api/finanzas/registros/sugerir_categoria/', {'descripcion': 'almuerzo'})
+		self.assertEqual(resp.status_code, 503)
+
+		self.assertIn('Precisión en', self.entrenar())
+		resp = self.client.get('/api/finanzas/registros/sugerir_categoria/',
+							   {'descripcion': 'Almuerzo en el mercado', 'monto': '15'})
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['categoria'], 'alimentacion')
+		self.assertGreater(resp.data['probabilidad'], 0.5)
+		self.assertEqual(resp.data['alternativas'][0]['categoria'], 'alimentacion')
+		# Un ingreso nunca recibe una categoría de gasto
+		resp = self.client.get('/api/finanzas/registros/sugerir_categoria/',
+							   {'descripcion': 'taxi', 'tipo': 'ingreso'})
+		self.assertIn(resp.data['categoria'], categorizador.CATEGORIAS_POR_TIPO['ingreso'])
+
+		modelo = categorizador.obtener()
+		self.assertIs(categorizador.obtener(), modelo)  # se carga una sola vez por proceso
+		predichas = modelo.predecir_lote(['pasaje en bus', 'recibo luz', 'sueldo'], ['gasto', 'gasto', 'ingreso'],
+										 [2, 80, 1500])
+		self.assertEqual([c for c, _ in predichas], ['transporte', 'servicios', 'salario'])
+
+	def test_completa_categoria_al_crear_e_importar(self):
+		resp = self.client.post('/api/finanzas/registros/', {'tipo': 'gasto', 'monto': '9.50',
+															 'descripcion': 'taxi'}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('categoria', resp.data)
+
+		self.entrenar()
+		resp = self.client.post('/api/finanzas/registros/', {'tipo': 'gasto', 'monto': '9.50',
+															 'descripcion': 'taxi a casa'}, format='json')
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual(resp.data['categoria'], 'transporte')
+		resp = self.client.post('/api/finanzas/dashboard/', {'tipo': 'gasto', 'monto': 30,
+															 'descripcion': 'recibo de agua'}, format='json')
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual(resp.data['categoria'], 'servicios')
+		self.assertEqual(RegistroFinanciero.objects.get(pk=resp.data['id_registro']).categoria, 'servicios')
+		resp = self.client.post('/api/finanzas/dashboard/', {'tipo': 'gasto', 'descripcion': 'agua'}, format='json')
+		self.assertEqual(resp.data, {'error': 'Se requieren: tipo, monto'})
+		resp = self.client.post('/api/finanzas/dashboard/', {'tipo': 'gasto', 'monto': 30}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.assertIn('categoria', resp.data['error'])
+
+		contenido = (
+			'tipo,monto,categoria,descripcion\n'
+			'gasto,12,,menú del día\n'
+			'gasto,5,ropa,pasaje\n'
+			'gasto,5,,\n'
+		).encode()
+		archivo = SimpleUploadedFile('movimientos.csv', contenido, content_type='text/csv')
+		resp = self.client.post('/api/finanzas/registros/importar/', {'archivo': archivo}, format='multipart')
+		self.assertEqual((resp.data['creados'], resp.data['categorias_sugeridas'], resp.data['total_errores']),
+						 (2, 1, 1))
+		self.assertTrue(RegistroFinanciero.objects.filter(descripcion='menú del día', categoria='alimentacion').exists())
+		# La categoría explícita no se reemplaza
+		self.assertTrue(RegistroFinanciero.objects.filter(descripcion='pasaje', categoria='ropa').exists())
+		self.assertEqual(ServicioResumenSemanal.verificar(), [])
+
+
+class DetalleReporteTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='det@test.com', nombre='Detalle', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		for dia, tipo, monto, categoria in [(3, 'gasto', '40', 'alimentacion'), (4, 'gasto', '10', 'alimentacion'),
+											(5, 'ingreso', '300', 'salario'), (11, 'gasto', '25', 'alimentacion'),
+											(12, 'gasto', '8', 'transporte')]:
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo=tipo, monto=Decimal(monto),
+											  categoria=categoria, fecha=timezone.make_aware(datetime(2025, 3, dia, 10)))
+
+	def test_filas_por_categoria_y_json_compatible(self):
+		reporte = ServicioFinanzas.generar_reporte_semanal(self.user, 10, 2025)
+		ServicioFinanzas.generar_reportes_lote([self.user.pk], ServicioFinanzas.semanas_en_rango(date(2025, 3, 10),
+																								 date(2025, 3, 10)))
+		self.assertEqual(
+			set(DetalleReporteCategoria.objects.values_list('semana', 'categoria', 'gastos')),
+			{(10, 'alimentacion', Decimal('50.00')), (10, 'salario', Decimal('0.00')),
+			 (11, 'alimentacion', Decimal('25.00')), (11, 'transporte', Decimal('8.00'))}
+		)
+
+		# Regenerar reemplaza las filas en vez de duplicarlas
+		RegistroFinanciero.objects.filter(categoria='salario').delete()
+		ServicioFinanzas.generar_reporte_semanal(self.user, 10, 2025)
+		self.assertEqual(list(reporte.detalles.values_list('categoria', flat=True)), ['alimentacion'])
+
+		# La lista de reportes conserva detalle_por_categoria con un prefetch (conteo + página + detalles)
+		with self.assertNumQueries(3):
+			resp = self.client.get('/api/finanzas/reportes/')
+		detalle = {r['semana']: r['detalle_por_categoria'] for r in resp.data['results']}
+		self.assertEqual(detalle[11], {'alimentacion': {'ingresos': 0.0, 'gastos': 25.0},
+									   'transporte': {'ingresos': 0.0, 'gastos': 8.0}})
+
+	def test_tendencia_por_categoria(self):
+		ServicioFinanzas.generar_reportes_lote([self.user.pk], ServicioFinanzas.semanas_en_rango(date(2025, 3, 3),
+																								 date(2025, 3, 16)))
+		with self.assertNumQueries(1):
+			tendencia = ServicioFinanzas.tendencia_categoria(self.user, 2025, 'alimentacion')
+		self.assertEqual(tendencia['total_gastos'], 75.0)
+		self.assertEqual([s['semana'] for s in tendencia['semanas']], [10, 11])
+
+		resp = self.client.get('/api/finanzas/reportes/tendencia_categoria/', {'anio': 2025})
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['categorias'][0], {'categoria': 'alimentacion', 'ingresos': 0.0,
+													  'gastos': 75.0, 'semanas': 2})
+		resp = self.client.get('/api/finanzas/reportes/tendencia_categoria/', {'categoria': 'viajes'})
+		self.assertEqual(resp.status_code, 400)
+
+
+class SincronizacionTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='sync@test.com', nombre='Sync', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def registro(self, monto='10', usuario=None):
+		return RegistroFinanciero.objects.create(id_usuario=usuario or self.user, tipo='gasto', monto=Decimal(monto),
+												 categoria='ropa')
+
+	def sincronizar(self, **params):
+		resp = self.client.get('/api/finanzas/sincronizar/', params)
+		self.assertEqual(resp.status_code, 200)
+		return resp.data
+
+	def test_delta_con_modificaciones_y_eliminaciones(self):
+		primero = self.registro()
+		meta = MetaFinanciera.objects.create(id_usuario=self.user, nombre='Fondo', monto_objetivo=Decimal('100'),
+											 fecha_inicio=date(2025, 1, 1), fecha_objetivo=date(2030, 1, 1))
+		inicial = self.sincronizar()
+		self.assertTrue(inicial['completo'])
+		self.assertEqual([r['id_registro'] for r in inicial['registros']], [primero.pk])
+		self.assertEqual([m['id_meta'] for m in inicial['metas']], [meta.pk])
+
+		self.client.patch(f'/api/finanzas/registros/{primero.pk}/', {'monto': '12.00'}, format='json')
+		segundo = self.registro()
+		efimero = self.registro()
+		id_efimero = efimero.pk
+		efimero.delete()
+		self.client.post(f'/api/finanzas/metas/{meta.pk}/agregar_monto/', {'monto': '5'}, format='json')
+		self.registro(usuario=Usuario.objects.create_user(correo='ajeno@test.com', nombre='Ajeno', password='x'))
+
+		delta = self.sincronizar(desde=inicial['marca'])
+		self.assertFalse(delta['completo'])
+		self.assertFalse(delta['hay_mas'])
+		self.assertEqual([(r['id_registro'], r['monto']) for r in delta['registros']],
+						 [(primero.pk, '12.00'), (segundo.pk, '10.00')])
+		self.assertEqual([m['monto_actual'] for m in delta['metas']], ['5.00'])
+		self.assertEqual(delta['eliminados'], {'registros': [id_efimero], 'metas': []})
+
+		id_meta = meta.pk
+		meta.delete()
+		delta = self.sincronizar(desde=delta['marca'])
+		self.assertEqual((delta['registros'], delta['metas']), ([], []))
+		self.assertEqual(delta['eliminados'], {'registros': [], 'metas': [id_meta]})
+		self.assertEqual(self.sincronizar(desde=delta['marca'])['marca'], delta['marca'])
+
+	def test_paginas_purga_y_parametros(self):
+		ids = {self.registro(monto=str(i + 1)).pk for i in range(5)}
+		marca, vistos, paginas = 0, [], 0
+		while True:
+			pagina = self.sincronizar(desde=marca, limite=2)
+			vistos += [r['id_registro'] for r in pagina['registros']]
+			marca, paginas = pagina['marca'], paginas + 1
+			if not pagina['hay_mas']:
+				break
+		self.assertEqual((sorted(vistos), paginas), (sorted(ids), 3))
+
+		# Con una marca anterior a eliminaciones ya purgadas hay que descargar todo de nuevo
+		RegistroFinanciero.objects.get(pk=min(ids)).delete()
+		Eliminacion.objects.update(fecha_eliminacion=timezone.now() - timedelta(days=400))
+		self.assertEqual(ServicioSincronizacion.purgar_eliminaciones(dias=90), 1)
+		pagina = self.sincronizar(desde=marca)
+		self.assertTrue(pagina['completo'])
+		self.assertEqual(len(pagina['registros']), 4)
+
+		for params in ({'desde': 'x'}, {'desde': -1}, {'limite': 0}):
+			self.assertEqual(self.client.get('/api/finanzas/sincronizar/', params).status_code, 400)
+
+
+class SincronizacionConcurrenteTest(TransactionTestCase):
+	def test_marca_espera_escrituras_en_curso(self):
+		user = Usuario.objects.create_user(correo='marca@test.com', nombre='Marca', password='testpass')
+		creado = threading.Event()
+		registros = []
+
+		def escribir():
+			try:
+				with transaction.atomic():
+					registros.append(RegistroFinanciero.objects.create(id_usuario=user, tipo='gasto',
+																	   monto=Decimal('3'), categoria='ropa'))
+					creado.set()
+					time.sleep(0.5)
+			finally:
+				connections.close_all()
+
+		hilo = threading.Thread(target=escribir)
+		hilo.start()
+		creado.wait()
+		# Sin el bloqueo la marca ya cubriría el número del registro aún no confirmado
+		cambios = ServicioSincronizacion.cambios(user.pk)
+		hilo.join()
+		self.assertEqual([r.pk for r in cambios['registros']], [registros[0].pk])
+		self.assertGreaterEqual(cambios['marca'], registros[0].secuencia_cambio)
+
+
+class ParticionesRegistrosTest(TestCase):
+	def setUp(self):
+		if not particiones.esta_particionada():
+			self.skipTest('registro_financiero solo se particiona en PostgreSQL')
+		self.user = Usuario.objects.create_user(correo='part@test.com', nombre='Particiones', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		for dia in (3, 5, 12):
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('4'), categoria='ropa',
+											  fecha=timezone.make_aware(datetime(2025, 3, dia, 9)))
+
+	def test_consulta_semanal_lee_una_sola_particion(self):
+		# Los registros de 2025 estaban en default y pasan a su partición
+		self.assertEqual(particiones.crear_particion(2025), 3)
+		with CaptureQueriesContext(connection) as consultas:
+			resp = self.client.get('/api/finanzas/registros/por_semana/', {'semana': 10, 'anio': 2025})
+		self.assertEqual(len(resp.data), 2)
+		sql, = [q['sql'] for q in consultas.captured_queries
+				if 'FROM "registro_financiero"' in q['sql'] and '"fecha" >=' in q['sql']]
+		with connection.cursor() as cursor:
+			cursor.execute('EXPLAIN ' + sql)
+			plan = '\n'.join(fila[0] for fila in cursor.fetchall())
+		self.assertEqual(set(re.findall(r' on (registro_financiero_\w+)', plan)), {'registro_financiero_2025'}, plan)
+
+	def test_id_registro_repetido_se_detecta(self):
+		# La clave primaria (id_registro, fecha) admite el mismo id en otro año: lo vigila ids_repetidos
+		self.assertEqual(particiones.ids_repetidos(), [])
+		call_command('particiones_registros', 'verificar', stdout=StringIO())
+		original = RegistroFinanciero.objects.earliest('fecha')
+		RegistroFinanciero.objects.bulk_create([
+			RegistroFinanciero(id_registro=original.pk, id_usuario=self.user, tipo='gasto', monto=Decimal('1'),
+							   categoria='ropa', fecha=timezone.make_aware(datetime(2024, 3, 3, 9)))
+		])
+		self.assertEqual(particiones.ids_repetidos(), [original.pk])
+		with self.assertRaises(CommandError):
+			call_command('particiones_registros', 'verificar', stdout=StringIO())
+
+	def test_asegurar_crea_el_anio_actual_y_el_siguiente(self):
+		self.assertEqual(particiones.asegurar(hoy=date(2030, 12, 1)), [2030, 2031])
+		self.assertEqual(particiones.asegurar(hoy=date(2030, 12, 1)), [])
+		self.assertEqual([p['anio'] for p in particiones.particiones()][-3:], [2030, 2031, None])
+
+
+class ArchivoRegistrosTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='arch@test.com', nombre='Archivo', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+		lima = timezone.get_current_timezone()
+		for fecha, tipo, categoria, monto, descripcion in [
+			(datetime(2020, 1, 1, 10), 'gasto', 'alimentacion', '10.25', 'café, pan'),
+			(datetime(2020, 3, 2, 9), 'ingreso', 'salario', '1500', 'sueldo'),
+			(datetime(2020, 3, 2, 9), 'gasto', 'alimentacion', '4.10', 'café, pan'),
+			(datetime(2020, 12, 31, 23, 30), 'gasto', 'ropa', '80', ''),
+			(datetime(2021, 1, 2, 12), 'gasto', 'ropa', '7', 'medias'),   # semana 53 de 2020, año 2021
+		]:
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo=tipo, monto=Decimal(monto), categoria=categoria,
+											  descripcion=descripcion, fecha=timezone.make_aware(fecha, lima))
+
+		self.directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.directorio, True)
+		ajuste = override_settings(ARCHIVO_REGISTROS_RUTA=self.directorio)
+		ajuste.enable()
+		self.addCleanup(ajuste.disable)
+
+	def exportar(self):
+		return b''.join(self.client.get('/api/finanzas/registros/exportar/').streaming_content).decode()
+
+	def archivos(self):
+		return [n for _, _, nombres in os.walk(self.directorio) for n in nombres]
+
+	def test_archivar_y_leer_sin_cambios(self):
+		resumen = ServicioFinanzas.obtener_resumen_anual(self.user, 2020)
+		exportado = self.exportar()
+		reporte = ServicioFinanzas.generar_reporte_semanal(self.user, 10, 2020)
+
+		self.assertEqual(archivo.archivar([2020]), {2020: (4, ArchivoRegistros.objects.get().bytes)})
+		self.assertEqual(RegistroFinanciero.objects.filter(id_usuario=self.user).count(), 1)
+		catalogo = ArchivoRegistros.objects.get(id_usuario=self.user, anio=2020)
+		self.assertEqual((catalogo.cantidad, catalogo.total_ingresos, catalogo.total_gastos),
+						 (4, Decimal('1500.00'), Decimal('94.35')))
+		self.assertEqual((catalogo.primera_semana, catalogo.ultima_semana), (202001, 202053))
+
+		self.assertEqual(ServicioFinanzas.obtener_resumen_anual(self.user, 2020), resumen)
+		self.assertEqual(ServicioFinanzas.obtener_resumen_anual(self.user, 2020, modo='hibrido'), resumen | {'modo': 'hibrido'})
+		self.assertEqual(self.exportar(), exportado)
+		regenerado = ServicioFinanzas.generar_reporte_semanal(self.user, 10, 2020)
+		self.assertEqual((regenerado.total_ingresos, regenerado.total_gastos), (reporte.total_ingresos, reporte.total_gastos))
+		self.assertEqual(regenerado.detalles.count(), 2)
+		# Los resúmenes se conservan y sus semanas no se comparan con la tabla
+		self.assertEqual(ServicioResumenSemanal.verificar(), [])
+		ServicioResumenSemanal.reconstruir()
+		self.assertTrue(ResumenSemanalCategoria.objects.filter(id_usuario=self.user, anio=2020, semana=10).exists())
+
+	def test_listados_y_agregados_leen_archivados(self):
+		def leer():
+			return (
+				self.client.get('/api/finanzas/registros/por_semana/', {'semana': 10, 'anio': 2020}).json(),
+				self.client.get('/api/finanzas/registros/por_categoria/', {'categoria': 'ropa'}).json(),
+				self.client.get('/api/finanzas/registros/agregados/',
+								{'desde': '2020-01-01', 'hasta': '2021-01-31', 'bucket': 'mes',
+								 'group_by': 'tipo,categoria'}).json(),
+			)
+
+		antes = leer()
+		self.assertEqual(len(antes[0]), 2)
+		self.assertNotIn('X-Anios-Archivados', self.client.get('/api/finanzas/registros/'))
+		archivo.archivar([2020])
+		self.assertEqual(leer(), antes)
+		respuesta = self.client.get('/api/finanzas/registros/')
+		self.assertEqual(respuesta['X-Anios-Archivados'], '2020')
+
+	def test_reportes_por_lote_leen_archivados(self):
+		semanas = ServicioFinanzas.semanas_en_rango(date(2020, 3, 2), date(2020, 3, 8)) + \
+			ServicioFinanzas.semanas_en_rango(date(2020, 12, 28), date(2021, 1, 3))
+
+		def reportes():
+			ServicioFinanzas.generar_reportes_lote([self.user.pk], semanas)
+			return {
+				(r.anio, r.semana): (r.total_ingresos, r.total_gastos,
+									 sorted((d.categoria, d.ingresos, d.gastos) for d in r.detalles.all()))
+				for r in ReporteFinanciero.objects.filter(id_usuario=self.user).prefetch_related('detalles')
+			}
+
+		antes = reportes()
+		self.assertEqual(antes[(2020, 53)][:2], (Decimal('0.00'), Decimal('87.00')))
+		archivo.archivar([2020])
+		self.assertEqual(reportes(), antes)
+
+	def test_registro_tardio_y_restaurar(self):
+		originales = {r.pk: r.fecha_creacion for r in RegistroFinanciero.objects.filter(fecha__year=2020)}
+		archivo.archivar([2020])
+		tardio = RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('3'),
+												   categoria='salud', fecha=timezone.make_aware(datetime(2020, 6, 1, 12)))
+		self.assertEqual(ServicioFinanzas.obtener_resumen_anual(self.user, 2020)['total_gastos'], 104.35)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			archivo.archivar([2020])
+		self.assertEqual(ArchivoRegistros.objects.get().cantidad, 5)
+		self.assertEqual(len(self.archivos()), 1)
+		self.assertEqual(ServicioFinanzas.obtener_resumen_anual(self.user, 2020)['total_gastos'], 104.35)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.assertEqual(archivo.restaurar(2020), 5)
+		self.assertFalse(ArchivoRegistros.objects.exists())
+		self.assertEqual(self.archivos(), [])
+		restaurados = RegistroFinanciero.objects.filter(fecha__year=2020)
+		self.assertEqual({r.pk: r.fecha_creacion for r in restaurados if r.pk != tardio.pk}, originales)
+		self.assertEqual(restaurados.get(descripcion='sueldo').monto, Decimal('1500.00'))
+
+	def test_restaurar_no_repite_ids(self):
+		archivado = RegistroFinanciero.objects.get(descripcion='sueldo')
+		archivo.archivar([2020])
+		RegistroFinanciero.objects.bulk_create([
+			RegistroFinanciero(id_registro=archivado.pk, id_usuario=self.user, tipo='gasto', monto=Decimal('1'),
+							   categoria='ropa', fecha=timezone.make_aware(datetime(2022, 5, 1, 9)))
+		])
+		with self.assertRaises(ValueError):
+			archivo.restaurar(2020)
+		self.assertEqual(particiones.ids_repetidos(), [])
+		self.assertTrue(ArchivoRegistros.objects.filter(anio=2020).exists())
+
+	def test_sincronizacion_con_anios_archivados(self):
+		marca_previa = ServicioSincronizacion.cambios(self.user.pk)['marca']
+		ids = set(RegistroFinanciero.objects.filter(id_usuario=self.user).values_list('pk', flat=True))
+		archivo.archivar([2020])
+
+		completo = ServicioSincronizacion.cambios(self.user.pk)
+		self.assertEqual({r.pk for r in completo['registros']}, ids)
+		paginados, desde = set(), 0
+		while True:
+			pagina = ServicioSincronizacion.cambios(self.user.pk, desde, limite=2)
+			paginados |= {r.pk for r in pagina['registros']}
+			desde = pagina['marca']
+			if not pagina['hay_mas']:
+				break
+		self.assertEqual(paginados, ids)
+		self.assertEqual(ServicioSincronizacion.cambios(self.user.pk, marca_previa)['registros'], [])
+		datos = self.client.get('/api/finanzas/sincronizar/').json()
+		self.assertEqual(sorted(r['id_registro'] for r in datos['registros']), sorted(ids))
+
+		with mock.patch.object(ServicioSincronizacion, 'registrar_escritura',
+							   wraps=ServicioSincronizacion.registrar_escritura) as registrar:
+			archivo.restaurar(2020)
+		registrar.assert_called_once_with(self.user.pk)
+		restaurados = ServicioSincronizacion.cambios(self.user.pk, marca_previa)['registros']
+		self.assertEqual(len(restaurados), 4)
+
+	def test_no_archiva_anios_activos(self):
+		with self.assertRaises(ValueError):
+			archivo.archivar([timezone.localdate().year])
+		salida = StringIO()
+		call_command('archivar_registros', stdout=salida)
+		self.assertIn('2021: 1 registros archivados', salida.getvalue())
+
+
+class InstantaneasTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='inst@test.com', nombre='Instantánea', password='testpass')
+		self.registros = [
+			RegistroFinanciero.objects.create(id_usuario=self.user, tipo=tipo, monto=Decimal(monto), categoria=categoria,
+											  fecha=timezone.make_aware(datetime(2025, 5, dia, 12)))
+			for dia, tipo, categoria, monto in [(1, 'ingreso', 'salario', '1500'), (2, 'gasto', 'alimentacion', '12.35'),
+												 (9, 'gasto', 'transporte', '3.50')]
+		]
+		directorio = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, directorio, True)
+		ajuste = override_settings(INSTANTANEAS_RUTA=directorio, ARCHIVO_REGISTROS_RUTA=directorio)
+		ajuste.enable()
+		self.addCleanup(ajuste.disable)
+
+	def crear(self, dia, monto='1'):
+		return RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal(monto),
+												 categoria='ropa', fecha=timezone.make_aware(datetime(2025, 5, dia, 12)))
+
+	def test_vista_sin_copia(self):
+		import numpy as np
+		registros = instantaneas.obtener(self.user.pk)
+		self.assertEqual(registros.dtype, instantaneas.DTYPE)
+		self.assertFalse(registros.flags.writeable)
+		self.assertEqual(list(registros['monto']), [150000, 1235, 350])
+		self.assertEqual(list(instantaneas.montos(registros)), [1500.0, -12.35, -3.5])
+		semana = instantaneas.rango(registros, timezone.make_aware(datetime(2025, 5, 1)),
+									timezone.make_aware(datetime(2025, 5, 8)))
+		self.assertTrue(np.shares_memory(semana, registros))
+		self.assertEqual(len(semana), 2)
+		# Sin verificar ni siquiera consulta la base
+		with self.assertNumQueries(0):
+			self.assertEqual(len(instantaneas.obtener(self.user.pk, verificar=False)), 3)
+
+	def test_lectura_agrega_o_reconstruye(self):
+		instantaneas.obtener(self.user.pk)
+		inodo = os.stat(instantaneas.ruta(self.user.pk)).st_ino
+		nuevo = self.crear(20, '7')
+		# Las escrituras no tocan el archivo: sin verificar sigue igual
+		self.assertEqual(len(instantaneas.obtener(self.user.pk, verificar=False)), 3)
+		# Al leer, un registro posterior al último se agrega al mismo archivo
+		self.assertEqual(list(instantaneas.obtener(self.user.pk)['id_registro'][-1:]), [nuevo.pk])
+		self.assertEqual(os.stat(instantaneas.ruta(self.user.pk)).st_ino, inodo)
+
+		# Uno con fecha anterior, una edición y una eliminación reconstruyen en orden
+		anterior = self.crear(3)
+		self.assertEqual(list(instantaneas.obtener(self.user.pk)['id_registro']),
+						 [self.registros[0].pk, self.registros[1].pk, anterior.pk, self.registros[2].pk, nuevo.pk])
+		self.assertNotEqual(os.stat(instantaneas.ruta(self.user.pk)).st_ino, inodo)
+		nuevo.monto = Decimal('8')
+		nuevo.save()
+		self.registros[0].delete()
+		self.assertEqual(list(instantaneas.obtener(self.user.pk)['monto']), [1235, 100, 350, 800])
+
+		# También lo que no pasa por save() ni delete()
+		RegistroFinanciero.objects.filter(pk=nuevo.pk).update(monto=Decimal('9'), secuencia_cambio=SiguienteCambio())
+		self.assertEqual(instantaneas.obtener(self.user.pk)['monto'][-1], 900)
+
+	def test_incluye_anios_archivados(self):
+		viejo = RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal('4'), categoria='salud',
+												  fecha=timezone.make_aware(datetime(2020, 2, 1, 12)))
+		archivo.archivar([2020])
+		registros = instantaneas.obtener(self.user.pk)
+		self.assertEqual((registros['id_registro'][0], registros['monto'][0]), (viejo.pk, 400))
+		self.assertEqual(len(registros), 4)
+
+
+
+class DineroTest(TestCase):
+	def test_conversiones(self):
+		import numpy as np
+		self.assertEqual(dinero.centavos(Decimal('12.30')), 1230)
+		self.assertEqual(dinero.centavos(0.1), 10)
+		self.assertEqual(dinero.centavos(7), 700)
+		self.assertEqual(dinero.centavos(' 1.005 '), 101)
+		self.assertEqual(dinero.redondear(2 / 3), Decimal('0.67'))
+		self.assertEqual(str(dinero.a_decimal(0)), '0.00')
+		for invalido in ('abc', '', None, float('nan'), Decimal('Infinity'), True):
+			with self.assertRaises(ValueError):
+				dinero.centavos(invalido)
+
+		montos = dinero.arreglo(['0.10'] * 10 + ['0.20'] * 10)
+		self.assertEqual(montos.dtype, np.int64)
+		self.assertEqual(list(dinero.sumar_por_grupo(np.array([0] * 10 + [1] * 10), montos, 3)), [100, 200, 0])
+		self.assertEqual(dinero.sumar(['0.10', 0.2, Decimal('0.30')]), 60)
+
+	def test_dashboard_suma_en_centavos(self):
+		cache.clear()
+		user = Usuario.objects.create_user(correo='dinero@test.com', nombre='Dinero', password='testpass')
+		client = APIClient()
+		client.force_authenticate(user=user)
+		for monto, categoria in [('0.10', 'ropa'), ('0.20', 'salud'), ('0.1', 'ropa')]:
+			resp = client.post('/api/finanzas/dashboard/', {'tipo': 'gasto', 'monto': monto, 'categoria': categoria},
+							   format='json')
+			self.assertEqual(resp.status_code, 201)
+		client.post('/api/finanzas/dashboard/', {'tipo': 'ingreso', 'monto': '0.7', 'categoria': 'salario'}, format='json')
+
+		datos = client.get('/api/finanzas/dashboard/').data
+		self.assertEqual(datos['total_gastos'], 0.4)
+		self.assertEqual(datos['balance'], 0.3)
+		self.assertEqual(datos['resumen_por_categoria'][0], {'categoria': 'salario', 'total': 0.7})
+
+		resp = client.post('/api/finanzas/dashboard/', {'tipo': 'gasto', 'monto': 'diez', 'categoria': 'ropa'}, format='json')
+		self.assertEqual(resp.status_code, 400)
+		self.assertEqual(resp.data, {'error': 'monto no es un número válido'})
+
+
+class PresupuestosTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = Usuario.objects.create_user(correo='presu@test.com', nombre='Presupuesto', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def gastar(self, monto, categoria='alimentacion', **extra):
+		return RegistroFinanciero.objects.create(id_usuario=self.user, tipo='gasto', monto=Decimal(monto),
+												 categoria=categoria, **extra)
+
+	def test_contadores_y_umbrales(self):
+		self.gastar('50')
+		self.gastar('999', fecha=timezone.now() - timedelta(days=40))  # periodo anterior: no cuenta
+		resp = self.client.post('/api/finanzas/presupuestos/',
+								{'categoria': 'alimentacion', 'periodo': 'mensual', 'limite': '100'}, format='json')
+		self.assertEqual(resp.status_code, 201)
+		presupuesto = PresupuestoCategoria.objects.get(pk=resp.data['id_presupuesto'])
+		self.assertEqual(GastoPresupuesto.objects.get(id_presupuesto=presupuesto).gastado, Decimal('50.00'))
+		repetido = self.client.post('/api/finanzas/presupuestos/',
+									{'categoria': 'alimentacion', 'periodo': 'mensual', 'limite': '5'}, format='json')
+		self.assertEqual(repetido.status_code, 400)
+
+		self.gastar('29.99')
+		self.gastar('20', categoria='ropa')
+		self.assertFalse(EventoPresupuesto.objects.exists())
+		registro = self.gastar('0.02')
+		self.assertEqual(list(EventoPresupuesto.objects.values_list('umbral', 'gastado')), [(80, Decimal('80.01'))])
+		registro.monto = Decimal('25')
+		registro.save()
+		self.assertEqual(sorted(EventoPresupuesto.objects.values_list('umbral', flat=True)), [80, 100])
+		registro.delete()
+		self.gastar('25')
+		self.assertEqual(EventoPresupuesto.objects.count(), 2)  # uno por umbral y periodo
+
+		# El estado lee solo los contadores
+		with self.assertNumQueries(1):
+			estado, = ServicioPresupuestos.estado(self.user)
+		self.assertEqual((estado['gastado'], estado['restante'], estado['porcentaje']), (104.99, -4.99, 105.0))
+		datos = self.client.get('/api/finanzas/dashboard/').data
+		self.assertEqual(datos['presupuestos'], [estado])
+		eventos = self.client.get('/api/finanzas/presupuestos/eventos/').data
+		self.assertEqual([(e['categoria'], e['umbral']) for e in eventos], [('alimentacion', 100), ('alimentacion', 80)])
+		self.assertEqual(ServicioPresupuestos.verificar(), [])
+
+	def test_importacion_y_verificacion_nocturna(self):
+		from finanzas.trabajos import verificar_presupuestos
+		presupuesto = PresupuestoCategoria.objects.create(id_usuario=self.user, categoria='transporte',
+														  periodo='semanal', limite=Decimal('10'))
+		lineas = [json.dumps({'tipo': 'gasto', 'monto': '4.5', 'categoria': 'transporte'})] * 2
+		archivo_ndjson = SimpleUploadedFile('movimientos.jsonl', '\n'.join(lineas).encode())
+		resp = self.client.post('/api/finanzas/registros/importar/', {'archivo': archivo_ndjson}, format='multipart')
+		self.assertEqual(resp.data['creados'], 2)
+		contador = GastoPresupuesto.objects.get(id_presupuesto=presupuesto)
+		self.assertEqual((contador.gastado, contador.cantidad_registros), (Decimal('9.00'), 2))
+		self.assertEqual(EventoPresupuesto.objects.get().umbral, 80)
+
+		GastoPresupuesto.objects.filter(pk=contador.pk).update(gastado=Decimal('1'))
+		diferencias = ServicioPresupuestos.verificar()
+		self.assertEqual([(d['esperado'], d['actual']) for d in diferencias], [((900, 2), (100, 2))])
+		salida = StringIO()
+		call_command('verificar_presupuestos', '--reparar', stdout=salida)
+		self.assertIn('rehechos para 1 usuarios', salida.getvalue())
+		self.assertEqual(GastoPresupuesto.objects.get(id_presupuesto=presupuesto).gastado, Decimal('9.00'))
+
+		# Un contador perdido lo repone la verificación nocturna
+		GastoPresupuesto.objects.all().delete()
+		verificar_presupuestos()
+		self.assertEqual(ServicioPresupuestos.verificar(), [])
+		self.assertEqual(EventoPresupuesto.objects.count(), 1)
+
+	def test_dashboard_cambia_de_mes_en_la_misma_semana(self):
+		# Martes 30 de setiembre y miércoles 1 de octubre de 2025: misma semana ISO 40
+		martes = timezone.make_aware(datetime(2025, 9, 30, 12))
+		miercoles = timezone.make_aware(datetime(2025, 10, 1, 12))
+		with mock.patch('django.utils.timezone.now', return_value=martes):
+			self.client.post('/api/finanzas/presupuestos/',
+							 {'categoria': 'alimentacion', 'periodo': 'mensual', 'limite': '100'}, format='json')
+			self.gastar('90', fecha=martes)
+			resp = self.client.get('/api/finanzas/dashboard/')
+			self.assertEqual(resp.data['presupuestos'][0]['gastado'], 90.0)
+			etag = resp['ETag']
+			self.assertEqual(self.client.get('/api/finanzas/dashboard/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+		with mock.patch('django.utils.timezone.now', return_value=miercoles):
+			resp = self.client.get('/api/finanzas/dashboard/', HTTP_IF_NONE_MATCH=etag)
+			self.assertEqual(resp.status_code, 200)
+			self.assertEqual(resp['X-Cache'], 'MISS')
+			self.assertEqual(resp.data['semana_actual'], 40)
+			estado, = resp.data['presupuestos']
+			self.assertEqual((estado['inicio'], estado['gastado'], estado['restante']), ('2025-10-01', 0.0, 100.0))
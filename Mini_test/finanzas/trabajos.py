@@ -0,0 +1,64 @@
+from tareas.servicios import tarea
+from usuarios.models import Usuario
+from . import anomalias, archivo, particiones, proyecciones
+from .servicios import ServicioFinanzas, ServicioPresupuestos, ServicioResumenSemanal, ServicioSincronizacion
+
+
+@tarea('finanzas.generar_reporte_semanal')
+def generar_reporte_semanal(usuario_id, semana, anio):
+    """Genera (o reutiliza si está vigente) el reporte de una semana"""
+    usuario = Usuario.objects.filter(pk=usuario_id).first()
+    if usuario:
+        ServicioFinanzas.obtener_reporte_semanal(usuario, semana, anio)
+
+
+@tarea('finanzas.cerrar_semana', cron='5 0 * * 1')
+def cerrar_semana():
+    """Lunes 00:05: reportes de la semana cerrada y de la nueva para todos los usuarios activos"""
+    ServicioFinanzas.cerrar_semana()
+
+
+@tarea('finanzas.verificar_resumenes', cron='30 3 * * *')
+def verificar_resumenes():
+    """Cada noche: reconstruye los resúmenes semanales de los usuarios con diferencias"""
+    diferencias = ServicioResumenSemanal.verificar()
+    if diferencias:
+        ServicioResumenSemanal.reconstruir({d['id_usuario'] for d in diferencias})
+
+
+@tarea('finanzas.verificar_presupuestos', cron='45 3 * * *')
+def verificar_presupuestos():
+    """Cada noche: compara los contadores de los presupuestos con el libro y rehace los que difieren"""
+    diferencias = ServicioPresupuestos.verificar()
+    if diferencias:
+        ServicioPresupuestos.reconstruir({d['id_usuario'] for d in diferencias})
+
+
+@tarea('finanzas.proyectar_metas', cron='0 2 * * *')
+def proyectar_metas():
+    """Cada noche: proyección de todas las metas activas, por lotes de usuarios"""
+    proyecciones.proyectar_todas()
+
+
+@tarea('finanzas.detectar_anomalias', cron='0 3 * * *')
+def detectar_anomalias():
+    """Cada noche: gastos inusuales y gastos hormiga de los usuarios con gastos recientes"""
+    anomalias.detectar_todas()
+
+
+@tarea('finanzas.purgar_eliminaciones', cron='15 4 * * *')
+def purgar_eliminaciones():
+    """Cada noche: borra las eliminaciones más viejas que SINCRONIZACION_RETENCION_DIAS"""
+    ServicioSincronizacion.purgar_eliminaciones()
+
+
+@tarea('finanzas.asegurar_particiones', cron='0 1 1 * *')
+def asegurar_particiones():
+    """El día 1 de cada mes: crea por adelantado la partición de registros del año siguiente"""
+    particiones.asegurar()
+
+
+@tarea('finanzas.archivar_registros', cron='30 4 1 * *')
+def archivar_registros():
+    """El día 1 de cada mes: archiva los años fuera del horizonte (y los registros tardíos de años ya archivados)"""
+    archivo.archivar()
@@ -0,0 +1,37 @@
+"""Contadores que se incrementan en la base con INSERT ... ON CONFLICT DO UPDATE.
+
+Los resúmenes semanales y los contadores de presupuestos suman deltas a una
+fila por clave. El upsert no lee la fila: SET columna = columna + EXCLUDED
+hace la suma en PostgreSQL, así que escrituras concurrentes sobre la misma
+clave no se pisan y un lote cuesta una sentencia por bloque de claves.
+"""
+from django.db import connection
+
+
+def sumar(modelo, claves, columnas, filas, retornar=(), tamano_bloque=500):
+    """Inserta las filas o suma sus columnas a las existentes con la misma clave.
+
+    filas: tuplas con los valores de claves seguidos de los de columnas. Se
+    escriben en el orden recibido; ordenarlas por clave evita bloqueos mutuos
+    entre transacciones. Retorna los valores de retornar (RETURNING) de cada
+    fila escrita, o [] si no se piden.
+    """
+    q = connection.ops.quote_name
+    tabla = q(modelo._meta.db_table)
+    sql = (
+        f'INSERT INTO {tabla} ({", ".join(q(c) for c in (*claves, *columnas))}) VALUES {{}} '
+        f'ON CONFLICT ({", ".join(q(c) for c in claves)}) DO UPDATE SET '
+        + ', '.join(f'{q(c)} = {tabla}.{q(c)} + EXCLUDED.{q(c)}' for c in columnas)
+    )
+    if retornar:
+        sql += f' RETURNING {", ".join(q(c) for c in retornar)}'
+    marcadores = '(' + ', '.join(['%s'] * (len(claves) + len(columnas))) + ')'
+
+    resultado = []
+    with connection.cursor() as cursor:
+        for i in range(0, len(filas), tamano_bloque):
+            bloque = filas[i:i + tamano_bloque]
+            cursor.execute(sql.format(', '.join([marcadores] * len(bloque))), [v for fila in bloque for v in fila])
+            if retornar:
+                resultado.extend(cursor.fetchall())
+    return resultado
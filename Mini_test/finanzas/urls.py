@@ -1,12 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RegistroFinancieroViewSet, ReporteFinancieroViewSet, MetaFinancieraViewSet, DashboardViewSet
+from .views import (RegistroFinancieroViewSet, ReporteFinancieroViewSet, MetaFinancieraViewSet, DashboardViewSet,
+                    SincronizacionViewSet, PresupuestoCategoriaViewSet)
 
 router = DefaultRouter()
 router.register(r'registros', RegistroFinancieroViewSet)
 router.register(r'reportes', ReporteFinancieroViewSet)
 router.register(r'metas', MetaFinancieraViewSet)
+router.register(r'presupuestos', PresupuestoCategoriaViewSet)
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
+router.register(r'sincronizar', SincronizacionViewSet, basename='sincronizar')
 
 urlpatterns = [
     path('', include(router.urls)),
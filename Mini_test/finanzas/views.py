@@ -1,44 +1,80 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
 from datetime import datetime, timedelta, date
-from .models import RegistroFinanciero, ReporteFinanciero, MetaFinanciera
+from decimal import Decimal
+from .models import (RegistroFinanciero, ReporteFinanciero, MetaFinanciera, ResumenSemanalCategoria, AnomaliaGasto,
+                     PresupuestoCategoria, EventoPresupuesto)
 from .serializers import (RegistroFinancieroSerializer, ReporteFinancieroSerializer, 
-                          MetaFinancieraSerializer, DashboardSerializer)
-from .servicios import ServicioFinanzas
-from rest_framework.permissions import IsAuthenticated
+                          MetaFinancieraSerializer, DashboardSerializer, AporteMetaSerializer,
+                          AporteItemSerializer, AportesLoteSerializer, ProyeccionMetaSerializer,
+                          AnomaliaGastoSerializer, PresupuestoCategoriaSerializer, EventoPresupuestoSerializer)
+from . import archivo, categorizador, dinero, proyecciones, simulacion
+from .servicios import (ServicioFinanzas, ServicioExportacion, ServicioImportacion, ServicioCacheDashboard,
+                        ServicioVersionFinanciera, ServicioAgregados, ServicioMetas, ServicioSincronizacion,
+                        ServicioPresupuestos)
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from tareas.servicios import ServicioTareas
+from django.db import transaction
 from django.db.models import Sum
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils import timezone
 
 
-class RegistroFinancieroViewSet(viewsets.ModelViewSet):
+class RespuestaCondicionalMixin:
+    """GET condicional (ETag / Last-Modified) basado en la versión financiera del usuario.
+    
+    Si el cliente ya tiene la versión vigente se responde 304 sin ejecutar
+    generar(), es decir, sin agregaciones ni serializadores.
+    """
+    
+    def respuesta_condicional(self, request, generar):
+        etag, ultima_modificacion, self.version_financiera = ServicioVersionFinanciera.validadores_http(
+            request.user.pk, request.get_full_path(), request.accepted_media_type
+        )
+        ultima_modificacion = int(ultima_modificacion.timestamp())
+        respuesta = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+        if respuesta is None:
+            respuesta = generar()
+        respuesta['ETag'] = etag
+        respuesta['Last-Modified'] = http_date(ultima_modificacion)
+        # El cliente puede guardar la respuesta pero debe revalidarla en cada uso
+        respuesta['Cache-Control'] = 'private, no-cache'
+        return respuesta
+
+
+class RegistroFinancieroViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     queryset = RegistroFinanciero.objects.all()
     serializer_class = RegistroFinancieroSerializer
     permission_classes = [IsAuthenticated]
+    orden_cursor = ('-fecha', '-id_registro')
     
     def get_queryset(self):
         return self.queryset.filter(id_usuario=self.request.user)
     
+    def list(self, request, *args, **kwargs):
+        """Registros de la tabla; los de años archivados no se paginan y se anuncian en X-Anios-Archivados"""
+        listar = super().list
+        
+        def generar():
+            respuesta = listar(request, *args, **kwargs)
+            anios = archivo.anios_archivados(request.user.pk)
+            if anios:
+                respuesta['X-Anios-Archivados'] = ','.join(map(str, anios))
+            return respuesta
+        
+        return self.respuesta_condicional(request, generar)
+    
     def perform_create(self, serializer):
         """Asignar automáticamente el usuario autenticado al crear un registro"""
         from django.utils import timezone
-        from django.utils.dateparse import parse_datetime
         
-        # Obtener fecha del request
+        # Obtener fecha del request y convertirla a hora local de Lima
         fecha_str = self.request.data.get('fecha')
-        
-        if fecha_str:
-            # Convertir fecha ISO a datetime con zona horaria
-            fecha_dt = parse_datetime(fecha_str)
-            if fecha_dt:
-                # Asegurar que tenga zona horaria
-                if timezone.is_naive(fecha_dt):
-                    fecha_dt = timezone.make_aware(fecha_dt)
-                # Convertir a hora local de Lima
-                fecha = timezone.localtime(fecha_dt)
-            else:
-                fecha = timezone.localtime(timezone.now())
-        else:
-            fecha = timezone.localtime(timezone.now())
+        fecha = ServicioFinanzas.normalizar_fecha(fecha_str) or timezone.localtime(timezone.now())
         
         # Guardar con el usuario autenticado y la fecha procesada
         serializer.save(id_usuario=self.request.user, fecha=fecha)
@@ -52,22 +88,15 @@ class RegistroFinancieroViewSet(viewsets.ModelViewSet):
         if semana and anio:
             semana = int(semana)
             anio = int(anio)
-            # Calcular fechas de la semana
-            primer_dia = date(anio, 1, 1)
-            dias_hasta_lunes = (7 - primer_dia.weekday()) % 7
-            if dias_hasta_lunes == 0 and primer_dia.weekday() != 0:
-                dias_hasta_lunes = 7
-            primer_lunes = primer_dia + timedelta(days=dias_hasta_lunes)
-            fecha_inicio = primer_lunes + timedelta(weeks=semana - 1)
-            fecha_fin = fecha_inicio + timedelta(days=6)
         else:
-            # Semana actual
-            semana, anio, fecha_inicio, fecha_fin = ServicioFinanzas.obtener_fecha_semana()
+            semana = anio = None
         
+        _, _, _, _, inicio, fin = ServicioFinanzas.ventana_semana(semana, anio)
         registros = self.get_queryset().filter(
-            fecha__date__gte=fecha_inicio,
-            fecha__date__lte=fecha_fin
+            fecha__gte=inicio,
+            fecha__lt=fin
         )
+        registros = archivo.combinar_registros(list(registros), archivo.registros(request.user.pk, inicio, fin))
         serializer = self.get_serializer(registros, many=True)
         return Response(serializer.data)
     
@@ -79,20 +108,153 @@ class RegistroFinancieroViewSet(viewsets.ModelViewSet):
                           status=status.HTTP_400_BAD_REQUEST)
         
         registros = self.get_queryset().filter(categoria=categoria)
+        registros = archivo.combinar_registros(list(registros),
+                                               archivo.registros(request.user.pk, categoria=categoria))
         serializer = self.get_serializer(registros, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def agregados(self, request):
+        """Serie de ingresos/gastos por periodo en un rango arbitrario.
+        
+        Parámetros: desde, hasta (YYYY-MM-DD), bucket (dia | semana | mes |
+        trimestre | anio) y group_by opcional (tipo, categoria o "tipo,categoria").
+        """
+        try:
+            desde = date.fromisoformat(request.query_params.get('desde', ''))
+            hasta = date.fromisoformat(request.query_params.get('hasta', ''))
+        except ValueError:
+            return Response({'error': 'desde/hasta requeridos con formato YYYY-MM-DD'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        if desde > hasta:
+            return Response({'error': 'desde no puede ser posterior a hasta'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        bucket = request.query_params.get('bucket', 'semana')
+        if bucket not in ServicioAgregados.BUCKETS:
+            return Response({'error': f"bucket debe ser uno de: {', '.join(ServicioAgregados.BUCKETS)}"},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        agrupar_por = [c for c in request.query_params.get('group_by', '').split(',') if c]
+        if any(c not in ServicioAgregados.AGRUPACIONES for c in agrupar_por) or len(set(agrupar_por)) != len(agrupar_por):
+            return Response({'error': 'group_by admite tipo y/o categoria'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        return self.respuesta_condicional(request, lambda: Response(ServicioAgregados.obtener(
+            request.user.pk, desde, hasta, bucket, agrupar_por, version=self.version_financiera
+        )))
+    
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Descarga el libro completo del usuario en CSV o NDJSON sin paginar.
+        
+        Parámetros: formato (csv | ndjson), desde, hasta (YYYY-MM-DD), tipo, categoria
+        """
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in ('csv', 'ndjson'):
+            return Response({'error': 'formato debe ser "csv" o "ndjson"'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            desde = request.query_params.get('desde')
+            hasta = request.query_params.get('hasta')
+            desde = date.fromisoformat(desde) if desde else None
+            hasta = date.fromisoformat(hasta) if hasta else None
+        except ValueError:
+            return Response({'error': 'desde/hasta deben tener formato YYYY-MM-DD'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        filtros = {
+            'desde': desde,
+            'hasta': hasta,
+            'tipo': request.query_params.get('tipo'),
+            'categoria': request.query_params.get('categoria'),
+        }
+        registros = ServicioExportacion.filtrar(request.user, **filtros)
+        # Los años archivados se intercalan en orden con los registros de la tabla
+        archivados = ServicioExportacion.archivados(request.user, **filtros)
+        
+        if formato == 'csv':
+            respuesta = StreamingHttpResponse(ServicioExportacion.lineas_csv(registros, archivados),
+                                              content_type='text/csv; charset=utf-8')
+        else:
+            respuesta = StreamingHttpResponse(ServicioExportacion.lineas_ndjson(registros, archivados),
+                                              content_type='application/x-ndjson; charset=utf-8')
+        respuesta['Content-Disposition'] = f'attachment; filename="registros.{formato}"'
+        return respuesta
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    def importar(self, request):
+        """Importa muchos registros desde un archivo CSV o JSON-lines.
+        
+        Campos del formulario: archivo, formato (csv | ndjson, opcional si la
+        extensión es .csv, .jsonl o .ndjson). Columnas: tipo, monto, categoria
+        (opcional si hay descripción y categorizador entrenado), descripcion
+        (opcional), fecha (ISO 8601, opcional).
+        """
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            return Response({'error': 'Parámetro archivo requerido'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        formato = request.data.get('formato') or ServicioImportacion.detectar_formato(archivo.name)
+        if formato not in ('csv', 'ndjson'):
+            return Response({'error': 'formato debe ser "csv" o "ndjson"'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        resultado = ServicioImportacion.importar(request.user, archivo, formato)
+        codigo = status.HTTP_201_CREATED if resultado['creados'] else status.HTTP_400_BAD_REQUEST
+        return Response(resultado, status=codigo)
+    
+    @action(detail=False, methods=['get'])
+    def sugerir_categoria(self, request):
+        """Categorías más probables para un registro.
+        
+        Parámetros: descripcion, tipo (ingreso | gasto, por defecto gasto) y
+        monto opcional. Responde la categoría que se usaría al crear el
+        registro sin categoría y las alternativas con su probabilidad.
+        """
+        descripcion = request.query_params.get('descripcion', '').strip()
+        tipo = request.query_params.get('tipo', 'gasto')
+        if not descripcion or tipo not in ('ingreso', 'gasto'):
+            return Response({'error': 'Se requiere descripcion y tipo debe ser "ingreso" o "gasto"'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        try:
+            monto = float(request.query_params.get('monto') or 0)
+        except ValueError:
+            return Response({'error': 'monto no es un número válido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        modelo = categorizador.obtener()
+        if modelo is None:
+            return Response({'error': 'El categorizador no está entrenado'},
+                          status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        categoria, probabilidad = modelo.predecir_lote([descripcion], [tipo], [monto])[0]
+        return Response({
+            'categoria': categoria,
+            'probabilidad': round(probabilidad, 4),
+            'alternativas': [
+                {'categoria': c, 'probabilidad': round(p, 4)}
+                for c, p in modelo.sugerencias(descripcion, tipo, monto)
+            ],
+        })
 
 
-class ReporteFinancieroViewSet(viewsets.ModelViewSet):
+class ReporteFinancieroViewSet(RespuestaCondicionalMixin, viewsets.ModelViewSet):
     queryset = ReporteFinanciero.objects.all()
     serializer_class = ReporteFinancieroSerializer
     
     def get_queryset(self):
-        return self.queryset.filter(id_usuario=self.request.user)
+        # detalle_por_categoria se arma desde las filas por categoría
+        return self.queryset.filter(id_usuario=self.request.user).prefetch_related('detalles')
     
     @action(detail=False, methods=['post'])
     def generar_reporte(self, request):
-        """Generar reporte de una semana específica"""
+        """Generar reporte de una semana específica.
+        
+        Si ya hay un reporte vigente se devuelve (200); si no, la generación se
+        encola para el worker y se responde 202. El resultado se consulta luego
+        con reporte_semana.
+        """
         semana = request.data.get('semana')
         anio = request.data.get('anio')
         
@@ -102,13 +264,25 @@ class ReporteFinancieroViewSet(viewsets.ModelViewSet):
         else:
             semana, anio, _, _ = ServicioFinanzas.obtener_fecha_semana()
         
-        reporte = ServicioFinanzas.generar_reporte_semanal(request.user, semana, anio)
-        serializer = self.get_serializer(reporte)
-        return Response(serializer.data)
+        reporte = ServicioFinanzas.reporte_vigente(request.user, semana, anio)
+        if reporte:
+            serializer = self.get_serializer(reporte)
+            return Response(serializer.data)
+        
+        ServicioTareas.encolar(
+            'finanzas.generar_reporte_semanal',
+            {'usuario_id': request.user.pk, 'semana': semana, 'anio': anio},
+            clave=f'finanzas:reporte:{request.user.pk}:{anio}:{semana}'
+        )
+        return Response({'mensaje': 'Reporte en generación', 'semana': semana, 'anio': anio},
+                        status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['get'])
     def reporte_semana(self, request):
         """Obtener reporte de una semana específica"""
+        return self.respuesta_condicional(request, lambda: self._reporte_semana(request))
+    
+    def _reporte_semana(self, request):
         semana = request.query_params.get('semana')
         anio = request.query_params.get('anio')
         
@@ -118,25 +292,43 @@ class ReporteFinancieroViewSet(viewsets.ModelViewSet):
         else:
             semana, anio, _, _ = ServicioFinanzas.obtener_fecha_semana()
         
+        # Se reutiliza el reporte guardado si sigue vigente; si falta o quedó
+        # desactualizado se genera una sola vez aunque haya pedidos simultáneos
+        reporte = ServicioFinanzas.obtener_reporte_semanal(request.user, semana, anio)
+        serializer = self.get_serializer(reporte)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def tendencia_categoria(self, request):
+        """Montos de una categoría semana a semana (?categoria=) o de todas en el año.
+        
+        Parámetros: anio (por defecto el año ISO actual) y categoria opcional.
+        Solo considera las semanas con reporte generado.
+        """
         try:
-            reporte = ReporteFinanciero.objects.get(
-                id_usuario=request.user,
-                semana=semana,
-                anio=anio
-            )
-            serializer = self.get_serializer(reporte)
-            return Response(serializer.data)
-        except ReporteFinanciero.DoesNotExist:
-            # Generar el reporte si no existe
-            reporte = ServicioFinanzas.generar_reporte_semanal(request.user, semana, anio)
-            serializer = self.get_serializer(reporte)
-            return Response(serializer.data)
+            anio = int(request.query_params.get('anio', timezone.localdate().isocalendar()[0]))
+        except ValueError:
+            return Response({'error': 'anio debe ser un número'}, status=status.HTTP_400_BAD_REQUEST)
+        categoria = request.query_params.get('categoria')
+        if categoria and categoria not in dict(RegistroFinanciero.CATEGORIA_CHOICES):
+            return Response({'error': 'Categoría no válida'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ServicioFinanzas.tendencia_categoria(request.user, anio, categoria))
     
     @action(detail=False, methods=['get'])
     def resumen_anual(self, request):
-        anio = int(request.query_params.get('anio', datetime.now().year))
-        resumen = ServicioFinanzas.obtener_resumen_anual(request.user, anio)
-        return Response(resumen)
+        """Resumen de las semanas ISO del año.
+        
+        ?modo=registros (por defecto) calcula desde los registros, ?modo=hibrido usa
+        los reportes de semanas cerradas y ?modo=reportes solo los reportes generados.
+        """
+        anio = int(request.query_params.get('anio', timezone.localdate().isocalendar()[0]))
+        modo = request.query_params.get('modo', 'registros')
+        if modo not in ('registros', 'hibrido', 'reportes'):
+            return Response({'error': 'Modo inválido, use registros, hibrido o reportes'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return self.respuesta_condicional(
+            request, lambda: Response(ServicioFinanzas.obtener_resumen_anual(request.user, anio, modo))
+        )
 
 
 class MetaFinancieraViewSet(viewsets.ModelViewSet):
@@ -149,6 +341,21 @@ class MetaFinancieraViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(id_usuario=self.request.user)
     
+    def perform_update(self, serializer):
+        # monto_actual solo lo cambian los aportes: se relee con la fila bloqueada
+        # para no pisar uno concurrente y con él se revisa si la meta ya se cumplió
+        with transaction.atomic():
+            meta = serializer.instance
+            meta.monto_actual = MetaFinanciera.objects.select_for_update().values_list(
+                'monto_actual', flat=True
+            ).get(pk=meta.pk)
+            estado = serializer.validated_data.get('estado', meta.estado)
+            objetivo = serializer.validated_data.get('monto_objetivo', meta.monto_objetivo)
+            if estado == 'activa' and meta.monto_actual >= objetivo:
+                serializer.save(estado='completada')
+            else:
+                serializer.save()
+    
     @action(detail=True, methods=['post'])
     def agregar_monto(self, request, pk=None):
         meta = self.get_object()
@@ -158,14 +365,60 @@ class MetaFinancieraViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Parámetro monto requerido'}, 
                           status=status.HTTP_400_BAD_REQUEST)
         
-        meta.monto_actual += float(monto)
-        if meta.monto_actual >= meta.monto_objetivo:
-            meta.estado = 'completada'
-        meta.save()
+        item = AporteItemSerializer(data={'id_meta': meta.pk, 'monto': monto,
+                                          'descripcion': request.data.get('descripcion', '')})
+        if not item.is_valid():
+            return Response({'error': 'monto debe ser un número mayor a 0'},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            meta, = ServicioMetas.aplicar_aportes(
+                request.user, [(meta.pk, item.validated_data['monto'], item.validated_data['descripcion'])]
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = self.get_serializer(meta)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['post'])
+    def aportar(self, request):
+        """Aplica muchos aportes sobre varias metas en una transacción.
+        
+        Cuerpo: {"aportes": [{"id_meta": 1, "monto": "50.00", "descripcion": ""}, ...]}
+        """
+        lote = AportesLoteSerializer(data=request.data)
+        if not lote.is_valid():
+            return Response({'error': 'aportes inválidos', 'detalle': lote.errors},
+                          status=status.HTTP_400_BAD_REQUEST)
+        
+        aportes = [(a['id_meta'], a['monto'], a['descripcion']) for a in lote.validated_data['aportes']]
+        try:
+            metas = ServicioMetas.aplicar_aportes(request.user, aportes)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = self.get_serializer(metas, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def aportes(self, request, pk=None):
+        """Historial de aportes de la meta"""
+        meta = self.get_object()
+        serializer = AporteMetaSerializer(meta.aportes.all(), many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def proyecciones(self, request):
+        """Fecha estimada y ahorro semanal requerido de cada meta activa.
+        
+        El ahorro del usuario se estima con sus últimas semanas cerradas y se
+        reparte entre las metas según lo que cada una necesita por semana.
+        """
+        resultado = proyecciones.proyectar_usuarios([request.user.pk])
+        serializer = ProyeccionMetaSerializer(resultado, many=True)
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def activas(self, request):
         metas = self.get_queryset().filter(estado='activa')
@@ -173,36 +426,126 @@ class MetaFinancieraViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class DashboardViewSet(viewsets.ViewSet):
+class PresupuestoCategoriaViewSet(viewsets.ModelViewSet):
+    """Límites de gasto por categoría, semanales o mensuales.
+    
+    Lo gastado sale de los contadores que actualiza cada escritura del libro
+    (ver ServicioPresupuestos); cambiar la categoría o el periodo vuelve a
+    contar desde el periodo en curso.
+    """
+    queryset = PresupuestoCategoria.objects.all()
+    serializer_class = PresupuestoCategoriaSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return self.queryset.filter(id_usuario=self.request.user)
+    
+    def perform_create(self, serializer):
+        serializer.save(id_usuario=self.request.user)
+    
+    @action(detail=False, methods=['get'])
+    def estado(self, request):
+        """Límite, gastado, restante y porcentaje de cada presupuesto en su periodo en curso"""
+        return Response(ServicioPresupuestos.estado(request.user))
+    
+    @action(detail=False, methods=['get'])
+    def eventos(self, request):
+        """Últimos cruces del 80% y del 100% de los límites"""
+        eventos = EventoPresupuesto.objects.filter(id_usuario=request.user).select_related('id_presupuesto')[:50]
+        return Response(EventoPresupuestoSerializer(eventos, many=True).data)
+
+
+class DashboardViewSet(RespuestaCondicionalMixin, viewsets.ViewSet):
     """Endpoint para el dashboard financiero del usuario.
 
     GET /api/finanzas/dashboard/ -> devuelve totales, resumen por categoría,
-    últimos movimientos y metas activas.
+    últimos movimientos, metas activas y presupuestos restantes.
     
     POST /api/finanzas/dashboard/ -> agregar ingreso/gasto rápido de la semana
+    
+    La respuesta del GET se guarda en caché por usuario, semana y versión
+    financiera (ver ServicioCacheDashboard); el header X-Cache indica HIT/MISS.
     """
     permission_classes = [IsAuthenticated]
 
     def list(self, request):
-        user = request.user
-        
+        return self.respuesta_condicional(request, lambda: self._respuesta_dashboard(request.user))
+    
+    def _respuesta_dashboard(self, user):
         # Obtener semana actual
-        semana, anio, fecha_inicio, fecha_fin = ServicioFinanzas.obtener_fecha_semana()
+        semana, anio, fecha_inicio, fecha_fin, _, _ = ServicioFinanzas.ventana_semana()
+        hoy = timezone.localdate()
+        
+        data, acierto = ServicioCacheDashboard.obtener(
+            user.pk, anio, semana,
+            lambda: self._calcular(user, semana, anio, fecha_inicio, fecha_fin, hoy),
+            version=self.version_financiera, mes=hoy.replace(day=1)
+        )
+        respuesta = Response(data)
+        respuesta['X-Cache'] = 'HIT' if acierto else 'MISS'
+        return respuesta
+    
+    @action(detail=False, methods=['get'], permission_classes=[IsAdminUser])
+    def estadisticas_cache(self, request):
+        """Aciertos y fallos de la caché del dashboard en el proceso que atiende (solo staff)"""
+        return Response(ServicioCacheDashboard.estadisticas())
+    
+    @action(detail=False, methods=['get'])
+    def anomalias(self, request):
+        """Gastos, semanas y gastos hormiga inusuales del usuario.
+        
+        Solo lee las anomalías guardadas, las mismas que muestra el dashboard;
+        las detecta la tarea nocturna finanzas.detectar_anomalias.
+        """
+        return self.respuesta_condicional(request, lambda: Response(
+            AnomaliaGastoSerializer(AnomaliaGasto.objects.filter(id_usuario=request.user), many=True).data
+        ))
+    
+    @action(detail=False, methods=['get'])
+    def simulacion(self, request):
+        """Simulación Monte Carlo del saldo en las próximas semanas.
         
-        # Filtrar registros de la semana actual
-        registros = RegistroFinanciero.objects.filter(
+        Parámetros: semanas (1-156, por defecto 52) y trayectorias (100-20000,
+        por defecto 10000). Devuelve bandas de percentiles por semana y la
+        probabilidad de que cada meta activa llegue a su objetivo a tiempo.
+        """
+        try:
+            semanas = int(request.query_params.get('semanas', 52))
+            trayectorias = int(request.query_params.get('trayectorias', 10000))
+        except ValueError:
+            return Response({'error': 'semanas y trayectorias deben ser enteros'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= semanas <= simulacion.MAX_SEMANAS or not 100 <= trayectorias <= simulacion.MAX_TRAYECTORIAS:
+            return Response(
+                {'error': f'semanas debe estar entre 1 y {simulacion.MAX_SEMANAS} y trayectorias '
+                          f'entre 100 y {simulacion.MAX_TRAYECTORIAS}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return self.respuesta_condicional(request, lambda: Response(
+            simulacion.obtener(request.user.pk, self.version_financiera, semanas, trayectorias)
+        ))
+    
+    def _calcular(self, user, semana, anio, fecha_inicio, fecha_fin, hoy=None):
+        # Totales de la semana desde el resumen incremental (una fila por categoría)
+        resumenes = ResumenSemanalCategoria.objects.filter(
             id_usuario=user,
-            fecha__date__gte=fecha_inicio,
-            fecha__date__lte=fecha_fin
+            anio=anio,
+            semana=semana
         )
 
-        total_ingresos = registros.filter(tipo='ingreso').aggregate(total=Sum('monto'))['total'] or 0
-        total_gastos = registros.filter(tipo='gasto').aggregate(total=Sum('monto'))['total'] or 0
-        balance = float(total_ingresos or 0) - float(total_gastos or 0)
-
-        # Resumen por categoría de la semana
-        resumen_query = registros.values('categoria').annotate(total=Sum('monto')).order_by('-total')
-        resumen_por_categoria = [{'categoria': r['categoria'], 'total': float(r['total'] or 0)} for r in resumen_query]
+        # Sumas en centavos: float solo en la respuesta
+        total_ingresos = 0
+        total_gastos = 0
+        resumen_por_categoria = []
+        for r in resumenes:
+            ingresos, gastos = dinero.centavos(r.total_ingresos), dinero.centavos(r.total_gastos)
+            total_ingresos += ingresos
+            total_gastos += gastos
+            resumen_por_categoria.append({
+                'categoria': r.categoria,
+                'total': dinero.a_float(ingresos + gastos)
+            })
+        resumen_por_categoria.sort(key=lambda r: r['total'], reverse=True)
 
         # Últimos registros
         recientes = RegistroFinanciero.objects.filter(id_usuario=user).order_by('-fecha')[:10]
@@ -212,20 +555,25 @@ class DashboardViewSet(viewsets.ViewSet):
         metas_activas_qs = MetaFinanciera.objects.filter(id_usuario=user, estado='activa')[:5]
         metas_activas = MetaFinancieraSerializer(metas_activas_qs, many=True).data
 
-        data = {
+        # Anomalías más recientes, precalculadas por la detección nocturna o el endpoint anomalias
+        alertas_qs = AnomaliaGasto.objects.filter(id_usuario=user)[:5]
+        alertas_gasto = AnomaliaGastoSerializer(alertas_qs, many=True).data
+
+        return {
             'semana_actual': semana,
             'anio_actual': anio,
             'fecha_inicio_semana': fecha_inicio.isoformat(),
             'fecha_fin_semana': fecha_fin.isoformat(),
-            'total_ingresos': float(total_ingresos or 0),
-            'total_gastos': float(total_gastos or 0),
-            'balance': float(balance),
+            'total_ingresos': dinero.a_float(total_ingresos),
+            'total_gastos': dinero.a_float(total_gastos),
+            'balance': dinero.a_float(total_ingresos - total_gastos),
             'resumen_por_categoria': resumen_por_categoria,
-            'registros_recientes': registros_recientes,
-            'metas_activas': metas_activas,
+            'registros_recientes': list(registros_recientes),
+            'metas_activas': list(metas_activas),
+            'alertas_gasto': list(alertas_gasto),
+            # Restante por categoría desde los contadores, sin sumar registros
+            'presupuestos': ServicioPresupuestos.estado(user, hoy),
         }
-
-        return Response(data)
     
     def create(self, request):
         """Agregar un ingreso o gasto rápidamente a la semana actual.
@@ -234,7 +582,7 @@ class DashboardViewSet(viewsets.ViewSet):
         {
             "tipo": "ingreso" | "gasto",
             "monto": float,
-            "categoria": string,
+            "categoria": string (opcional; se sugiere a partir de la descripción),
             "descripcion": string (opcional),
             "fecha": string ISO (opcional)
         }
@@ -242,7 +590,6 @@ class DashboardViewSet(viewsets.ViewSet):
         Returns: El registro creado
         """
         from django.utils import timezone
-        from django.utils.dateparse import parse_datetime
         
         tipo = request.data.get('tipo')
         monto = request.data.get('monto')
@@ -251,9 +598,9 @@ class DashboardViewSet(viewsets.ViewSet):
         fecha_str = request.data.get('fecha')
         
         # Validar campos requeridos
-        if not all([tipo, monto, categoria]):
+        if not all([tipo, monto]):
             return Response(
-                {'error': 'Se requieren: tipo, monto, categoria'},
+                {'error': 'Se requieren: tipo, monto'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -264,24 +611,33 @@ class DashboardViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # Al centavo desde el texto recibido, sin pasar por float
+        try:
+            monto = dinero.redondear(monto)
+        except ValueError:
+            return Response(
+                {'error': 'monto no es un número válido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Sin categoría se sugiere a partir de la descripción
+        if not categoria:
+            categoria = categorizador.categorizar(descripcion, tipo, float(monto))
+            if categoria is None:
+                return Response(
+                    {'error': 'categoria es requerida si no hay descripción para sugerirla'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
         # Procesar fecha
-        if fecha_str:
-            fecha_dt = parse_datetime(fecha_str)
-            if fecha_dt:
-                if timezone.is_naive(fecha_dt):
-                    fecha_dt = timezone.make_aware(fecha_dt)
-                fecha = timezone.localtime(fecha_dt)
-            else:
-                fecha = timezone.localtime(timezone.now())
-        else:
-            fecha = timezone.localtime(timezone.now())
+        fecha = ServicioFinanzas.normalizar_fecha(fecha_str) or timezone.localtime(timezone.now())
         
         # Crear el registro
         try:
             registro = RegistroFinanciero.objects.create(
                 id_usuario=request.user,
                 tipo=tipo,
-                monto=float(monto),
+                monto=monto,
                 fecha=fecha,
                 categoria=categoria,
                 descripcion=descripcion
@@ -295,4 +651,31 @@ class DashboardViewSet(viewsets.ViewSet):
             return Response(
                 {'error': f'Error al crear registro: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+
+class SincronizacionViewSet(viewsets.ViewSet):
+    """Cambios de registros y metas desde la última sincronización del cliente.
+    
+    GET /api/finanzas/sincronizar/?desde=<marca>&limite=<n>
+    
+    Devuelve las filas creadas o modificadas con secuencia_cambio > desde, los
+    ids eliminados y la nueva marca. Sin desde (o con 0) se envía todo y
+    'completo' es true. Si 'hay_mas' es true se repite con desde=marca.
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def list(self, request):
+        try:
+            desde = int(request.query_params.get('desde', 0))
+            limite = int(request.query_params.get('limite', ServicioSincronizacion.LIMITE))
+        except ValueError:
+            return Response({'error': 'desde y limite deben ser enteros'}, status=status.HTTP_400_BAD_REQUEST)
+        if desde < 0 or not 1 <= limite <= 5000:
+            return Response({'error': 'desde no puede ser negativo y limite debe estar entre 1 y 5000'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        cambios = ServicioSincronizacion.cambios(request.user.pk, desde, limite)
+        cambios['registros'] = RegistroFinancieroSerializer(cambios['registros'], many=True).data
+        cambios['metas'] = MetaFinancieraSerializer(cambios['metas'], many=True).data
+        return Response(cambios)
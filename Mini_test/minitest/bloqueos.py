@@ -0,0 +1,42 @@
+import hashlib
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+
+
+# Estos bloqueos, como registrar_escritura y las particiones de finanzas,
+# requieren PostgreSQL: no hay respaldo para otros motores.
+
+
+def clave_bloqueo(nombre):
+    """Entero de 64 bits con signo derivado del nombre, para pg_advisory_*"""
+    return int.from_bytes(hashlib.sha1(nombre.encode()).digest()[:8], 'big', signed=True)
+
+
+@contextmanager
+def bloqueo_exclusivo(nombre):
+    """Abre una transacción y toma un bloqueo exclusivo identificado por nombre.
+
+    Usa pg_advisory_xact_lock, que se libera solo al terminar la transacción
+    y sirve entre procesos y servidores.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [clave_bloqueo(nombre)])
+        yield
+
+
+def intentar_bloqueo_sesion(nombre):
+    """Intenta tomar sin esperar un bloqueo que dura mientras viva la conexión.
+
+    Sirve para elegir un líder entre réplicas: solo un proceso lo obtiene y
+    PostgreSQL lo libera si ese proceso muere o pierde la conexión.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [clave_bloqueo(nombre)])
+        return cursor.fetchone()[0]
+
+
+def liberar_bloqueo_sesion(nombre):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', [clave_bloqueo(nombre)])
@@ -0,0 +1,135 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PaginacionOpcionalCursor(PageNumberPagination):
+    """Paginación por número de página con modo cursor (keyset) opcional.
+
+    Por defecto se comporta como PageNumberPagination. Si la vista define
+    `orden_cursor` (p. ej. ('-fecha', '-id_registro')) y el cliente envía
+    ?paginacion=cursor o un ?cursor=..., la página se obtiene filtrando a
+    partir de la última fila vista en lugar de OFFSET y sin COUNT(*), así la
+    página 10 000 cuesta lo mismo que la primera con el índice adecuado.
+    """
+    cursor_query_param = 'cursor'
+    modo_query_param = 'paginacion'
+    mensaje_cursor_invalido = 'Cursor inválido'
+
+    def usa_cursor(self, request, view):
+        if not getattr(view, 'orden_cursor', None):
+            return False
+        return (self.cursor_query_param in request.query_params
+                or request.query_params.get(self.modo_query_param) == 'cursor')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.modo_cursor = self.usa_cursor(request, view)
+        if not self.modo_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.orden = list(view.orden_cursor)
+        tamano = self.get_page_size(request)
+        cursor = self.decodificar_cursor(request, queryset.model)
+        hacia_atras = bool(cursor and cursor['atras'])
+
+        orden = [self._invertir(campo) for campo in self.orden] if hacia_atras else self.orden
+        queryset = queryset.order_by(*orden)
+        if cursor:
+            queryset = queryset.filter(self._despues_de(orden, cursor['valores']))
+
+        resultados = list(queryset[:tamano + 1])
+        hay_mas = len(resultados) > tamano
+        resultados = resultados[:tamano]
+        if hacia_atras:
+            resultados.reverse()
+
+        if hacia_atras:
+            self.siguiente = resultados[-1] if resultados else None
+            self.anterior = resultados[0] if hay_mas else None
+        else:
+            self.siguiente = resultados[-1] if hay_mas else None
+            self.anterior = resultados[0] if cursor and resultados else None
+        return resultados
+
+    def get_paginated_response(self, data):
+        if not self.modo_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.modo_cursor:
+            return super().get_next_link()
+        if self.siguiente is None:
+            return None
+        return self._enlace(self.siguiente, atras=False)
+
+    def get_previous_link(self):
+        if not self.modo_cursor:
+            return super().get_previous_link()
+        if self.anterior is None:
+            return None
+        return self._enlace(self.anterior, atras=True)
+
+    @staticmethod
+    def _campo(campo):
+        return campo.lstrip('-')
+
+    @staticmethod
+    def _invertir(campo):
+        return campo[1:] if campo.startswith('-') else '-' + campo
+
+    def _despues_de(self, orden, valores):
+        """Condición lexicográfica 'fila posterior a valores' según el orden dado.
+
+        Se agrega además una cota simple sobre el primer campo (fecha <= f) para
+        que PostgreSQL la use como condición de rango en el índice; el OR solo
+        filtra las filas que empatan en ese campo.
+        """
+        condicion = Q()
+        iguales = Q()
+        for campo, valor in zip(orden, valores):
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            nombre = self._campo(campo)
+            condicion |= iguales & Q(**{f'{nombre}__{operador}': valor})
+            iguales &= Q(**{nombre: valor})
+        primero = orden[0]
+        cota = Q(**{f"{self._campo(primero)}__{'lte' if primero.startswith('-') else 'gte'}": valores[0]})
+        return cota & condicion
+
+    def _enlace(self, fila, atras):
+        valores = []
+        for campo in self.orden:
+            valor = getattr(fila, self._campo(campo))
+            valores.append(valor.isoformat() if hasattr(valor, 'isoformat') else valor)
+        contenido = json.dumps({'v': valores, 'a': atras}, separators=(',', ':'))
+        codigo = base64.urlsafe_b64encode(contenido.encode()).decode().rstrip('=')
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, codigo)
+
+    def decodificar_cursor(self, request, modelo):
+        codigo = request.query_params.get(self.cursor_query_param)
+        if not codigo:
+            return None
+        try:
+            relleno = '=' * (-len(codigo) % 4)
+            contenido = json.loads(base64.urlsafe_b64decode(codigo + relleno).decode())
+            if len(contenido['v']) != len(self.orden):
+                raise ValueError
+            valores = [
+                modelo._meta.get_field(self._campo(campo)).to_python(valor)
+                for campo, valor in zip(self.orden, contenido['v'])
+            ]
+            return {'valores': valores, 'atras': bool(contenido.get('a'))}
+        except Exception:
+            raise NotFound(self.mensaje_cursor_invalido)
@@ -31,6 +31,7 @@ INSTALLED_APPS = [
     'finanzas',
     'aprendizaje',
     'oportunidades',
+    'tareas',
 ]
 
 MIDDLEWARE = [
@@ -88,6 +89,43 @@ else:
         }
     }
 
+# Caché: memoria local por proceso por defecto; con CACHE_DIR se usa una caché en
+# archivos compartida por todos los workers de gunicorn del mismo servidor
+if os.environ.get('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'minitest',
+        }
+    }
+
+# Segundos que vive una respuesta del dashboard en caché (se invalida antes con cada escritura)
+DASHBOARD_CACHE_TIMEOUT = int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 300))
+AGREGADOS_CACHE_TIMEOUT = int(os.environ.get('AGREGADOS_CACHE_TIMEOUT', 600))
+
+# Días que se conservan las eliminaciones para la sincronización incremental; un cliente
+# con una marca más vieja vuelve a descargar todo
+SINCRONIZACION_RETENCION_DIAS = int(os.environ.get('SINCRONIZACION_RETENCION_DIAS', 90))
+
+# Modelo del categorizador automático (se genera con: python manage.py entrenar_categorizador)
+CATEGORIZADOR_RUTA = os.environ.get('CATEGORIZADOR_RUTA', os.path.join(BASE_DIR, 'modelos', 'categorizador.npz'))
+
+# Años cerrados del libro en archivos comprimidos por usuario (python manage.py archivar_registros):
+# se archivan los años anteriores a los ARCHIVO_ANIOS_ACTIVOS más recientes (el actual incluido)
+ARCHIVO_REGISTROS_RUTA = os.environ.get('ARCHIVO_REGISTROS_RUTA', os.path.join(BASE_DIR, 'archivo_registros'))
+ARCHIVO_ANIOS_ACTIVOS = int(os.environ.get('ARCHIVO_ANIOS_ACTIVOS', 2))
+
+# Instantáneas del libro por usuario mapeadas en memoria para las anomalías (finanzas/instantaneas.py);
+# es una caché local del servidor: se puede borrar en cualquier momento
+INSTANTANEAS_RUTA = os.environ.get('INSTANTANEAS_RUTA', os.path.join(BASE_DIR, 'instantaneas'))
+
 # Modelo de usuario personalizado
 AUTH_USER_MODEL = 'usuarios.Usuario'
 
@@ -101,7 +139,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # PageNumberPagination con modo cursor opcional (?paginacion=cursor) en vistas con orden_cursor
+    'DEFAULT_PAGINATION_CLASS': 'minitest.paginacion.PaginacionOpcionalCursor',
     'PAGE_SIZE': 20
 }
 
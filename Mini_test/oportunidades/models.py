@@ -35,20 +35,20 @@ class OportunidadEconomica(models.Model):
     @property
     def esta_vigente(self):
         """Verifica si la oportunidad está vigente"""
-        from datetime import date
+        from django.utils import timezone
         if not self.fecha_fin:
             return True
-        return self.fecha_fin >= date.today()
+        return self.fecha_fin >= timezone.localdate()
     
     @property
     def tiempo_restante(self):
         """Calcula el tiempo restante en días"""
-        from datetime import date
+        from django.utils import timezone
         if not self.fecha_fin:
             return None
         if not self.esta_vigente:
             return 0
-        return (self.fecha_fin - date.today()).days
+        return (self.fecha_fin - timezone.localdate()).days
     
     def actualizar_estado(self):
         """Actualiza el estado activa basado en la fecha de fin"""
@@ -62,3 +62,21 @@ class OportunidadEconomica(models.Model):
             if self.fecha_inicio > self.fecha_fin:
                 raise ValueError("La fecha de inicio no puede ser posterior a la fecha de fin")
         super().save(*args, **kwargs)
+        if self.activa and self.fecha_fin:
+            self.programar_vencimiento()
+    
+    def programar_vencimiento(self):
+        """Encola la desactivación para el día siguiente a fecha_fin.
+        
+        La clave agrupa por día: todas las oportunidades que vencen la misma
+        fecha comparten una sola tarea.
+        """
+        from datetime import datetime, time, timedelta
+        from django.utils import timezone
+        from tareas.servicios import ServicioTareas
+        dia = self.fecha_fin + timedelta(days=1)
+        ServicioTareas.encolar(
+            'oportunidades.desactivar_vencidas',
+            clave=f'oportunidades:vencidas:{dia.isoformat()}',
+            ejecutar_despues=timezone.make_aware(datetime.combine(dia, time.min))
+        )
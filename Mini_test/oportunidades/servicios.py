@@ -1,5 +1,5 @@
-from datetime import date
 from django.db.models import Q
+from django.utils import timezone
 from .models import OportunidadEconomica
 
 class ServicioOportunidades:
@@ -7,7 +7,7 @@ class ServicioOportunidades:
     def obtener_oportunidades_vigentes():
         """Obtiene todas las oportunidades vigentes"""
         return OportunidadEconomica.objects.filter(
-            Q(fecha_fin__gte=date.today()) | Q(fecha_fin__isnull=True),
+            Q(fecha_fin__gte=timezone.localdate()) | Q(fecha_fin__isnull=True),
             activa=True
         )
     
@@ -36,13 +36,21 @@ class ServicioOportunidades:
             activa=True
         )
     
+    @staticmethod
+    def desactivar_vencidas():
+        """Desactiva en un solo UPDATE las oportunidades cuya fecha_fin ya pasó"""
+        return OportunidadEconomica.objects.filter(
+            activa=True,
+            fecha_fin__lt=timezone.localdate()
+        ).update(activa=False)
+    
     @staticmethod
     def proximas_a_vencer(dias=30):
         """Obtiene oportunidades próximas a vencer"""
         from datetime import timedelta
-        fecha_limite = date.today() + timedelta(days=dias)
+        fecha_limite = timezone.localdate() + timedelta(days=dias)
         return OportunidadEconomica.objects.filter(
             fecha_fin__lte=fecha_limite,
-            fecha_fin__gte=date.today(),
+            fecha_fin__gte=timezone.localdate(),
             activa=True
         )
\ No newline at end of file
@@ -0,0 +1,8 @@
+from tareas.servicios import tarea
+from .servicios import ServicioOportunidades
+
+
+@tarea('oportunidades.desactivar_vencidas', cron='10 0 * * *')
+def desactivar_vencidas():
+    """Marca como inactivas todas las oportunidades con fecha_fin pasada (también cada día a las 00:10)"""
+    ServicioOportunidades.desactivar_vencidas()
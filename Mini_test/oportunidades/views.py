@@ -30,9 +30,9 @@ class OportunidadEconomicaViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def vigentes(self, request):
-        from datetime import date
+        from django.utils import timezone
         oportunidades = self.queryset.filter(
-            fecha_fin__gte=date.today()
+            fecha_fin__gte=timezone.localdate()
         ) | self.queryset.filter(fecha_fin__isnull=True)
         serializer = self.get_serializer(oportunidades, many=True)
         return Response(serializer.data)
\ No newline at end of file
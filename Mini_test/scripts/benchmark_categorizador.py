@@ -0,0 +1,108 @@
+"""Precisión y velocidad del categorizador automático.
+
+Uso (desde Mini_test/):
+    python scripts/benchmark_categorizador.py [--ejemplos 50000] [--desde-bd]
+
+Por defecto genera descripciones sintéticas por categoría (con errores de
+tipeo, palabras de relleno y 10% de etiquetas erróneas); con --desde-bd usa
+los registros de la base reservando los id múltiplos de 5 para medir la
+precisión. No escribe nada.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'minitest.settings')
+
+import django
+django.setup()
+
+from finanzas import categorizador
+
+
+VOCABULARIO = {
+    'salario': ('sueldo', 'pago planilla', 'remuneracion', 'quincena', 'haberes'),
+    'freelance': ('proyecto web', 'diseño logo', 'clases particulares', 'traduccion', 'consultoria'),
+    'negocio': ('venta tienda', 'ventas bodega', 'pedido cliente', 'venta de postres', 'caja del dia'),
+    'inversion': ('intereses plazo fijo', 'dividendos', 'rendimiento fondo', 'cts intereses'),
+    'alimentacion': ('almuerzo', 'menu', 'mercado', 'supermercado', 'pollo a la brasa', 'cafe', 'pan'),
+    'transporte': ('taxi', 'pasaje bus', 'combi', 'metropolitano', 'gasolina', 'uber', 'peaje'),
+    'vivienda': ('alquiler', 'renta depa', 'mantenimiento edificio', 'cuarto', 'arbitrios'),
+    'servicios': ('recibo luz', 'agua sedapal', 'internet', 'plan celular', 'gas balon', 'cable'),
+    'educacion': ('pension universidad', 'curso online', 'libros', 'matricula', 'utiles'),
+    'salud': ('farmacia', 'consulta medica', 'dentista', 'pastillas', 'analisis laboratorio'),
+    'entretenimiento': ('cine', 'netflix', 'spotify', 'concierto', 'salida con amigos', 'videojuego'),
+    'ropa': ('zapatillas', 'polo', 'pantalon', 'casaca', 'ropa gamarra'),
+    'deudas': ('cuota prestamo', 'tarjeta de credito', 'pago deuda', 'cuota banco'),
+    'ahorro': ('ahorro mensual', 'deposito alcancia', 'ahorro meta', 'transferencia ahorro'),
+}
+RELLENO = ('pago', 'del', 'mes', 'con', 'yape', 'efectivo', 'semana', 'hoy', 'centro', 'lima')
+INGRESOS = categorizador.CATEGORIAS_POR_TIPO['ingreso']
+
+
+def con_error(palabra):
+    if len(palabra) > 4 and random.random() < 0.15:
+        i = random.randrange(len(palabra))
+        return palabra[:i] + palabra[i + 1:]
+    return palabra
+
+
+def sinteticos(cantidad):
+    categorias = list(VOCABULARIO)
+    for _ in range(cantidad):
+        categoria = random.choice(categorias)
+        # 10% mal etiquetados: descripción de otra categoría, como cuando el usuario elige mal
+        origen = random.choice(categorias) if random.random() < 0.1 else categoria
+        palabras = random.choice(VOCABULARIO[origen]).split()
+        palabras += random.sample(RELLENO, random.randint(0, 3))
+        random.shuffle(palabras)
+        descripcion = ' '.join(con_error(p) for p in palabras)
+        tipo = 'ingreso' if categoria in INGRESOS else 'gasto'
+        yield descripcion, tipo, round(random.lognormvariate(4, 1), 2), categoria
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ejemplos', type=int, default=50000)
+    parser.add_argument('--desde-bd', action='store_true')
+    args = parser.parse_args()
+
+    random.seed(7)
+    if args.desde_bd:
+        entrenamiento = list(categorizador.ejemplos_entrenamiento(lambda id_registro: id_registro % 5 != 0))
+        prueba = list(categorizador.ejemplos_entrenamiento(lambda id_registro: id_registro % 5 == 0))
+    else:
+        datos = list(sinteticos(args.ejemplos))
+        corte = len(datos) * 4 // 5
+        entrenamiento, prueba = datos[:corte], datos[corte:]
+    if not entrenamiento or not prueba:
+        sys.exit('No hay suficientes registros con descripción')
+
+    inicio = time.perf_counter()
+    modelo = categorizador.Categorizador.entrenar(entrenamiento)
+    print(f'Entrenamiento: {len(entrenamiento)} ejemplos en {time.perf_counter() - inicio:.2f}s')
+
+    descripciones, tipos, montos, categorias = zip(*prueba)
+    inicio = time.perf_counter()
+    predichas = modelo.predecir_lote(descripciones, tipos, montos)
+    duracion = time.perf_counter() - inicio
+    aciertos = sum(p == c for (p, _), c in zip(predichas, categorias))
+    print(f'Precisión: {aciertos / len(prueba):.1%} en {len(prueba)} ejemplos')
+    print(f'Lote: {len(prueba) / duracion:,.0f} predicciones/s')
+
+    tiempos = []
+    for descripcion, tipo, monto in zip(descripciones[:2000], tipos, montos):
+        inicio = time.perf_counter()
+        modelo.predecir_lote([descripcion], [tipo], [monto])
+        tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    print(f'Individual: mediana {statistics.median(tiempos) * 1e6:.0f} µs, '
+          f'p99 {tiempos[int(len(tiempos) * 0.99)] * 1e6:.0f} µs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""Reporte semanal antes y después de sumar en centavos, sobre registros en la base.
+
+Uso (desde Mini_test/, con DATABASE_URL apuntando a una base migrada):
+    python scripts/benchmark_dinero.py [--registros 100000] [--repeticiones 5]
+
+Crea un usuario con --registros registros en una misma semana de hace tres
+años y mide ServicioFinanzas.generar_reporte_semanal (después) contra una
+copia del camino anterior (antes: totales Decimal sumados en Python y, para
+los años archivados, filas armadas una a una acumulando Decimal). Mide dos
+casos: los registros en la tabla y los registros archivados con
+archivo.archivar. Comprueba que ambos caminos dan los mismos totales. Todo
+corre en una transacción que se revierte al final; los archivos .npz van a
+un directorio temporal.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as hora, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'minitest.settings')
+os.environ['ARCHIVO_REGISTROS_RUTA'] = tempfile.mkdtemp(prefix='archivo-')
+
+import django
+django.setup()
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from finanzas import archivo
+from finanzas.models import RegistroFinanciero, ReporteFinanciero
+from finanzas.servicios import ServicioFinanzas, ServicioVersionFinanciera
+from usuarios.models import Usuario
+
+
+CATEGORIAS = [c for c, _ in RegistroFinanciero.CATEGORIA_CHOICES]
+
+
+class Revertir(Exception):
+    pass
+
+
+def poblar(usuario, cantidad, lunes, semilla=7):
+    aleatorio = random.Random(semilla)
+    inicio = timezone.make_aware(datetime.combine(lunes, hora.min))
+    RegistroFinanciero.objects.bulk_create([
+        RegistroFinanciero(
+            id_usuario=usuario, tipo=aleatorio.choice(('ingreso', 'gasto')), categoria=aleatorio.choice(CATEGORIAS),
+            monto=Decimal(aleatorio.randrange(1, 500000)).scaleb(-2),
+            fecha=inicio + timedelta(seconds=aleatorio.randrange(7 * 24 * 3600)),
+        )
+        for _ in range(cantidad)
+    ], batch_size=5000)
+
+
+def totales_archivados_antes(usuario_id, inicio, fin):
+    """archivo.totales antes del cambio: una fila por registro, acumulando Decimal"""
+    resultado = {}
+    cero = Decimal('0')
+    for fila in archivo.rango(usuario_id, inicio, fin):
+        ingresos, gastos = resultado.get(fila[3], (cero, cero))
+        if fila[2] == 'ingreso':
+            ingresos += fila[4]
+        else:
+            gastos += fila[4]
+        resultado[fila[3]] = (ingresos, gastos)
+    return resultado
+
+
+def reporte_antes(usuario, semana, anio):
+    """generar_reporte_semanal antes del cambio (totales Decimal en Python)"""
+    semana, anio, fecha_inicio, fecha_fin, inicio, fin = ServicioFinanzas.ventana_semana(semana, anio)
+    version, _ = ServicioVersionFinanciera.obtener(usuario.pk)
+    filas = list(
+        RegistroFinanciero.objects
+        .filter(id_usuario=usuario, fecha__gte=inicio, fecha__lt=fin)
+        .values('categoria')
+        .annotate(
+            ingresos=Sum('monto', filter=Q(tipo='ingreso'), default=Decimal('0')),
+            gastos=Sum('monto', filter=Q(tipo='gasto'), default=Decimal('0')),
+        )
+        .order_by('categoria')
+    )
+    if ServicioFinanzas.puede_estar_archivado(inicio):
+        por_categoria = {f['categoria']: dict(f) for f in filas}
+        for categoria, (ingresos, gastos) in totales_archivados_antes(usuario.pk, inicio, fin).items():
+            fila = por_categoria.setdefault(
+                categoria, {'categoria': categoria, 'ingresos': Decimal('0'), 'gastos': Decimal('0')}
+            )
+            fila['ingresos'] += ingresos
+            fila['gastos'] += gastos
+        filas = [por_categoria[c] for c in sorted(por_categoria)]
+    total_ingresos = sum((f['ingresos'] for f in filas), Decimal('0'))
+    total_gastos = sum((f['gastos'] for f in filas), Decimal('0'))
+    with transaction.atomic():
+        reporte, _ = ReporteFinanciero.objects.update_or_create(
+            id_usuario=usuario, semana=semana, anio=anio,
+            defaults={
+                'total_ingresos': total_ingresos, 'total_gastos': total_gastos,
+                'balance': total_ingresos - total_gastos, 'fecha_inicio_semana': fecha_inicio,
+                'fecha_fin_semana': fecha_fin, 'version_registros': version,
+            }
+        )
+        ServicioFinanzas.reemplazar_detalles([reporte], {reporte.pk: filas})
+    return reporte
+
+
+def medir(funcion, repeticiones):
+    funcion()   # calienta cachés de la base y del sistema de archivos
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos), resultado
+
+
+def comparar(caso, usuario, semana, anio, registros, repeticiones):
+    antes, reporte_a = medir(lambda: reporte_antes(usuario, semana, anio), repeticiones)
+    totales_a = (reporte_a.total_ingresos, reporte_a.total_gastos,
+                 sorted(reporte_a.detalles.values_list('categoria', 'ingresos', 'gastos')))
+    despues, reporte_d = medir(lambda: ServicioFinanzas.generar_reporte_semanal(usuario, semana, anio), repeticiones)
+    totales_d = (reporte_d.total_ingresos, reporte_d.total_gastos,
+                 sorted(reporte_d.detalles.values_list('categoria', 'ingresos', 'gastos')))
+    assert totales_a == totales_d, (totales_a, totales_d)
+    print(f'{caso:<22} antes {antes * 1000:9.1f} ms   después {despues * 1000:9.1f} ms   '
+          f'x{antes / despues:5.2f}   ({registros:,} registros)')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--registros', type=int, default=100000)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args()
+
+    hoy = timezone.localdate()
+    lunes = date.fromisocalendar(hoy.year - 3, 10, 1)
+    anio, semana, _ = lunes.isocalendar()
+    try:
+        with transaction.atomic():
+            usuario = Usuario.objects.create_user(correo='benchmark-dinero@local', nombre='Benchmark',
+                                                  password=None)
+            poblar(usuario, args.registros, lunes)
+            comparar('en la tabla', usuario, semana, anio, args.registros, args.repeticiones)
+            archivo.archivar([anio], usuario_ids=[usuario.pk])
+            comparar('archivados', usuario, semana, anio, args.registros, args.repeticiones)
+            raise Revertir
+    except Revertir:
+        pass
+    finally:
+        shutil.rmtree(settings.ARCHIVO_REGISTROS_RUTA, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
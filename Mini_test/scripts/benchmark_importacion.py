@@ -0,0 +1,77 @@
+"""Mide filas/s de la importación masiva de registros.
+
+Uso (desde Mini_test/):
+    python scripts/benchmark_importacion.py [--filas 100000] [--formato csv|ndjson]
+
+Todo se ejecuta dentro de una transacción que se revierte al final, así que
+no deja datos en la base.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'minitest.settings')
+
+import django
+django.setup()
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from finanzas.models import RegistroFinanciero
+from finanzas.servicios import ServicioImportacion
+from usuarios.models import Usuario
+
+
+def generar_archivo(filas, formato):
+    gastos = ['alimentacion', 'transporte', 'vivienda', 'servicios', 'salud', 'entretenimiento']
+    inicio = datetime(2024, 1, 1)
+    salida = io.StringIO()
+    if formato == 'csv':
+        salida.write('tipo,monto,categoria,descripcion,fecha\n')
+    for i in range(filas):
+        ingreso = i % 10 == 0
+        fila = {
+            'tipo': 'ingreso' if ingreso else 'gasto',
+            'monto': f'{random.uniform(1, 2000):.2f}',
+            'categoria': 'salario' if ingreso else random.choice(gastos),
+            'descripcion': f'movimiento {i}',
+            'fecha': (inicio + timedelta(minutes=37 * i)).isoformat(),
+        }
+        if formato == 'csv':
+            salida.write(','.join(fila.values()) + '\n')
+        else:
+            salida.write(json.dumps(fila) + '\n')
+    return salida.getvalue().encode()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--filas', type=int, default=100000)
+    parser.add_argument('--formato', choices=['csv', 'ndjson'], default='csv')
+    args = parser.parse_args()
+
+    contenido = generar_archivo(args.filas, args.formato)
+    archivo = SimpleUploadedFile(f'benchmark.{args.formato}', contenido)
+    print(f'Archivo {args.formato}: {args.filas} filas, {len(contenido) / 1e6:.1f} MB')
+
+    with transaction.atomic():
+        usuario = Usuario.objects.create_user(correo='benchmark-importacion@example.com',
+                                              nombre='Benchmark', password=None)
+        inicio = time.perf_counter()
+        resultado = ServicioImportacion.importar(usuario, archivo, args.formato)
+        duracion = time.perf_counter() - inicio
+        assert RegistroFinanciero.objects.filter(id_usuario=usuario).count() == resultado['creados']
+        transaction.set_rollback(True)
+
+    print(f"Creados: {resultado['creados']}  errores: {resultado['total_errores']}")
+    print(f"Duración: {duracion:.2f}s  ->  {resultado['creados'] / duracion:,.0f} filas/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Lectura del historial completo de un usuario: consulta a PostgreSQL contra instantánea.
+
+Uso (desde Mini_test/):
+    python scripts/benchmark_instantaneas.py [--usuarios 20] [--repeticiones 50]
+
+Toma los usuarios con más registros y compara, por usuario, traer el libro
+con el ORM convirtiendo los montos a float contra finanzas.instantaneas
+(con y sin la consulta de verificación). Las instantáneas se escriben en un
+directorio temporal; la base no se modifica.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'minitest.settings')
+os.environ['INSTANTANEAS_RUTA'] = tempfile.mkdtemp(prefix='instantaneas-')
+
+import django
+django.setup()
+
+import numpy as np
+from django.db.models import Count
+
+from finanzas import instantaneas
+from finanzas.models import RegistroFinanciero
+
+
+def desde_la_base(usuario_id):
+    filas = list(RegistroFinanciero.objects.filter(id_usuario=usuario_id).order_by('fecha', 'id_registro')
+                 .values_list('fecha', 'tipo', 'monto'))
+    return np.array([float(m) if t == 'ingreso' else -float(m) for _, t, m in filas])
+
+
+def medir(funcion, usuarios, repeticiones):
+    tiempos = []
+    for usuario_id in usuarios:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion(usuario_id)
+            tiempos.append(time.perf_counter() - inicio)
+    tiempos.sort()
+    return statistics.median(tiempos) * 1e6, tiempos[int(len(tiempos) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--usuarios', type=int, default=20)
+    parser.add_argument('--repeticiones', type=int, default=50)
+    args = parser.parse_args()
+
+    usuarios = list(
+        RegistroFinanciero.objects.values('id_usuario').annotate(n=Count('id_registro'))
+        .order_by('-n').values_list('id_usuario', flat=True)[:args.usuarios]
+    )
+    if not usuarios:
+        sys.exit('No hay registros')
+
+    inicio = time.perf_counter()
+    total = sum(instantaneas.reconstruir(u) for u in usuarios)
+    print(f'Instantáneas: {total} registros de {len(usuarios)} usuarios en {time.perf_counter() - inicio:.2f}s')
+
+    for nombre, funcion in [
+        ('ORM + float', desde_la_base),
+        ('instantánea verificada', lambda u: instantaneas.montos(instantaneas.obtener(u))),
+        ('instantánea sin verificar', lambda u: instantaneas.obtener(u, verificar=False)),
+    ]:
+        mediana, p99 = medir(funcion, usuarios, args.repeticiones)
+        print(f'{nombre:<26} mediana {mediana:9.1f} µs   p99 {p99:9.1f} µs')
+
+
+if __name__ == '__main__':
+    main()
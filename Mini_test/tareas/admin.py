@@ -0,0 +1,10 @@
+from django.contrib import admin
+from .models import Tarea
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ['id_tarea', 'nombre', 'estado', 'intentos', 'max_intentos', 'ejecutar_despues', 'fecha_fin']
+    list_filter = ['estado', 'nombre']
+    search_fields = ['nombre', 'clave_unica']
+    ordering = ['-fecha_creacion']
+    readonly_fields = ['fecha_creacion', 'fecha_inicio', 'fecha_latido', 'fecha_fin', 'ultimo_error']
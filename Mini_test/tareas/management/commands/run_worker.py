@@ -0,0 +1,76 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta las tareas en segundo plano encoladas en la tabla tarea'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=1,
+                            help='Hilos que reclaman y ejecutan tareas en paralelo')
+        parser.add_argument('--lote', type=int, default=10,
+                            help='Tareas que reclama cada hilo por consulta')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando no hay tareas listas')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar las tareas listas y terminar')
+
+    def handle(self, *args, **options):
+        from tareas.servicios import ServicioTareas
+
+        if options['concurrencia'] < 1 or options['lote'] < 1:
+            raise CommandError('--concurrencia y --lote deben ser mayores a 0')
+
+        detener = threading.Event()
+        totales = {'ejecutadas': 0, 'fallidas': 0}
+        guardia = threading.Lock()
+
+        def trabajar():
+            while not detener.is_set():
+                ejecutadas, fallidas = ServicioTareas.procesar(options['lote'])
+                with guardia:
+                    totales['ejecutadas'] += ejecutadas
+                    totales['fallidas'] += fallidas
+                if not ejecutadas:
+                    if options['una_vez']:
+                        break
+                    ServicioTareas.recuperar_colgadas()
+                    detener.wait(options['intervalo'])
+
+        def trabajar_en_hilo():
+            # Cada hilo usa su propia conexión y la cierra al terminar
+            try:
+                trabajar()
+            finally:
+                connection.close()
+
+        # SIGINT/SIGTERM terminan la tarea en curso y detienen el worker
+        anteriores = {}
+        if threading.current_thread() is threading.main_thread():
+            for senal in (signal.SIGINT, signal.SIGTERM):
+                anteriores[senal] = signal.signal(senal, lambda *_: detener.set())
+
+        try:
+            recuperadas = ServicioTareas.recuperar_colgadas()
+            if recuperadas:
+                self.stdout.write(f'{recuperadas} tareas colgadas devueltas a pendiente')
+
+            if options['concurrencia'] == 1:
+                trabajar()
+            else:
+                hilos = [threading.Thread(target=trabajar_en_hilo, name=f'worker-{i}')
+                         for i in range(options['concurrencia'])]
+                for hilo in hilos:
+                    hilo.start()
+                for hilo in hilos:
+                    hilo.join()
+        finally:
+            for senal, anterior in anteriores.items():
+                signal.signal(senal, anterior)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totales['ejecutadas']} tareas ejecutadas, {totales['fallidas']} con error"
+        ))
@@ -0,0 +1,66 @@
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+
+BLOQUEO_LIDER = 'tareas:scheduler'
+
+
+class Command(BaseCommand):
+    help = 'Encola las tareas periódicas declaradas con cron; solo una réplica actúa como líder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, default=20.0,
+                            help='Segundos entre revisiones del reloj')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Hacer una sola revisión (minuto actual) y terminar')
+
+    def handle(self, *args, **options):
+        from minitest.bloqueos import intentar_bloqueo_sesion, liberar_bloqueo_sesion
+        from tareas.programador import ServicioProgramador
+
+        if options['intervalo'] <= 0:
+            raise CommandError('--intervalo debe ser mayor a 0')
+
+        for nombre, cron in ServicioProgramador.programadas():
+            self.stdout.write(f'{cron.expresion:<15} {nombre}')
+
+        detener = threading.Event()
+        anteriores = {}
+        if threading.current_thread() is threading.main_thread():
+            for senal in (signal.SIGINT, signal.SIGTERM):
+                anteriores[senal] = signal.signal(senal, lambda *_: detener.set())
+
+        lider = False
+        ultimo = None
+        try:
+            while not detener.is_set():
+                try:
+                    if not lider:
+                        lider = intentar_bloqueo_sesion(BLOQUEO_LIDER)
+                        if lider:
+                            self.stdout.write('Este proceso es el líder del scheduler')
+                            # Un líder nuevo empieza en el minuto actual; los anteriores ya los cubrió el previo
+                            ultimo = timezone.localtime() - timedelta(minutes=1)
+                    if lider:
+                        ahora = timezone.localtime()
+                        for nombre, minuto in ServicioProgramador.encolar_pendientes(ultimo, ahora):
+                            self.stdout.write(f'{minuto:%Y-%m-%d %H:%M} encolada {nombre}')
+                        ultimo = ahora
+                except DatabaseError as error:
+                    # Al perder la conexión se pierde también el bloqueo: volver a competir
+                    self.stderr.write(f'Error de base de datos, se reintenta la elección de líder: {error}')
+                    lider = False
+                    connection.close()
+                if options['una_vez']:
+                    break
+                detener.wait(options['intervalo'])
+        finally:
+            if lider:
+                liberar_bloqueo_sesion(BLOQUEO_LIDER)
+            for senal, anterior in anteriores.items():
+                signal.signal(senal, anterior)
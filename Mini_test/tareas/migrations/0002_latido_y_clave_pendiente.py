@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:25
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def latido_inicial(apps, schema_editor):
+    """Las tareas en proceso al migrar laten por última vez al empezar"""
+    Tarea = apps.get_model('tareas', 'Tarea')
+    Tarea.objects.filter(estado='en_proceso').update(fecha_latido=F('fecha_inicio'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='tarea',
+            name='tarea_clave_activa_unica',
+        ),
+        migrations.AddField(
+            model_name='tarea',
+            name='fecha_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(latido_inicial, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('clave_unica',), name='tarea_clave_pendiente_unica'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:37
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def quitar_cron_repetidas(apps, schema_editor):
+    """Antes solo se deduplicaban las activas: de cada minuto programado queda la primera"""
+    Tarea = apps.get_model('tareas', 'Tarea')
+    cron = Tarea.objects.filter(clave_unica__startswith='cron:')
+    cron.filter(Exists(cron.filter(clave_unica=OuterRef('clave_unica'), id_tarea__lt=OuterRef('id_tarea')))).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tareas', '0002_latido_y_clave_pendiente'),
+    ]
+
+    operations = [
+        migrations.RunPython(quitar_cron_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tarea',
+            constraint=models.UniqueConstraint(condition=models.Q(('clave_unica__startswith', 'cron:')), fields=('clave_unica',), name='tarea_clave_cron_unica'),
+        ),
+    ]
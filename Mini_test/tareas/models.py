@@ -0,0 +1,55 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Tarea(models.Model):
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En Proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    id_tarea = models.AutoField(primary_key=True)
+    nombre = models.CharField(max_length=100)
+    argumentos = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    # Tareas con la misma clave no se duplican mientras una esté pendiente; una en proceso
+    # no absorbe a la nueva, que debe ver lo escrito mientras corría
+    clave_unica = models.CharField(max_length=200, null=True, blank=True)
+    intentos = models.IntegerField(default=0)
+    max_intentos = models.IntegerField(default=5)
+    ejecutar_despues = models.DateTimeField(default=timezone.now)
+    ultimo_error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    # Lo renueva el worker mientras la tarea corre; si se detiene, el worker murió
+    fecha_latido = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'tarea'
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'ejecutar_despues'], name='tarea_estado_ejecucion_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['clave_unica'],
+                condition=Q(estado='pendiente'),
+                name='tarea_clave_pendiente_unica'
+            ),
+            # Cada minuto programado por el scheduler corre una sola vez, en cualquier estado:
+            # un líder nuevo no vuelve a encolar lo que el anterior dejó en proceso o completado
+            models.UniqueConstraint(
+                fields=['clave_unica'],
+                condition=Q(clave_unica__startswith='cron:'),
+                name='tarea_clave_cron_unica'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.nombre} #{self.id_tarea} ({self.estado})"
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from .servicios import REGISTRO, ServicioTareas
+
+
+class ExpresionCron:
+    """Expresión cron de cinco campos: minuto hora día-del-mes mes día-de-la-semana.
+
+    Admite *, */n, listas (1,15), rangos (1-5) y rangos con paso (0-30/10).
+    El día de la semana va de 0 (domingo) a 6; 7 también es domingo. Como en
+    cron, si se restringen día del mes y día de la semana basta con que
+    coincida uno de los dos.
+    """
+    RANGOS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expresion):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f'Expresión cron inválida: {expresion!r}')
+        self.expresion = expresion
+        self.valores = [self._parsear(campo, minimo, maximo)
+                        for campo, (minimo, maximo) in zip(campos, self.RANGOS)]
+        if 7 in self.valores[4]:
+            self.valores[4].add(0)
+        self.dia_restringido = campos[2] != '*'
+        self.semana_restringida = campos[4] != '*'
+
+    @staticmethod
+    def _parsear(campo, minimo, maximo):
+        valores = set()
+        for parte in campo.split(','):
+            rango, _, paso = parte.partition('/')
+            paso = int(paso) if paso else 1
+            if rango == '*':
+                inicio, fin = minimo, maximo
+            elif '-' in rango:
+                inicio, fin = (int(v) for v in rango.split('-'))
+            else:
+                inicio = fin = int(rango)
+            if inicio < minimo or fin > maximo or inicio > fin or paso < 1:
+                raise ValueError(f'Campo cron fuera de rango: {campo!r}')
+            valores.update(range(inicio, fin + 1, paso))
+        return valores
+
+    def coincide(self, momento):
+        minutos, horas, dias, meses, dias_semana = self.valores
+        if momento.minute not in minutos or momento.hour not in horas or momento.month not in meses:
+            return False
+        dia = momento.day in dias
+        dia_semana = (momento.weekday() + 1) % 7 in dias_semana
+        if self.dia_restringido and self.semana_restringida:
+            return dia or dia_semana
+        return dia and dia_semana
+
+
+class ServicioProgramador:
+    # Si el proceso estuvo detenido no se recuperan más minutos que estos
+    RECUPERACION_MAXIMA = timedelta(hours=1)
+
+    @staticmethod
+    def programadas():
+        """[(nombre, ExpresionCron)] de las tareas registradas con cron"""
+        return [
+            (nombre, ExpresionCron(datos['cron']))
+            for nombre, datos in sorted(REGISTRO.items()) if datos.get('cron')
+        ]
+
+    @staticmethod
+    def encolar_pendientes(desde, hasta):
+        """Encola las tareas cuyo cron coincide con algún minuto en (desde, hasta].
+
+        desde y hasta deben estar en hora local. La clave incluye el minuto
+        programado y es única en cualquier estado (tarea_clave_cron_unica), así
+        la misma ejecución no se encola dos veces aunque otro proceso la haya
+        encolado antes y ya esté en proceso o completada.
+        """
+        desde = max(desde, hasta - ServicioProgramador.RECUPERACION_MAXIMA).replace(second=0, microsecond=0)
+        hasta = hasta.replace(second=0, microsecond=0)
+        programadas = ServicioProgramador.programadas()
+        encoladas = []
+        minuto = desde + timedelta(minutes=1)
+        while minuto <= hasta:
+            for nombre, cron in programadas:
+                if cron.coincide(minuto):
+                    ServicioTareas.encolar(nombre, clave=f'cron:{nombre}:{minuto:%Y-%m-%dT%H:%M}')
+                    encoladas.append((nombre, minuto))
+            minuto += timedelta(minutes=1)
+        return encoladas
@@ -0,0 +1,167 @@
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Tarea
+
+
+# nombre -> {'funcion', 'max_intentos', 'cron'}; se llena al importar los trabajos.py
+REGISTRO = {}
+
+
+def tarea(nombre, max_intentos=5, cron=None):
+    """Registra una función como tarea ejecutable por el worker.
+
+    La función recibe los argumentos guardados en Tarea.argumentos como
+    parámetros con nombre, así que deben ser serializables a JSON. Con cron
+    (p. ej. '5 0 * * 1') el comando scheduler la encola periódicamente, sin
+    argumentos y según la hora local.
+    """
+    def decorador(funcion):
+        REGISTRO[nombre] = {'funcion': funcion, 'max_intentos': max_intentos, 'cron': cron}
+        return funcion
+    return decorador
+
+
+class ServicioTareas:
+    BACKOFF_BASE = 30       # segundos antes del primer reintento
+    BACKOFF_MAXIMO = 3600   # tope de espera entre reintentos
+    INTERVALO_LATIDO = timedelta(seconds=60)  # cada cuánto renueva fecha_latido una tarea en proceso
+    TIEMPO_SIN_LATIDO = timedelta(minutes=5)  # sin latido en este tiempo, el worker murió
+
+    @staticmethod
+    def encolar(nombre, argumentos=None, clave=None, ejecutar_despues=None):
+        """Encola una tarea cuando la transacción actual confirma.
+
+        Si la transacción se revierte no se encola nada. Con clave, una tarea
+        igual que ya esté pendiente absorbe a la nueva; si solo hay una en
+        proceso, la nueva se encola igual para ver lo escrito mientras corría.
+        """
+        if nombre not in REGISTRO:
+            raise ValueError(f'Tarea no registrada: {nombre}')
+        nueva = Tarea(
+            nombre=nombre,
+            argumentos=argumentos or {},
+            clave_unica=clave,
+            max_intentos=REGISTRO[nombre]['max_intentos'],
+            ejecutar_despues=ejecutar_despues or timezone.now()
+        )
+        transaction.on_commit(lambda: ServicioTareas.insertar([nueva]))
+
+    @staticmethod
+    def insertar(tareas):
+        """INSERT ... ON CONFLICT DO NOTHING: las claves duplicadas se descartan"""
+        Tarea.objects.bulk_create(tareas, ignore_conflicts=True)
+
+    @staticmethod
+    def reclamar(cantidad=10):
+        """Toma hasta cantidad tareas listas y las marca en proceso.
+
+        SELECT ... FOR UPDATE SKIP LOCKED: varios workers pueden reclamar a la
+        vez sin bloquearse entre sí ni tomar la misma tarea.
+        """
+        ahora = timezone.now()
+        with transaction.atomic():
+            ids = list(
+                Tarea.objects.select_for_update(skip_locked=True)
+                .filter(estado='pendiente', ejecutar_despues__lte=ahora)
+                .order_by('ejecutar_despues', 'id_tarea')
+                .values_list('id_tarea', flat=True)[:cantidad]
+            )
+            if not ids:
+                return []
+            Tarea.objects.filter(id_tarea__in=ids).update(
+                estado='en_proceso', intentos=F('intentos') + 1, fecha_inicio=ahora, fecha_latido=ahora
+            )
+        return list(Tarea.objects.filter(id_tarea__in=ids).order_by('ejecutar_despues', 'id_tarea'))
+
+    @staticmethod
+    def espera_reintento(intentos):
+        return timedelta(seconds=min(ServicioTareas.BACKOFF_BASE * 2 ** (intentos - 1), ServicioTareas.BACKOFF_MAXIMO))
+
+    @staticmethod
+    @contextmanager
+    def latido(id_tarea):
+        """Renueva fecha_latido de la tarea en un hilo aparte mientras dura el bloque"""
+        detener = threading.Event()
+
+        def renovar():
+            # El hilo usa su propia conexión y la cierra al terminar
+            try:
+                while not detener.wait(ServicioTareas.INTERVALO_LATIDO.total_seconds()):
+                    Tarea.objects.filter(id_tarea=id_tarea, estado='en_proceso').update(fecha_latido=timezone.now())
+            finally:
+                connection.close()
+
+        hilo = threading.Thread(target=renovar, name=f'latido-{id_tarea}', daemon=True)
+        hilo.start()
+        try:
+            yield
+        finally:
+            detener.set()
+            hilo.join()
+
+    @staticmethod
+    def ejecutar(tarea_):
+        """Ejecuta una tarea reclamada. Retorna True si terminó bien.
+
+        Si falla se reprograma con espera exponencial hasta agotar max_intentos,
+        luego queda como fallida con el último traceback. También queda
+        fallida si mientras corría se encoló otra igual, que la reemplaza.
+        """
+        registrada = REGISTRO.get(tarea_.nombre)
+        try:
+            if registrada is None:
+                raise LookupError(f'Tarea no registrada: {tarea_.nombre}')
+            with ServicioTareas.latido(tarea_.id_tarea):
+                registrada['funcion'](**tarea_.argumentos)
+        except Exception:
+            ahora = timezone.now()
+            cambios = {'ultimo_error': traceback.format_exc(), 'fecha_fin': ahora}
+            tareas = Tarea.objects.filter(id_tarea=tarea_.id_tarea)
+            if tarea_.intentos < tarea_.max_intentos:
+                try:
+                    with transaction.atomic():
+                        tareas.update(estado='pendiente', **cambios,
+                                      ejecutar_despues=ahora + ServicioTareas.espera_reintento(tarea_.intentos))
+                    return False
+                except IntegrityError:
+                    pass  # Otra igual ya está pendiente: esa hace el reintento
+            tareas.update(estado='fallida', **cambios)
+            return False
+
+        Tarea.objects.filter(id_tarea=tarea_.id_tarea).update(estado='completada', fecha_fin=timezone.now())
+        return True
+
+    @staticmethod
+    def recuperar_colgadas():
+        """Devuelve a pendiente las tareas en proceso de un worker que murió a mitad de ejecución.
+
+        Una tarea larga sigue renovando fecha_latido; solo se recupera la que
+        dejó de latir. Si ya hay otra igual pendiente, la colgada queda fallida.
+        """
+        colgadas = Tarea.objects.filter(
+            estado='en_proceso', fecha_latido__lt=timezone.now() - ServicioTareas.TIEMPO_SIN_LATIDO
+        )
+        recuperadas = 0
+        for id_tarea in colgadas.values_list('id_tarea', flat=True):
+            tareas = colgadas.filter(id_tarea=id_tarea)
+            try:
+                with transaction.atomic():
+                    recuperadas += tareas.update(estado='pendiente')
+            except IntegrityError:
+                tareas.update(estado='fallida', fecha_fin=timezone.now(),
+                              ultimo_error='Colgada; ya había otra tarea igual pendiente')
+        return recuperadas
+
+    @staticmethod
+    def procesar(cantidad=10):
+        """Reclama y ejecuta un lote. Retorna (ejecutadas, fallidas)"""
+        tareas = ServicioTareas.reclamar(cantidad)
+        fallidas = sum(1 for t in tareas if not ServicioTareas.ejecutar(t))
+        return len(tareas), fallidas
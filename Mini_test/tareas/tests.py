@@ -0,0 +1,246 @@
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from finanzas.models import RegistroFinanciero, ReporteFinanciero
+from finanzas.servicios import ServicioFinanzas
+from minitest.bloqueos import intentar_bloqueo_sesion, liberar_bloqueo_sesion
+from oportunidades.models import OportunidadEconomica
+from oportunidades.servicios import ServicioOportunidades
+from usuarios.models import Usuario
+from .models import Tarea
+from .programador import ExpresionCron, ServicioProgramador
+from .servicios import ServicioTareas, tarea
+
+
+EJECUCIONES = []
+
+
+@tarea('pruebas.anotar')
+def anotar(valor):
+	EJECUCIONES.append(valor)
+
+
+@tarea('pruebas.fallar', max_intentos=2)
+def fallar():
+	raise RuntimeError('falla de prueba')
+
+
+class ColaTareasTest(TestCase):
+	def setUp(self):
+		EJECUCIONES.clear()
+
+	def worker(self):
+		salida = StringIO()
+		call_command('run_worker', '--una-vez', stdout=salida)
+		return salida.getvalue()
+
+	def test_encola_al_confirmar_y_deduplica(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioTareas.encolar('pruebas.anotar', {'valor': 1}, clave='anotar:1')
+			ServicioTareas.encolar('pruebas.anotar', {'valor': 1}, clave='anotar:1')
+			ServicioTareas.encolar('pruebas.anotar', {'valor': 2})
+			self.assertEqual(Tarea.objects.count(), 0)
+		self.assertEqual(Tarea.objects.count(), 2)
+
+		self.assertIn('2 tareas ejecutadas', self.worker())
+		self.assertEqual(sorted(EJECUCIONES), [1, 2])
+		self.assertEqual(set(Tarea.objects.values_list('estado', flat=True)), {'completada'})
+
+		# Una vez completada, la misma clave se puede volver a encolar
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioTareas.encolar('pruebas.anotar', {'valor': 1}, clave='anotar:1')
+		self.assertEqual(Tarea.objects.filter(estado='pendiente').count(), 1)
+
+	def test_reintentos_con_espera_y_fallida(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioTareas.encolar('pruebas.fallar')
+		self.worker()
+		t = Tarea.objects.get()
+		self.assertEqual((t.estado, t.intentos), ('pendiente', 1))
+		self.assertIn('falla de prueba', t.ultimo_error)
+		self.assertAlmostEqual((t.ejecutar_despues - timezone.now()).total_seconds(), 30, delta=5)
+
+		# Aún no toca reintentar
+		self.assertIn('0 tareas ejecutadas', self.worker())
+		Tarea.objects.update(ejecutar_despues=timezone.now())
+		self.worker()
+		t.refresh_from_db()
+		self.assertEqual((t.estado, t.intentos), ('fallida', 2))
+
+	def test_tareas_futuras_y_colgadas(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioTareas.encolar('pruebas.anotar', {'valor': 3}, ejecutar_despues=timezone.now() + timedelta(hours=1))
+		self.assertEqual(ServicioTareas.reclamar(), [])
+
+		# Lleva una hora corriendo pero sigue latiendo: no se toca
+		hace_una_hora = timezone.now() - timedelta(hours=1)
+		Tarea.objects.update(estado='en_proceso', fecha_inicio=hace_una_hora, fecha_latido=timezone.now(),
+							 ejecutar_despues=timezone.now())
+		self.assertEqual(ServicioTareas.recuperar_colgadas(), 0)
+
+		Tarea.objects.update(fecha_latido=timezone.now() - ServicioTareas.TIEMPO_SIN_LATIDO - timedelta(seconds=1))
+		self.assertIn('1 tareas colgadas', self.worker())
+		self.assertEqual(EJECUCIONES, [3])
+
+	def test_clave_en_proceso_no_absorbe_a_la_nueva(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioTareas.encolar('pruebas.fallar', clave='fallar')
+		en_proceso, = ServicioTareas.reclamar()
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioTareas.encolar('pruebas.fallar', clave='fallar')
+			ServicioTareas.encolar('pruebas.fallar', clave='fallar')
+		self.assertEqual(Tarea.objects.filter(estado='pendiente').count(), 1)
+
+		# El reintento de la que corría lo cubre la nueva pendiente
+		self.assertFalse(ServicioTareas.ejecutar(en_proceso))
+		en_proceso.refresh_from_db()
+		self.assertEqual(en_proceso.estado, 'fallida')
+		self.assertIn('falla de prueba', en_proceso.ultimo_error)
+
+		# Igual con una colgada que ya tiene reemplazo pendiente
+		Tarea.objects.filter(pk=en_proceso.pk).update(
+			estado='en_proceso', fecha_latido=timezone.now() - timedelta(hours=1)
+		)
+		self.assertEqual(ServicioTareas.recuperar_colgadas(), 0)
+		self.assertEqual(Tarea.objects.get(pk=en_proceso.pk).estado, 'fallida')
+		self.assertEqual(Tarea.objects.filter(estado='pendiente').count(), 1)
+
+
+@tarea('pruebas.esperar_latido')
+def esperar_latido(id_tarea):
+	limite = time.monotonic() + 5
+	inicio = Tarea.objects.get(pk=id_tarea).fecha_latido
+	while Tarea.objects.get(pk=id_tarea).fecha_latido == inicio:
+		if time.monotonic() > limite:
+			raise AssertionError('sin latido')
+		time.sleep(0.05)
+
+
+class LatidoTareasTest(TransactionTestCase):
+	def test_tarea_larga_renueva_su_latido(self):
+		Tarea.objects.create(nombre='pruebas.esperar_latido', argumentos={})
+		t, = ServicioTareas.reclamar()
+		t.argumentos = {'id_tarea': t.pk}
+		with mock.patch.object(ServicioTareas, 'INTERVALO_LATIDO', timedelta(milliseconds=100)):
+			self.assertTrue(ServicioTareas.ejecutar(t))
+		self.assertEqual(Tarea.objects.get().estado, 'completada')
+
+
+class TrabajosTest(TestCase):
+	def setUp(self):
+		self.user = Usuario.objects.create_user(correo='cola@test.com', nombre='Cola', password='testpass')
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def test_generar_reporte_en_segundo_plano(self):
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post('/api/finanzas/reportes/generar_reporte/', {'semana': 10, 'anio': 2025}, format='json')
+		self.assertEqual(resp.status_code, 202)
+		self.assertFalse(ReporteFinanciero.objects.exists())
+
+		call_command('run_worker', '--una-vez', stdout=StringIO())
+		self.assertTrue(ReporteFinanciero.objects.filter(id_usuario=self.user, semana=10, anio=2025).exists())
+		resp = self.client.post('/api/finanzas/reportes/generar_reporte/', {'semana': 10, 'anio': 2025}, format='json')
+		self.assertEqual(resp.status_code, 200)
+
+	def test_vencimiento_de_oportunidades(self):
+		ayer = timezone.localdate() - timedelta(days=1)
+		with self.captureOnCommitCallbacks(execute=True):
+			OportunidadEconomica.objects.create(
+				nombre_programa='Beca', tipo='beca', institucion='X', enlace='https://x.pe',
+				descripcion='d', requisitos='r', fecha_fin=ayer
+			)
+			OportunidadEconomica.objects.create(
+				nombre_programa='Beca 2', tipo='beca', institucion='Y', enlace='https://y.pe',
+				descripcion='d', requisitos='r', fecha_fin=ayer
+			)
+		self.assertEqual(Tarea.objects.filter(nombre='oportunidades.desactivar_vencidas').count(), 1)
+		call_command('run_worker', '--una-vez', stdout=StringIO())
+		self.assertFalse(OportunidadEconomica.objects.filter(activa=True).exists())
+
+	def test_vencimiento_en_fecha_de_lima(self):
+		oportunidad = OportunidadEconomica.objects.create(
+			nombre_programa='Beca', tipo='beca', institucion='X', enlace='https://x.pe',
+			descripcion='d', requisitos='r', fecha_fin=date(2025, 6, 1)
+		)
+		# 02:00 UTC del 2 de junio: en Lima todavía es 1 de junio
+		with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 6, 2, 2, tzinfo=dt_timezone.utc)):
+			self.assertEqual(ServicioOportunidades.desactivar_vencidas(), 0)
+			self.assertTrue(oportunidad.esta_vigente)
+		with mock.patch('django.utils.timezone.now', return_value=datetime(2025, 6, 2, 5, tzinfo=dt_timezone.utc)):
+			self.assertEqual(ServicioOportunidades.desactivar_vencidas(), 1)
+
+
+class ProgramadorTest(TestCase):
+	def test_expresion_cron(self):
+		lunes = timezone.make_aware(datetime(2025, 6, 2, 0, 5))
+		self.assertTrue(ExpresionCron('5 0 * * 1').coincide(lunes))
+		self.assertFalse(ExpresionCron('5 0 * * 1').coincide(lunes + timedelta(days=1)))
+		self.assertTrue(ExpresionCron('*/5 0-2 * * *').coincide(lunes))
+		self.assertTrue(ExpresionCron('5 0 1,2 * 0').coincide(lunes))   # día 2 aunque no sea domingo
+		self.assertTrue(ExpresionCron('5 0 * * 7').coincide(lunes - timedelta(days=1)))
+		with self.assertRaises(ValueError):
+			ExpresionCron('61 * * * *')
+
+	def test_encola_una_vez_por_minuto_programado(self):
+		lima = timezone.get_current_timezone()
+		desde = datetime(2025, 6, 1, 23, 50, tzinfo=lima)
+		hasta = datetime(2025, 6, 2, 0, 20, tzinfo=lima)
+		with self.captureOnCommitCallbacks(execute=True):
+			encoladas = ServicioProgramador.encolar_pendientes(desde, hasta)
+			ServicioProgramador.encolar_pendientes(desde, hasta)
+		self.assertEqual(sorted(n for n, _ in encoladas),
+						 ['finanzas.cerrar_semana', 'oportunidades.desactivar_vencidas'])
+		self.assertEqual(Tarea.objects.count(), 2)
+		self.assertTrue(Tarea.objects.filter(clave_unica='cron:finanzas.cerrar_semana:2025-06-02T00:05').exists())
+
+		# Un líder nuevo repasa los mismos minutos mientras el anterior ejecuta o ya terminó
+		Tarea.objects.filter(nombre='finanzas.cerrar_semana').update(estado='en_proceso')
+		Tarea.objects.filter(nombre='oportunidades.desactivar_vencidas').update(estado='completada')
+		with self.captureOnCommitCallbacks(execute=True):
+			ServicioProgramador.encolar_pendientes(desde, hasta)
+		self.assertEqual(Tarea.objects.count(), 2)
+
+	def test_cierre_de_semana_precalcula_reportes(self):
+		activo = Usuario.objects.create_user(correo='activo@test.com', nombre='Activo', password='x')
+		Usuario.objects.create_user(correo='inactivo@test.com', nombre='Inactivo', password='x', is_active=False)
+		RegistroFinanciero.objects.create(id_usuario=activo, tipo='gasto', monto=Decimal('9'), categoria='ropa',
+										  fecha=timezone.make_aware(datetime(2025, 5, 28, 12)))
+		self.assertEqual(ServicioFinanzas.cerrar_semana(hoy=date(2025, 6, 2)), 2)
+		cerrada = ReporteFinanciero.objects.get(id_usuario=activo, anio=2025, semana=22)
+		self.assertEqual(cerrada.total_gastos, Decimal('9.00'))
+		self.assertTrue(ReporteFinanciero.objects.filter(id_usuario=activo, anio=2025, semana=23).exists())
+		# La lectura del lunes reutiliza el reporte precalculado
+		with self.assertNumQueries(2):
+			self.assertEqual(ServicioFinanzas.obtener_reporte_semanal(activo, 22, 2025).pk, cerrada.pk)
+
+	def test_un_solo_lider(self):
+		self.assertTrue(intentar_bloqueo_sesion('tareas:scheduler'))
+		resultado = []
+
+		def competir():
+			try:
+				resultado.append(intentar_bloqueo_sesion('tareas:scheduler'))
+			finally:
+				connection.close()
+
+		hilo = threading.Thread(target=competir)
+		hilo.start()
+		hilo.join()
+		liberar_bloqueo_sesion('tareas:scheduler')
+		self.assertEqual(resultado, [False])
+
+		salida = StringIO()
+		with self.captureOnCommitCallbacks(execute=True):
+			call_command('scheduler', '--una-vez', stdout=salida)
+		self.assertIn('líder', salida.getvalue())
+		self.assertIn('finanzas.cerrar_semana', salida.getvalue())
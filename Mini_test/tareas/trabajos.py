@@ -0,0 +1,13 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import Tarea
+from .servicios import tarea
+
+
+@tarea('tareas.purgar_terminadas', cron='0 4 * * *')
+def purgar_terminadas(dias=7):
+    """Borra las tareas completadas con más de dias de antigüedad; las fallidas se conservan"""
+    limite = timezone.now() - timedelta(days=dias)
+    Tarea.objects.filter(estado='completada', fecha_fin__lt=limite).delete()